@@ -2,14 +2,17 @@ import json
 
 
 class AnsibleConfiguration(object):
-    def __init__(self, playbook_repo=None, hosts_conf=None, additional_cmd_args=None, timeout_minutes = None):
+    def __init__(self, playbook_repo=None, hosts_conf=None, additional_cmd_args=None, timeout_minutes = None,
+                 readiness_cache_seconds=None):
         """
         :type playbook_repo: PlaybookRepository
         :type hosts_conf: list[HostConfiguration]
         :type additional_cmd_args: str
         :type timeout_minutes: float
+        :type readiness_cache_seconds: float
         """
         self.timeoutMinutes = timeout_minutes or 0.0
+        self.readinessCacheSeconds = readiness_cache_seconds or 0.0
         self.repositoryDetails = playbook_repo or PlaybookRepository()
         self.hostsDetails = hosts_conf or []
         self.additionalArgs = additional_cmd_args
@@ -319,6 +319,21 @@ class AdminAnsibleConfig2G(object):
         """
         self.attributes['Admin Ansible Config 2G.Timeout Minutes'] = value
 
+    @property
+    def readiness_cache_seconds(self):
+        """
+        :rtype: float
+        """
+        return self.attributes['Admin Ansible Config 2G.Readiness Cache Seconds'] if 'Admin Ansible Config 2G.Readiness Cache Seconds' in self.attributes else None
+
+    @readiness_cache_seconds.setter
+    def readiness_cache_seconds(self, value='0'):
+        """
+        (Optional) Seconds a host that was reachable in the sandbox is not polled again by the next playbooks of the sandbox.
+        :type value: float
+        """
+        self.attributes['Admin Ansible Config 2G.Readiness Cache Seconds'] = value
+
     @property
     def gitlab_branch(self):
         """
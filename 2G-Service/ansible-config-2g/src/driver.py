@@ -7,6 +7,7 @@ from data_model import *  # run 'shellfoundry generate' to generate data model c
 from cloudshell.shell.core.session.cloudshell_session import CloudShellSessionContext
 from cloudshell.shell.core.driver_context import Connector
 from cloudshell.cm.ansible.ansible_shell import AnsibleShell
+from cloudshell.cm.ansible.domain.ansible_command_executor import BufferedOutputWriter, ReservationOutputWriter
 from helper_code.sandbox_reporter import SandboxReporter
 from helper_code.shell_connector_helpers import get_connector_endpoints
 from helper_code.resource_helpers import get_resource_attribute_gen_agostic
@@ -51,34 +52,37 @@ class AnsibleConfig2GDriver(ResourceDriverInterface):
         :return:
         """
         api = CloudShellSessionContext(context).get_api()
-        res_id = context.reservation.reservation_id
-        reporter = self._get_sandbox_reporter(context, api)
-        service_name = context.resource.name
+        with BufferedOutputWriter(ReservationOutputWriter(api, context)) as output_writer:
+            res_id = context.reservation.reservation_id
+            reporter = self._get_sandbox_reporter(context, api, output_writer)
+            service_name = context.resource.name
 
-        try:
-            ansible_config_json = self._get_ansible_config_json(context, api, reporter, playbook_path, script_params)
-        except Exception as e:
-            exc_msg = "Error building playbook request on '{}': {}".format(service_name, str(e))
-            reporter.exc_out(exc_msg)
-            api.SetServiceLiveStatus(reservationId=res_id, serviceAlias=service_name, liveStatusName="Error",
-                                     additionalInfo=str(e))
-            raise Exception(exc_msg)
-
-        reporter.info_out("'{}' is Executing Ansible Playbook...".format(context.resource.name))
-        try:
-            self.first_gen_ansible_shell.execute_playbook(context, ansible_config_json, cancellation_context)
-        except Exception as e:
-            exc_msg = "Error running playbook on '{}': {}".format(service_name, str(e))
-            reporter.exc_out(exc_msg)
-            api.SetServiceLiveStatus(reservationId=res_id, serviceAlias=service_name, liveStatusName="Error",
-                                     additionalInfo=str(e))
-            raise Exception(exc_msg)
-
-        api.SetServiceLiveStatus(reservationId=res_id, serviceAlias=service_name, liveStatusName="Online",
-                                 additionalInfo="Playbook Flow Completed")
-        completed_msg = "Ansible Flow Completed for '{}'.".format(context.resource.name)
-        reporter.warn_out(completed_msg, log_only=True)
-        return completed_msg
+            try:
+                ansible_config_json = self._get_ansible_config_json(context, api, reporter, playbook_path,
+                                                                    script_params)
+            except Exception as e:
+                exc_msg = "Error building playbook request on '{}': {}".format(service_name, str(e))
+                reporter.exc_out(exc_msg)
+                api.SetServiceLiveStatus(reservationId=res_id, serviceAlias=service_name, liveStatusName="Error",
+                                         additionalInfo=str(e))
+                raise Exception(exc_msg)
+
+            reporter.info_out("'{}' is Executing Ansible Playbook...".format(context.resource.name))
+            reporter.flush()
+            try:
+                self.first_gen_ansible_shell.execute_playbook(context, ansible_config_json, cancellation_context)
+            except Exception as e:
+                exc_msg = "Error running playbook on '{}': {}".format(service_name, str(e))
+                reporter.exc_out(exc_msg)
+                api.SetServiceLiveStatus(reservationId=res_id, serviceAlias=service_name, liveStatusName="Error",
+                                         additionalInfo=str(e))
+                raise Exception(exc_msg)
+
+            api.SetServiceLiveStatus(reservationId=res_id, serviceAlias=service_name, liveStatusName="Online",
+                                     additionalInfo="Playbook Flow Completed")
+            completed_msg = "Ansible Flow Completed for '{}'.".format(context.resource.name)
+            reporter.warn_out(completed_msg, log_only=True)
+            return completed_msg
 
     @staticmethod
     def _get_infrastructure_resources(comma_separated_input, service_name, api, reporter):
@@ -113,36 +117,38 @@ class AnsibleConfig2GDriver(ResourceDriverInterface):
         :return:
         """
         api = CloudShellSessionContext(context).get_api()
-        res_id = context.reservation.reservation_id
-        reporter = self._get_sandbox_reporter(context, api)
-        service_name = context.resource.name
-        resources = self._get_infrastructure_resources(infrastructure_resources, service_name, api, reporter)
-
-        reporter.info_out("'{}' is Executing Ansible Playbook...".format(context.resource.name))
-        try:
-            ansible_config_json = self._get_ansible_config_json(context, api, reporter, playbook_path, script_params,
-                                                                resources)
-        except Exception as e:
-            exc_msg = "Error building playbook request on '{}': {}".format(service_name, str(e))
-            reporter.exc_out(exc_msg)
-            api.SetServiceLiveStatus(reservationId=res_id, serviceAlias=service_name, liveStatusName="Error",
-                                     additionalInfo=str(e))
-            raise Exception(exc_msg)
-
-        try:
-            self.first_gen_ansible_shell.execute_playbook(context, ansible_config_json, cancellation_context)
-        except Exception as e:
-            exc_msg = "Error running playbook on '{}': {}".format(service_name, str(e))
-            reporter.err_out(exc_msg)
-            api.SetServiceLiveStatus(reservationId=res_id, serviceAlias=service_name, liveStatusName="Error",
-                                     additionalInfo=str(e))
-            raise Exception(exc_msg)
-
-        api.SetServiceLiveStatus(reservationId=res_id, serviceAlias=service_name, liveStatusName="Online",
-                                 additionalInfo="Playbook Flow Completed")
-        completed_msg = "Ansible Flow Completed for '{}'.".format(service_name)
-        reporter.warn_out(completed_msg, log_only=True)
-        return completed_msg
+        with BufferedOutputWriter(ReservationOutputWriter(api, context)) as output_writer:
+            res_id = context.reservation.reservation_id
+            reporter = self._get_sandbox_reporter(context, api, output_writer)
+            service_name = context.resource.name
+            resources = self._get_infrastructure_resources(infrastructure_resources, service_name, api, reporter)
+
+            reporter.info_out("'{}' is Executing Ansible Playbook...".format(context.resource.name))
+            try:
+                ansible_config_json = self._get_ansible_config_json(context, api, reporter, playbook_path,
+                                                                    script_params, resources)
+            except Exception as e:
+                exc_msg = "Error building playbook request on '{}': {}".format(service_name, str(e))
+                reporter.exc_out(exc_msg)
+                api.SetServiceLiveStatus(reservationId=res_id, serviceAlias=service_name, liveStatusName="Error",
+                                         additionalInfo=str(e))
+                raise Exception(exc_msg)
+
+            reporter.flush()
+            try:
+                self.first_gen_ansible_shell.execute_playbook(context, ansible_config_json, cancellation_context)
+            except Exception as e:
+                exc_msg = "Error running playbook on '{}': {}".format(service_name, str(e))
+                reporter.err_out(exc_msg)
+                api.SetServiceLiveStatus(reservationId=res_id, serviceAlias=service_name, liveStatusName="Error",
+                                         additionalInfo=str(e))
+                raise Exception(exc_msg)
+
+            api.SetServiceLiveStatus(reservationId=res_id, serviceAlias=service_name, liveStatusName="Online",
+                                     additionalInfo="Playbook Flow Completed")
+            completed_msg = "Ansible Flow Completed for '{}'.".format(service_name)
+            reporter.warn_out(completed_msg, log_only=True)
+            return completed_msg
 
     def _is_path_supported_protocol(self, path):
         return is_path_supported_protocol(path, self.supported_protocols)
@@ -298,6 +304,7 @@ class AnsibleConfig2GDriver(ResourceDriverInterface):
         service_script_parameters = resource.script_parameters
         service_additional_args = resource.ansible_cmd_args
         service_timeout_minutes = resource.timeout_minutes
+        service_readiness_cache_seconds = resource.readiness_cache_seconds
         res_id = context.reservation.reservation_id
         config_selector = resource.ansible_config_selector
 
@@ -329,6 +336,7 @@ class AnsibleConfig2GDriver(ResourceDriverInterface):
 
         ansi_conf.additionalArgs = service_additional_args if service_additional_args else None
         ansi_conf.timeoutMinutes = int(service_timeout_minutes) if service_timeout_minutes else 0
+        ansi_conf.readinessCacheSeconds = int(service_readiness_cache_seconds) if service_readiness_cache_seconds else 0
 
         # default host inputs
         # take command input, fallback to service values
@@ -452,18 +460,19 @@ class AnsibleConfig2GDriver(ResourceDriverInterface):
         return ansi_conf_json
 
     @staticmethod
-    def _get_sandbox_reporter(context, api):
+    def _get_sandbox_reporter(context, api, output_writer=None):
         """
         helper method to get sandbox reporter instance
         :param ResourceCommandContext context:
         :param CloudShellAPISession api:
+        :param OutputWriter output_writer:
         :return:
         """
         res_id = context.reservation.reservation_id
         model = context.resource.model
         service_name = context.resource.name
         logger = get_qs_logger(log_group=res_id, log_category=model, log_file_prefix=service_name)
-        reporter = SandboxReporter(api, res_id, logger)
+        reporter = SandboxReporter(api, res_id, logger, output_writer)
         return reporter
 
     def cleanup(self):
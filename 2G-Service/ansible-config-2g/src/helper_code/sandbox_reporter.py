@@ -6,16 +6,19 @@ from logging import Logger
 
 
 class SandboxReporter(object):
-    def __init__(self, api, reservation_id, logger=None):
+    def __init__(self, api, reservation_id, logger=None, output_writer=None):
         """
         logger is optional, console printing can work without logger object
+        output_writer is optional, when passed (ex. BufferedOutputWriter) console printing goes through it
         :param CloudShellAPISession api:
         :param str reservation_id:
         :param Logger logger:
+        :param OutputWriter output_writer:
         """
         self._api = api
         self._reservation_id = reservation_id
         self._logger = logger
+        self._output_writer = output_writer
 
     # ==== PRINT TO SANDBOX CONSOLE HELPERS ===
     def sb_print(self, message):
@@ -24,7 +27,18 @@ class SandboxReporter(object):
         :param str message:
         :return:
         """
-        self._api.WriteMessageToReservationOutput(self._reservation_id, message)
+        if self._output_writer:
+            self._output_writer.write(message)
+        else:
+            self._api.WriteMessageToReservationOutput(self._reservation_id, message)
+
+    def flush(self):
+        """
+        wait until all messages are printed (relevant only for buffering output writer)
+        :return:
+        """
+        if self._output_writer and hasattr(self._output_writer, "flush"):
+            self._output_writer.flush()
 
     @staticmethod
     def _html_wrap(content, color, elm):
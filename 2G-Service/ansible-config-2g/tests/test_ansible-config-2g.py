@@ -6,8 +6,13 @@ Tests for `AnsibleConfig2GDriver`
 """
 from driver import AnsibleConfig2GDriver
 
+import json
 import unittest
 
+from mock import Mock
+
+from cloudshell.cm.ansible.domain.ansible_configuration import AnsibleConfigurationParser
+
 
 
 
@@ -22,6 +27,32 @@ class TestAnsibleConfig2GDriver(unittest.TestCase):
     def test_000_something(self):
         pass
 
+    def _get_ansible_config_json(self, attributes):
+        context = Mock()
+        context.resource.name = 'service'
+        attributes = dict(attributes, **{'Connection Method': 'ssh'})
+        context.resource.attributes = dict(('Ansible Config 2G.' + name, value) for name, value in attributes.items())
+        api = Mock()
+        api.DecryptPassword.return_value.Value = 'password'
+        host = Mock()
+        host.Name = 'host'
+        host.Address = '1.1.1.1'
+        host.ResourceAttributes = [Mock(Name='User', Value='user'), Mock(Name='Password', Value='encrypted')]
+        driver = AnsibleConfig2GDriver()
+        return driver._get_ansible_config_json(context, api, Mock(), 'http://server/site.yml', None,
+                                               infrastructure_resources=[host])
+
+    def test_readiness_cache_seconds_is_passed_to_the_ansible_configuration(self):
+        config_json = self._get_ansible_config_json({'Readiness Cache Seconds': '30'})
+
+        self.assertEqual(30, json.loads(config_json)['readinessCacheSeconds'])
+        self.assertEqual(30, AnsibleConfigurationParser(Mock()).json_to_object(config_json).readiness_cache_seconds)
+
+    def test_readiness_cache_is_disabled_without_the_attribute(self):
+        config_json = self._get_ansible_config_json({})
+
+        self.assertEqual(0, json.loads(config_json)['readinessCacheSeconds'])
+
 
 if __name__ == '__main__':
     import sys
@@ -1,19 +1,26 @@
 import os
+import time
 
 from cloudshell.cm.ansible.domain.Helpers.ansible_connection_helper import AnsibleConnectionHelper
+from cloudshell.cm.ansible.domain.callback_plugin_file import CallbackPluginFile
 from cloudshell.cm.ansible.domain.cancellation_sampler import CancellationSampler
-from cloudshell.cm.ansible.domain.connection_service import ConnectionService
+from cloudshell.cm.ansible.domain.connection_service import ConnectionService, OpenSshConnectionService
 from cloudshell.cm.ansible.domain.exceptions import AnsibleException
-from cloudshell.cm.ansible.domain.ansible_command_executor import AnsibleCommandExecutor, ReservationOutputWriter
+from cloudshell.cm.ansible.domain.ansible_command_executor import AnsibleCommandExecutor, ReservationOutputWriter, \
+    BufferedOutputWriter
 from cloudshell.cm.ansible.domain.ansible_config_file import AnsibleConfigFile
 from cloudshell.cm.ansible.domain.ansible_configuration import AnsibleConfigurationParser, AnsibleConfiguration
 from cloudshell.cm.ansible.domain.file_system_service import FileSystemService
 from cloudshell.cm.ansible.domain.filename_extractor import FilenameExtractor
+from cloudshell.cm.ansible.domain.git_repository_fetcher import GitRepositoryFetcher
+from cloudshell.cm.ansible.domain.gitlab_tree_fetcher import GitlabTreeFetcher
 from cloudshell.cm.ansible.domain.host_vars_file import HostVarsFile
 from cloudshell.cm.ansible.domain.http_request_service import HttpRequestService
 from cloudshell.cm.ansible.domain.inventory_file import InventoryFile
 from cloudshell.cm.ansible.domain.output.ansible_result import AnsibleResult
+from cloudshell.cm.ansible.domain.playbook_cache import PlaybookCache, BlobCache, ExtractedTreeCache
 from cloudshell.cm.ansible.domain.playbook_downloader import PlaybookDownloader
+from cloudshell.cm.ansible.domain.readiness_cache import ReadinessCache
 from cloudshell.cm.ansible.domain.temp_folder_scope import TempFolderScope
 from cloudshell.cm.ansible.domain.zip_service import ZipService
 from cloudshell.core.context.error_handling_context import ErrorHandlingContext
@@ -24,6 +31,10 @@ from domain.models import HttpAuth
 
 class AnsibleShell(object):
     INVENTORY_FILE_NAME = 'hosts'
+    # the control sockets of the ssh master connections (a short name, as a socket path is limited to ~100 chars)
+    SSH_CONTROL_FOLDER_NAME = 'cp'
+    # how long a master connection outlives the wait for the hosts, while idle
+    SSH_CONTROL_PERSIST_SECONDS = 300
 
     def __init__(self, file_system=None, playbook_downloader=None, playbook_executor=None, session_provider=None,
                  http_request_service=None, zip_service=None):
@@ -37,8 +48,10 @@ class AnsibleShell(object):
         zip_service = zip_service or ZipService()
         self.file_system = file_system or FileSystemService()
         filename_extractor = FilenameExtractor()
-        self.downloader = playbook_downloader or PlaybookDownloader(self.file_system, zip_service, http_request_service,
-                                                                    filename_extractor)
+        self.downloader = playbook_downloader or PlaybookDownloader(
+            self.file_system, zip_service, http_request_service, filename_extractor, PlaybookCache(),
+            GitlabTreeFetcher(http_request_service, BlobCache()), GitRepositoryFetcher(),
+            tree_cache=ExtractedTreeCache())
         self.executor = playbook_executor or AnsibleCommandExecutor()
         self.connection_service = ConnectionService()
         self.ansible_connection_helper = AnsibleConnectionHelper()
@@ -56,25 +69,60 @@ class AnsibleShell(object):
             with ErrorHandlingContext(logger):
                 with CloudShellSessionContext(command_context) as api:
                     ansi_conf = AnsibleConfigurationParser(api).json_to_object(ansi_conf_json)
-                    output_writer = ReservationOutputWriter(api, command_context)
                     cancellation_sampler = CancellationSampler(cancellation_context)
 
-                    with TempFolderScope(self.file_system, logger):
-                        self._add_ansible_config_file(logger)
-                        self._add_host_vars_files(ansi_conf, logger)
-                        self._wait_for_all_hosts_to_be_deployed(ansi_conf, logger, output_writer)
-                        self._add_inventory_file(ansi_conf, logger)
-                        playbook_name = self._download_playbook(ansi_conf, cancellation_sampler, logger)
-                        self._run_playbook(ansi_conf, playbook_name, output_writer, cancellation_sampler, logger)
+                    with BufferedOutputWriter(ReservationOutputWriter(api, command_context),
+                                              logger=logger) as output_writer:
+                        with TempFolderScope(self.file_system, logger):
+                            ssh_master = self._create_ssh_master(ansi_conf)
+                            try:
+                                self._add_ansible_config_file(ssh_master, logger)
+                                self._add_callback_plugin_file(logger)
+                                self._add_host_vars_files(ansi_conf, logger)
+                                self._wait_for_all_hosts_to_be_deployed(ansi_conf, logger, output_writer,
+                                                                        ssh_master,
+                                                                        command_context.reservation.reservation_id)
+                                self._add_inventory_file(ansi_conf, logger)
+                                playbook_name = self._download_playbook(ansi_conf, cancellation_sampler, logger)
+                                self._run_playbook(ansi_conf, playbook_name, output_writer, cancellation_sampler,
+                                                   logger)
+                            finally:
+                                self.connection_service.clear_key_cache()
+                                if ssh_master:
+                                    ssh_master.close_masters(logger)
 
-    def _add_ansible_config_file(self, logger):
+    def _create_ssh_master(self, ansi_conf):
         """
+        :type ansi_conf: AnsibleConfiguration
+        :return: The service that opens the ssh master connections, when they are reused by ansible.
+        :rtype: OpenSshConnectionService
+        """
+        if not ansi_conf.reuse_ssh_connections:
+            return None
+        control_path_dir = os.path.join(self.file_system.get_working_dir(), self.SSH_CONTROL_FOLDER_NAME)
+        self.file_system.create_folder(control_path_dir)
+        persist_seconds = int(float(ansi_conf.timeout_minutes or 0) * 60) + self.SSH_CONTROL_PERSIST_SECONDS
+        return OpenSshConnectionService(control_path_dir, persist_seconds)
+
+    def _add_ansible_config_file(self, ssh_master, logger):
+        """
+        :type ssh_master: OpenSshConnectionService
         :type logger: Logger
         """
         with AnsibleConfigFile(self.file_system, logger) as file:
             file.ignore_ssh_key_checking()
             file.force_color()
             file.set_retry_path("." + os.pathsep)
+            file.enable_callback_plugin(CallbackPluginFile.FOLDER_NAME, CallbackPluginFile.PLUGIN_NAME)
+            if ssh_master:
+                file.reuse_ssh_connections(ssh_master.control_path_dir)
+
+    def _add_callback_plugin_file(self, logger):
+        """
+        :type logger: Logger
+        """
+        with CallbackPluginFile(self.file_system, logger) as file:
+            file.set_events_file(CallbackPluginFile.EVENTS_FILE_NAME)
 
     def _add_inventory_file(self, ansi_conf, logger):
         """
@@ -109,6 +157,7 @@ class AnsibleShell(object):
                     with self.file_system.create_file(file_name, 0400) as file_stream:
                         file_stream.write(host_conf.access_key)
                     file.add_conn_file(file_name)
+                    host_conf.access_key_file = file_name
 
     def _download_playbook(self, ansi_conf, cancellation_sampler, logger):
         """
@@ -120,7 +169,13 @@ class AnsibleShell(object):
         repo = ansi_conf.playbook_repo
         # we need password field to be passed for gitlab auth tokens (which require token and not user)
         auth = HttpAuth(repo.username, repo.password) if repo.password else None
-        playbook_name = self.downloader.get(ansi_conf.playbook_repo.url, auth, logger, cancellation_sampler)
+        sha256_url = None
+        if repo.published_checksum:
+            # published next to the file (for example: 'http://server/playbook.zip.sha256')
+            path, separator, query = repo.url.partition('?')
+            sha256_url = path + '.sha256' + separator + query
+        playbook_name = self.downloader.get(ansi_conf.playbook_repo.url, auth, logger, cancellation_sampler,
+                                            sha256=repo.sha256, sha256_url=sha256_url, entry_point=repo.entry_point)
         return playbook_name
 
     def _run_playbook(self, ansi_conf, playbook_name, output_writer, cancellation_sampler, logger):
@@ -135,33 +190,111 @@ class AnsibleShell(object):
 
         output, error = self.executor.execute_playbook(
             playbook_name, self.INVENTORY_FILE_NAME, ansi_conf.additional_cmd_args, output_writer, logger,
-            cancellation_sampler)
-        ansible_result = AnsibleResult(output, error, [h.ip for h in ansi_conf.hosts_conf])
+            cancellation_sampler, stream_output=ansi_conf.stream_output, spool_output=ansi_conf.spool_output,
+            spool_tail_size=ansi_conf.spool_tail_size)
+        try:
+            ansible_result = AnsibleResult(output, error, [h.ip for h in ansi_conf.hosts_conf],
+                                           events_path=CallbackPluginFile.EVENTS_FILE_NAME)
+        finally:
+            if ansi_conf.spool_output and hasattr(output, 'close'):
+                # the spooled output is a memory map of a file in the temp folder
+                output.close()
 
         if not ansible_result.success:
             raise AnsibleException(ansible_result.to_json())
 
-    def _wait_for_all_hosts_to_be_deployed(self, ansi_conf, logger, output_writer):
+    def _wait_for_all_hosts_to_be_deployed(self, ansi_conf, logger, output_writer, ssh_master=None,
+                                           reservation_id=None):
         """
 
         :param cloudshell.cm.ansible.domain.ansible_configurationa.AnsibleConfiguration ansi_conf:
         :param Logger logger:
         :param domain.ansible_command_executor.ReservationOutputWriter output_writer:
+        :param OpenSshConnectionService ssh_master: Opens the ssh master connections (optional).
+        :param str reservation_id: The hosts that were reachable in the reservation a short time ago are not checked.
         :return:
         """
         wait_for_deploy_msg = "Waiting for all hosts to deploy"
 
         logger.info(wait_for_deploy_msg)
         output_writer.write(wait_for_deploy_msg)
-        for host in ansi_conf.hosts_conf:
 
-            logger.info("Trying to connect to host:" + host.ip)
-            ansible_port = self.ansible_connection_helper.get_ansible_port(host)
+        readiness_cache = None
+        hosts = ansi_conf.hosts_conf
+        if reservation_id and ansi_conf.readiness_cache_seconds > 0:
+            readiness_cache = ReadinessCache(ttl_seconds=ansi_conf.readiness_cache_seconds)
+            hosts = [host for host in hosts
+                     if not self._was_reachable(readiness_cache, reservation_id, host, logger, output_writer)]
 
-            if HostVarsFile.ANSIBLE_PORT in host.parameters.keys() and (
-                    host.parameters[HostVarsFile.ANSIBLE_PORT] != '' and
-                    host.parameters[HostVarsFile.ANSIBLE_PORT] is not None):
-                ansible_port = host.parameters[HostVarsFile.ANSIBLE_PORT]
+        if ansi_conf.parallel_connection_checks > 1:
+            reachable_hosts = self._wait_for_hosts_concurrently(ansi_conf, hosts, logger, output_writer, ssh_master)
+        else:
+            reachable_hosts = self._wait_for_hosts_sequentially(ansi_conf, hosts, logger, output_writer, ssh_master)
+        reachable = []
+        try:
+            for host in reachable_hosts:
+                # the time of every host, a host that was reachable at the start of a long wait expires earlier
+                reachable.append((host, time.time()))
+        finally:
+            # even if another host failed, so the next playbook of the reservation doesn't wait for these
+            if readiness_cache and reachable:
+                self._set_reachable(readiness_cache, reservation_id, reachable, logger)
+
+        output_writer.write("Communication check completed.")
+
+    def _was_reachable(self, readiness_cache, reservation_id, host, logger, output_writer):
+        """
+        :type readiness_cache: ReadinessCache
+        :type reservation_id: str
+        :type host: HostConfiguration
+        :type logger: Logger
+        :type output_writer: OutputWriter
+        :rtype: bool
+        """
+        key = ReadinessCache.get_key(host.ip, self._get_host_ansible_port(host), host.connection_method)
+        try:
+            reachable_at = readiness_cache.get_reachable_at(reservation_id, key)
+        except Exception as e:
+            # the cache is an optimization, the host is checked
+            logger.warning('Failed to read the readiness cache: %s' % e)
+            return False
+        if reachable_at is None:
+            return False
+        message = "Host %s was reachable %.0f seconds ago, skipping the connection check" % (
+            host.ip, time.time() - reachable_at)
+        logger.info(message)
+        output_writer.write(message)
+        return True
+
+    def _set_reachable(self, readiness_cache, reservation_id, hosts, logger):
+        """
+        :type readiness_cache: ReadinessCache
+        :type reservation_id: str
+        :param list[(HostConfiguration, float)] hosts: The hosts, and when they were reachable.
+        :type logger: Logger
+        """
+        reachable_at = dict((ReadinessCache.get_key(host.ip, self._get_host_ansible_port(host), host.connection_method),
+                             at) for host, at in hosts)
+        try:
+            readiness_cache.set_reachable(reservation_id, reachable_at)
+        except Exception as e:
+            # the cache is an optimization, the hosts were already checked
+            logger.warning('Failed to update the readiness cache: %s' % e)
+
+    def _wait_for_hosts_sequentially(self, ansi_conf, hosts, logger, output_writer, ssh_master):
+        """
+        :type ansi_conf: AnsibleConfiguration
+        :type hosts: list[HostConfiguration]
+        :type logger: Logger
+        :type output_writer: OutputWriter
+        :type ssh_master: OpenSshConnectionService
+        :return: Generator of the hosts, yielded when they are reachable.
+        :rtype: collections.Iterable[HostConfiguration]
+        """
+        for host in hosts:
+
+            logger.info("Trying to connect to host:" + host.ip)
+            ansible_port = self._get_host_ansible_port(host)
 
             port_ansible_port = "Ansible Timeout: " + str(ansi_conf.timeout_minutes) + " Ansible port: " + ansible_port
 
@@ -170,6 +303,51 @@ class AnsibleShell(object):
             output_writer.write(port_ansible_port)
 
             self.connection_service.check_connection(logger, host, ansible_port=ansible_port,
-                                                     timeout_minutes=ansi_conf.timeout_minutes)
+                                                     timeout_minutes=ansi_conf.timeout_minutes,
+                                                     retry_policy=ansi_conf.retry_policy, ssh_master=ssh_master)
+            yield host
 
-        output_writer.write("Communication check completed.")
+    def _wait_for_hosts_concurrently(self, ansi_conf, hosts, logger, output_writer, ssh_master):
+        """
+        :type ansi_conf: AnsibleConfiguration
+        :type hosts: list[HostConfiguration]
+        :type logger: Logger
+        :type output_writer: OutputWriter
+        :type ssh_master: OpenSshConnectionService
+        :return: Generator of the hosts, yielded when they are reachable.
+        :rtype: collections.Iterable[HostConfiguration]
+        """
+        if not hosts:
+            return
+        hosts_and_ports = []
+        for host in hosts:
+            ansible_port = self._get_host_ansible_port(host)
+            logger.info("Trying to connect to host:" + host.ip + " Ansible port: " + ansible_port)
+            hosts_and_ports.append((host, ansible_port))
+
+        output_writer.write("Waiting for %s hosts (Ansible Timeout: %s, checking %s hosts at a time)" %
+                            (len(hosts_and_ports), ansi_conf.timeout_minutes, ansi_conf.parallel_connection_checks))
+
+        reachable_hosts = self.connection_service.check_connections(logger, hosts_and_ports,
+                                                                    timeout_minutes=ansi_conf.timeout_minutes,
+                                                                    max_workers=ansi_conf.parallel_connection_checks,
+                                                                    retry_policy=ansi_conf.retry_policy,
+                                                                    ssh_master=ssh_master)
+        for i, host in enumerate(reachable_hosts):
+            logger.info("Host is reachable: " + host.ip)
+            output_writer.write("Host %s is reachable (%s/%s)" % (host.ip, i + 1, len(hosts_and_ports)))
+            yield host
+
+    def _get_host_ansible_port(self, host):
+        """
+        :type host: HostConfiguration
+        :rtype: str
+        """
+        ansible_port = self.ansible_connection_helper.get_ansible_port(host)
+
+        if HostVarsFile.ANSIBLE_PORT in host.parameters.keys() and (
+                host.parameters[HostVarsFile.ANSIBLE_PORT] != '' and
+                host.parameters[HostVarsFile.ANSIBLE_PORT] is not None):
+            ansible_port = host.parameters[HostVarsFile.ANSIBLE_PORT]
+
+        return ansible_port
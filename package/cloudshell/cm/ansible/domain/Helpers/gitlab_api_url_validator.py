@@ -25,6 +25,26 @@ def is_gitlab_rest_url(url):
     return True
 
 
+def is_gitlab_api_url(url):
+    """"
+    Any url of the repository api of a project (a file, the archive, the tree or a blob), for example:
+    http://192.168.85.62/api/v4/projects/4/repository/archive.zip?sha=master
+    :param str url: the user input url
+    """
+    return re.match("https?://.+/api/v\d/projects/[^/]+/repository/", url) is not None
+
+
+def is_gitlab_tree_url(url):
+    """"
+    A folder of the repository (all the files under it are downloaded), should be of the following form:
+    http://192.168.85.62/api/{api_version}/projects/{project_id}/repository/tree?ref={git branch}&path={folder}
+    ex input - http://192.168.85.62/api/v4/projects/4/repository/tree?ref=master&path=roles
+    (without 'path', the whole project is downloaded)
+    :param str url: the user input url
+    """
+    return re.match("https?://.+/api/v\d/projects/[^/]+/repository/tree(\?.*)?$", url) is not None
+
+
 if __name__ == "__main__":
     input_url = "http://192.168.85.62/api/v4/projects/41/repository/files/hello_world.sh/raw?ref=master"
     is_gitlab = is_gitlab_rest_url(input_url)
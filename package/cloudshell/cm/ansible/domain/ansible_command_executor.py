@@ -1,22 +1,35 @@
 from subprocess import Popen, PIPE
 import time
 import os
+import select
 from logging import Logger
+from Queue import Queue, Empty
+from threading import Thread
 from cloudshell.api.cloudshell_api import CloudShellAPISession
 import re
 
 from cloudshell.cm.ansible.domain.cancellation_sampler import CancellationSampler
 from cloudshell.cm.ansible.domain.output.unixToHtmlConverter import UnixToHtmlColorConverter
 from cloudshell.cm.ansible.domain.output.ansible_result import AnsibleResult
+from cloudshell.cm.ansible.domain.output.output_capture import OutputCapture, SpooledOutputCapture
 from cloudshell.shell.core.context import ResourceCommandContext
 from cloudshell.cm.ansible.domain.stdout_accumulator import StdoutAccumulator, StderrAccumulator
 
 
 class AnsibleCommandExecutor(object):
-    def __init__(self):
-        pass
+    POLLING_INTERVAL_SECONDS = 2
+    CANCELLATION_SAMPLE_SECONDS = 0.1
+    READ_SIZE = 64 * 1024
 
-    def execute_playbook(self, playbook_file, inventory_file, args, output_writer, logger, cancel_sampler):
+    def __init__(self, event_driven=None):
+        """
+        :param bool event_driven: Wait on the process pipes with select (instead of polling them every 2 seconds).
+        Defaults to True where select supports pipes (posix).
+        """
+        self.event_driven = os.name == 'posix' if event_driven is None else event_driven
+
+    def execute_playbook(self, playbook_file, inventory_file, args, output_writer, logger, cancel_sampler,
+                         stream_output=False, spool_output=False, spool_tail_size=None):
         """
         :type playbook_file: str
         :type inventory_file: str
@@ -24,56 +37,129 @@ class AnsibleCommandExecutor(object):
         :type logger: Logger
         :type output_writer: OutputWriter
         :type cancel_sampler: CancellationSampler
-        :rtype: AnsibleResult
+        :param bool stream_output: Write the output while the playbook runs (instead of once it is done).
+        :param bool spool_output: Write the output to files in the working dir, and keep only its tail in memory.
+        :param int spool_tail_size: Number of characters to keep in memory when spooling the output.
+        :return: The output (a read only memory map when spooling) and the error of ansible.
+        :rtype: (str, str)
         """
         shell_command = self._create_shell_command(playbook_file, inventory_file, args)
 
         logger.info('Running cmd \'%s\' ...' % shell_command)
         start_time = time.time()
         process = Popen(shell_command, shell=True, stdout=PIPE, stderr=PIPE)
-        all_txt_err = ''
-        all_txt_out = ''
+        if spool_output:
+            capture = SpooledOutputCapture(os.getcwd(), spool_tail_size)
+        else:
+            capture = OutputCapture()
+
+        if self.event_driven:
+            output_pump = self._select_output(process, cancel_sampler)
+        else:
+            output_pump = self._poll_output(process, cancel_sampler)
 
+        if stream_output:
+            streamer = OutputStreamer(output_writer, logger)
+            try:
+                with capture:
+                    for txt_out, txt_err in output_pump:
+                        capture.append(txt_out, txt_err)
+                        streamer.write(txt_out, txt_err)
+            finally:
+                streamer.close()
+        else:
+            with capture:
+                for txt_out, txt_err in output_pump:
+                    capture.append(txt_out, txt_err)
+
+            converter = UnixToHtmlColorConverter()
+            full_output = ''
+            try:
+                tail_size = len(capture.view())
+                if tail_size < capture.size():
+                    output_writer.write('Showing the last %s of %s characters of the output' %
+                                        (tail_size, capture.size()))
+                # the chunks are converted one by one, so the text of the output is never joined here (only its html)
+                html = [converter.feed(txt) for txt in capture.iter_text()]
+                html.append(converter.close())
+                full_output = ''.join(html)
+                del html
+                # the same string when there is nothing to remove
+                full_output = converter.remove_strike(full_output)
+                output_writer.write(full_output)
+                logger.error(full_output)
+            except Exception as e:
+                output_writer.write('failed to write text of %s characters (%s)' % (len(full_output), e))
+                logger.debug("failed to write:" + full_output)
+                logger.debug("failed to write.")
+            # the html copy of the output isn't needed anymore
+            del full_output
+
+        elapsed = time.time() - start_time
+        err_line_count = capture.line_count(OutputCapture.ERR)
+        out_line_count = capture.line_count(OutputCapture.OUT)
+        logger.info('Done (after \'%s\' sec, with %s lines of output, with %s lines of error).' % (elapsed, out_line_count, err_line_count))
+        logger.debug('Err: %s', capture.view(OutputCapture.ERR))
+        logger.debug('Out: %s', capture.view(OutputCapture.OUT))
+        logger.debug('Code: '+str(process.returncode))
+
+        return capture.get_results()
+
+    def _poll_output(self, process, cancel_sampler):
+        """
+        Sample the process output every few seconds (until the process exits).
+        :type process: Popen
+        :type cancel_sampler: CancellationSampler
+        :return: Generator of (stdout text, stderr text) pairs.
+        """
         with StdoutAccumulator(process.stdout) as stdout:
             with StderrAccumulator(process.stderr) as stderr:
-                txt_lines = []
                 while True:
-                    txt_err = stderr.read_all_txt()
-                    txt_out = stdout.read_all_txt()
-                    if txt_err:
-                        all_txt_err += txt_err
-                        txt_lines.append(txt_err)
-                    if txt_out:
-                        all_txt_out += txt_out
-                        txt_lines.append(txt_out)
+                    yield stdout.read_all_txt(), stderr.read_all_txt()
                     if process.poll() is not None:
                         break
                     if cancel_sampler.is_cancelled():
                         process.kill()
                         cancel_sampler.throw()
-                    time.sleep(2)
-
-                converter = UnixToHtmlColorConverter()
-                try:
-                    full_output = converter.convert(os.linesep.join(txt_lines))
-                    full_output = converter.remove_strike(full_output)
-                    output_writer.write(full_output)
-                    logger.error(full_output)
-                except Exception as e:
-                    output_writer.write('failed to write text of %s characters (%s)' % (len(full_output), e))
-                    logger.debug("failed to write:" + full_output)
-                    logger.debug("failed to write.")
-
-        elapsed = time.time() - start_time
-        err_line_count = len(all_txt_err.split(os.linesep))
-        out_line_count = len(all_txt_out.split(os.linesep))
-        logger.info('Done (after \'%s\' sec, with %s lines of output, with %s lines of error).' % (elapsed, out_line_count, err_line_count))
-        logger.debug('Err: '+all_txt_err)
-        logger.debug('Out: '+all_txt_out)
-        logger.debug('Code: '+str(process.returncode))
-
-        return all_txt_out, all_txt_err
+                    time.sleep(self.POLLING_INTERVAL_SECONDS)
+        # the accumulators read until the end of the streams on exit
+        yield stdout.read_all_txt(), stderr.read_all_txt()
 
+    def _select_output(self, process, cancel_sampler):
+        """
+        Read the process output as soon as it is available (until both pipes are closed or the process exits).
+        The cancellation is sampled every CANCELLATION_SAMPLE_SECONDS, and an empty pair is generated when there is
+        no output during that time.
+        :type process: Popen
+        :type cancel_sampler: CancellationSampler
+        :return: Generator of (stdout text, stderr text) pairs.
+        """
+        out_fd = process.stdout.fileno()
+        err_fd = process.stderr.fileno()
+        open_fds = [out_fd, err_fd]
+        try:
+            while open_fds:
+                readable, _, _ = select.select(open_fds, [], [], self.CANCELLATION_SAMPLE_SECONDS)
+                for fd in readable:
+                    data = os.read(fd, self.READ_SIZE)
+                    if not data:
+                        open_fds.remove(fd)
+                    elif fd == out_fd:
+                        yield data, ''
+                    else:
+                        yield '', data
+                if not readable:
+                    yield '', ''
+                # processes forked by ansible (e.g. ssh control persist) may keep the pipes open after it exits
+                if not readable and process.poll() is not None:
+                    break
+                if cancel_sampler.is_cancelled():
+                    process.kill()
+                    cancel_sampler.throw()
+            process.wait()
+        finally:
+            process.stdout.close()
+            process.stderr.close()
 
     def _create_shell_command(self, playbook_file, inventory_file, args):
         command = "ansible"
@@ -87,6 +173,88 @@ class AnsibleCommandExecutor(object):
         return command
 
 
+class OutputStreamer(object):
+    MAX_CHUNK_SIZE = 32 * 1024
+    MAX_DELAY_SECONDS = 2
+
+    def __init__(self, output_writer, logger, max_chunk_size=None, max_delay_seconds=None):
+        """
+        Converts the playbook output to html and writes it in bounded chunks while the playbook runs.
+        Only complete lines are written (unless a single line is longer than the chunk size), and a chunk is written
+        once it reaches max_chunk_size or once its oldest text is max_delay_seconds old.
+        :type output_writer: OutputWriter
+        :type logger: Logger
+        :type max_chunk_size: int
+        :type max_delay_seconds: float
+        """
+        self.output_writer = output_writer
+        self.logger = logger
+        self.max_chunk_size = max_chunk_size or self.MAX_CHUNK_SIZE
+        self.max_delay_seconds = max_delay_seconds or self.MAX_DELAY_SECONDS
+        self.converter = UnixToHtmlColorConverter()
+        self.partial_lines = {}
+        self.pending = []
+        self.pending_size = 0
+        self.pending_since = None
+
+    def write(self, txt_out, txt_err):
+        """
+        :type txt_out: str
+        :type txt_err: str
+        """
+        if txt_err:
+            self._add('err', txt_err)
+        if txt_out:
+            self._add('out', txt_out)
+        if self.pending_size >= self.max_chunk_size or \
+                (self.pending and time.time() - self.pending_since >= self.max_delay_seconds):
+            self.flush()
+
+    def close(self):
+        for stream in sorted(self.partial_lines.keys()):
+            self._append_pending(self.partial_lines.pop(stream))
+        self.flush()
+
+    def flush(self):
+        text = ''.join(self.pending)
+        self.pending = []
+        self.pending_size = 0
+        self.pending_since = None
+        while text:
+            end = len(text)
+            if end > self.max_chunk_size:
+                end = text.rfind('\n', 0, self.max_chunk_size) + 1 or self.max_chunk_size
+            self._write_chunk(text[:end])
+            text = text[end:]
+
+    def _add(self, stream, txt):
+        txt = self.partial_lines.pop(stream, '') + txt
+        end = txt.rfind('\n') + 1
+        if end:
+            self._append_pending(txt[:end])
+        if end < len(txt):
+            if len(txt) - end >= self.max_chunk_size:
+                self._append_pending(txt[end:])
+            else:
+                self.partial_lines[stream] = txt[end:]
+
+    def _append_pending(self, txt):
+        if self.pending_since is None:
+            self.pending_since = time.time()
+        self.pending.append(txt)
+        self.pending_size += len(txt)
+
+    def _write_chunk(self, txt):
+        html = ''
+        try:
+            html = self.converter.remove_strike(self.converter.convert(txt))
+            self.output_writer.write(html)
+            self.logger.error(html)
+        except Exception as e:
+            self.output_writer.write('failed to write text of %s characters (%s)' % (len(html), e))
+            self.logger.debug("failed to write:" + html)
+
+
 class OutputWriter(object):
     def write(self, msg):
         """
@@ -106,3 +274,118 @@ class ReservationOutputWriter(OutputWriter):
 
     def write(self, msg):
         self.session.WriteMessageToReservationOutput(self.resevation_id, msg)
+
+
+class BufferedOutputWriter(OutputWriter):
+    MAX_BATCH_SIZE = 64 * 1024
+    MAX_LATENCY_SECONDS = 1
+    MAX_QUEUED_MESSAGES = 1000
+    # a message that starts with a tag is html (the converted output, the html lines of the 2G services)
+    HTML_PATTERN = re.compile(r'\s*<[a-zA-Z!/]')
+    HTML_SEPARATOR = '<br />'
+    _CLOSE = object()
+
+    def __init__(self, output_writer, max_batch_size=None, max_latency_seconds=None, max_queued_messages=None,
+                 logger=None):
+        """
+        Writes the messages on a background thread, merging the messages that are written close to each other into
+        batches, so that at most one batch is written every max_latency_seconds. Html messages are merged only with
+        html messages (separated by a line break tag, as html ignores the new lines), and text messages with text.
+        When the inner writer is slow and max_queued_messages are waiting, 'write' blocks until there is room.
+        A batch that the inner writer fails to write is replaced by a short 'failed to write' message (the errors of
+        the inner writer are not raised, as the messages are written after 'write' returned).
+        Should be used as a context manager ('with'), which flushes all the messages on exit.
+        :param OutputWriter output_writer: The writer of the batches.
+        :param int max_batch_size: Maximal number of characters in a batch (a longer message is written alone).
+        :param float max_latency_seconds: Minimal time between two batches.
+        :param int max_queued_messages: Number of messages that can wait before 'write' blocks.
+        :param Logger logger: Logs the messages that failed to be written (optional).
+        """
+        self.output_writer = output_writer
+        self.max_batch_size = max_batch_size or self.MAX_BATCH_SIZE
+        self.max_latency_seconds = max_latency_seconds or self.MAX_LATENCY_SECONDS
+        self.queue = Queue(max_queued_messages or self.MAX_QUEUED_MESSAGES)
+        self.thread = Thread(target=self._write_batches)
+        self.thread.daemon = True
+        self.logger = logger
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.queue.put(self._CLOSE)
+        self.thread.join()
+
+    def write(self, msg):
+        self.queue.put(msg)
+
+    def flush(self):
+        """
+        Wait until all the messages that were written so far are written by the inner writer.
+        """
+        self.queue.join()
+
+    def _write_batches(self):
+        last_write_time = 0
+        messages = []
+        # the total length of the messages (the CLOSE marker, which can only be the last one, is 0)
+        size = 0
+        separator_size = len(os.linesep)
+        while True:
+            if not messages:
+                messages.append(self.queue.get())
+                size = self._len(messages[0])
+            deadline = last_write_time + self.max_latency_seconds
+            while size + separator_size * (len(messages) - 1) < self.max_batch_size and \
+                    messages[-1] is not self._CLOSE:
+                try:
+                    timeout = deadline - time.time()
+                    msg = self.queue.get(timeout=timeout) if timeout > 0 else self.queue.get_nowait()
+                except Empty:
+                    break
+                messages.append(msg)
+                size += self._len(msg)
+
+            count = 1
+            batch_size = self._len(messages[0])
+            is_html = self._is_html(messages[0])
+            separator = self.HTML_SEPARATOR if is_html else os.linesep
+            while count < len(messages):
+                msg = messages[count]
+                if msg is not self._CLOSE and self._is_html(msg) != is_html:
+                    break
+                next_size = batch_size + len(separator) + self._len(msg)
+                if next_size > self.max_batch_size:
+                    break
+                batch_size = next_size
+                count += 1
+            batch, messages = messages[:count], messages[count:]
+            size -= sum(self._len(m) for m in batch)
+
+            if batch[0] is not self._CLOSE:
+                self._write_batch(separator.join(m for m in batch if m is not self._CLOSE))
+                last_write_time = time.time()
+            for _ in batch:
+                self.queue.task_done()
+            if batch[-1] is self._CLOSE:
+                return
+
+    def _write_batch(self, txt):
+        try:
+            self.output_writer.write(txt)
+        except Exception as e:
+            # for example, a message that is too long for the api
+            if self.logger:
+                self.logger.debug('failed to write: ' + txt)
+            try:
+                self.output_writer.write('failed to write text of %s characters (%s)' % (len(txt), e))
+            except Exception as e:
+                if self.logger:
+                    self.logger.warning('Failed to write to the reservation output: %s' % e)
+
+    def _len(self, msg):
+        return 0 if msg is self._CLOSE else len(msg)
+
+    def _is_html(self, msg):
+        return msg is not self._CLOSE and bool(self.HTML_PATTERN.match(msg))
@@ -14,6 +14,7 @@ class AnsibleConfigFile(object):
         self.file_system = file_system
         self.logger = logger
         self.config_keys = {}
+        self.ssh_connection_keys = {}
 
     def __enter__(self):
         self.logger.info('Creating \'%s\' configuration file ...'%AnsibleConfigFile.FILE_NAME)
@@ -24,6 +25,10 @@ class AnsibleConfigFile(object):
             lines = ['[defaults]']
             for key, value in self.config_keys.iteritems():
                 lines.append(key + ' = ' + value)
+            if self.ssh_connection_keys:
+                lines.append('[ssh_connection]')
+                for key, value in self.ssh_connection_keys.iteritems():
+                    lines.append(key + ' = ' + value)
             file_stream.write(os.linesep.join(lines))
             self.logger.debug(os.linesep.join(lines))
         self.logger.info('Done.')
@@ -36,3 +41,18 @@ class AnsibleConfigFile(object):
 
     def set_retry_path(self, save_path):
         self.config_keys['retry_files_save_path'] = str(save_path)
+
+    def enable_callback_plugin(self, plugins_folder, plugin_name):
+        self.config_keys['callback_plugins'] = str(plugins_folder)
+        # 'callback_whitelist' was renamed to 'callbacks_enabled' in ansible 2.11
+        self.config_keys['callback_whitelist'] = str(plugin_name)
+        self.config_keys['callbacks_enabled'] = str(plugin_name)
+
+    def reuse_ssh_connections(self, control_path_dir):
+        """
+        :param str control_path_dir: The folder of the ssh control sockets, with master connections that were opened
+        before ansible runs (%C is the same hash the ssh client uses for the master connection of a host).
+        """
+        self.ssh_connection_keys['ssh_args'] = '-C -o ControlMaster=auto -o ControlPersist=60s'
+        self.ssh_connection_keys['control_path_dir'] = str(control_path_dir)
+        self.ssh_connection_keys['control_path'] = '%(directory)s/%%C'
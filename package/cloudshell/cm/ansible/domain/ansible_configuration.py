@@ -1,6 +1,8 @@
 import json
 from cloudshell.api.cloudshell_api import CloudShellAPISession
 
+from cloudshell.cm.ansible.domain.retry_policy import RetryPolicy
+
 
 # OPTIONAL SCRIPT PARAMETERS, IF PRESENT WILL OVERRIDE THE DEFAULT READ-ONLY VALUES
 # THESE SHOULD BE CUSTOM PARAMS DEFINED ON APP
@@ -9,14 +11,31 @@ ACCESS_KEY_PARAM = "ACCESS_KEY"
 
 
 class AnsibleConfiguration(object):
-    def __init__(self, playbook_repo=None, hosts_conf=None, additional_cmd_args=None, timeout_minutes = None):
+    def __init__(self, playbook_repo=None, hosts_conf=None, additional_cmd_args=None, timeout_minutes = None,
+                 parallel_connection_checks=None, stream_output=None, spool_output=None, spool_tail_size=None,
+                 retry_policy=None, reuse_ssh_connections=None, readiness_cache_seconds=None):
         """
         :type playbook_repo: PlaybookRepository
         :type hosts_conf: list[HostConfiguration]
         :type additional_cmd_args: str
         :type timeout_minutes: float
+        :type parallel_connection_checks: int
+        :type stream_output: bool
+        :type spool_output: bool
+        :type spool_tail_size: int
+        :type retry_policy: RetryPolicy
+        :type reuse_ssh_connections: bool
+        :param float readiness_cache_seconds: How long a reachable host isn't checked again in the same reservation
+        (default: 0, always checked).
         """
         self.timeout_minutes = timeout_minutes or 0.0
+        self.parallel_connection_checks = parallel_connection_checks or 1
+        self.stream_output = stream_output or False
+        self.spool_output = spool_output or False
+        self.spool_tail_size = spool_tail_size
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.reuse_ssh_connections = reuse_ssh_connections or False
+        self.readiness_cache_seconds = readiness_cache_seconds or 0
         self.playbook_repo = playbook_repo or PlaybookRepository()
         self.hosts_conf = hosts_conf or []
         self.additional_cmd_args = additional_cmd_args
@@ -31,6 +50,9 @@ class PlaybookRepository(object):
         self.url = None
         self.username = None
         self.password = None
+        self.sha256 = None
+        self.published_checksum = False
+        self.entry_point = None
 
 
 class HostConfiguration(object):
@@ -41,6 +63,8 @@ class HostConfiguration(object):
         self.username = None
         self.password = None
         self.access_key = None
+        # the file of the access key (relative to the working dir), once it is written for ansible
+        self.access_key_file = None
         self.groups = []
         self.parameters = {}
 
@@ -83,6 +107,17 @@ class AnsibleConfigurationParser(object):
         ansi_conf = AnsibleConfiguration()
         ansi_conf.additional_cmd_args = json_obj.get('additionalArgs')
         ansi_conf.timeout_minutes = json_obj.get('timeoutMinutes', 0.0)
+        ansi_conf.parallel_connection_checks = int(json_obj.get('parallelConnectionChecks') or 1)
+        ansi_conf.stream_output = bool_parse(json_obj.get('streamOutput'))
+        ansi_conf.spool_output = bool_parse(json_obj.get('spoolOutput'))
+        if json_obj.get('spoolTailSize'):
+            ansi_conf.spool_tail_size = int(json_obj['spoolTailSize'])
+        ansi_conf.retry_policy = RetryPolicy(initial_interval_seconds=json_obj.get('retryInitialIntervalSeconds'),
+                                             max_interval_seconds=json_obj.get('retryMaxIntervalSeconds'),
+                                             multiplier=json_obj.get('retryMultiplier'),
+                                             jitter=json_obj.get('retryJitter'))
+        ansi_conf.reuse_ssh_connections = bool_parse(json_obj.get('reuseSshConnections'))
+        ansi_conf.readiness_cache_seconds = float(json_obj.get('readinessCacheSeconds') or 0)
 
         # if using 2G wrapper service then skip the param override replacement step - all params come from service
         is_second_gen_service = json_obj.get('isSecondGenService')
@@ -91,6 +126,10 @@ class AnsibleConfigurationParser(object):
             ansi_conf.playbook_repo.url = json_obj['repositoryDetails'].get('url')
             ansi_conf.playbook_repo.username = json_obj['repositoryDetails'].get('username')
             ansi_conf.playbook_repo.password = json_obj['repositoryDetails'].get('password')
+            ansi_conf.playbook_repo.sha256 = json_obj['repositoryDetails'].get('sha256')
+            ansi_conf.playbook_repo.published_checksum = bool_parse(
+                json_obj['repositoryDetails'].get('publishedChecksum'))
+            ansi_conf.playbook_repo.entry_point = json_obj['repositoryDetails'].get('entryPoint')
 
         for host_index, json_host in enumerate(json_obj.get('hostsDetails', [])):
             host_conf = HostConfiguration()
@@ -0,0 +1,78 @@
+import os
+from file_system_service import FileSystemService
+from logging import Logger
+
+
+# The plugin runs inside ansible (which may run on python 3), and not inside the driver.
+PLUGIN_SOURCE = '''import json
+
+from ansible.plugins.callback import CallbackBase
+
+
+class CallbackModule(CallbackBase):
+    """
+    Writes the host results of the playbook as newline-delimited json events (created by the cloudshell ansible shell).
+    """
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = 'notification'
+    CALLBACK_NAME = '%(plugin_name)s'
+    CALLBACK_NEEDS_WHITELIST = True
+    CALLBACK_NEEDS_ENABLED = True
+
+    def __init__(self, *args, **kwargs):
+        super(CallbackModule, self).__init__(*args, **kwargs)
+        self._events_file = open(%(events_file)r, 'w')
+
+    def _write_event(self, event, host, **fields):
+        fields['event'] = event
+        fields['host'] = host
+        self._events_file.write(json.dumps(fields) + '\\n')
+        self._events_file.flush()
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        self._write_event('failed', result._host.get_name(), ignore_errors=ignore_errors,
+                          details=self._dump_results(result._result))
+
+    def v2_runner_on_unreachable(self, result):
+        self._write_event('unreachable', result._host.get_name(), details=self._dump_results(result._result))
+
+    def v2_playbook_on_stats(self, stats):
+        for host in sorted(stats.processed.keys()):
+            self._write_event('stats', host, **stats.summarize(host))
+        self._events_file.close()
+'''
+
+
+class CallbackPluginFile(object):
+    FOLDER_NAME = 'callback_plugins'
+    PLUGIN_NAME = 'cloudshell_json_events'
+    EVENTS_FILE_NAME = 'ansible_events.jsonl'
+
+    def __init__(self, file_system, logger):
+        """
+        A callback plugin that makes ansible write the host results to a json events file (see AnsibleResult).
+        :type file_system: FileSystemService
+        :type logger: Logger
+        """
+        self.file_system = file_system
+        self.logger = logger
+        self.file_path = os.path.join(CallbackPluginFile.FOLDER_NAME, CallbackPluginFile.PLUGIN_NAME + '.py')
+        self.events_file = CallbackPluginFile.EVENTS_FILE_NAME
+
+    def __enter__(self):
+        self.logger.info('Creating \'%s\' callback plugin file ...' % self.file_path)
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        if not self.file_system.exists(CallbackPluginFile.FOLDER_NAME):
+            self.file_system.create_folder(CallbackPluginFile.FOLDER_NAME)
+        with self.file_system.create_file(self.file_path) as file_stream:
+            file_stream.write(PLUGIN_SOURCE % {'plugin_name': CallbackPluginFile.PLUGIN_NAME,
+                                               'events_file': self.events_file})
+        self.logger.info('Done (events file: %s).' % self.events_file)
+
+    def set_events_file(self, events_file):
+        """
+        :param str events_file: The path of the events file (relative to the working dir of ansible).
+        """
+        self.events_file = events_file
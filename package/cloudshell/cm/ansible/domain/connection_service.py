@@ -1,18 +1,33 @@
+import hashlib
+import os
 import re
 import socket
+import tempfile
 from StringIO import StringIO
 from abc import ABCMeta, abstractmethod
+from Queue import Queue
 from multiprocessing.pool import ThreadPool
+from subprocess import Popen
+from threading import Event, Thread, Lock
 from uuid import uuid4
 
 import time
 
 import requests
 import winrm
-from paramiko.ssh_exception import NoValidConnectionsError
+from paramiko.ssh_exception import NoValidConnectionsError, SSHException
 from winrm.exceptions import WinRMTransportError
 
-from paramiko import SSHClient, AutoAddPolicy, RSAKey
+from paramiko import SSHClient, AutoAddPolicy, RSAKey, ECDSAKey, DSSKey
+
+try:
+    # paramiko 2.2+
+    from paramiko import Ed25519Key
+except ImportError:
+    Ed25519Key = None
+
+from cloudshell.cm.ansible.domain.port_probe import PortProbe
+from cloudshell.cm.ansible.domain.retry_policy import RetryPolicy
 
 
 class IVMConnectionService(object):
@@ -62,7 +77,60 @@ class WindowsConnectionService(IVMConnectionService):
             raise ExcutorConnectionError(0, e)
 
 
+class PrivateKeyCache(object):
+    # the key classes, by the header of the key file
+    KEY_CLASSES = [('-----BEGIN RSA ', RSAKey), ('-----BEGIN EC ', ECDSAKey), ('-----BEGIN OPENSSH ', Ed25519Key),
+                   ('-----BEGIN DSA ', DSSKey)]
+
+    def __init__(self):
+        """
+        The parsed private keys, by the SHA-256 of the key (many hosts share the same key, and every retry uses it).
+        """
+        self._keys = {}
+        self._lock = Lock()
+
+    def get(self, access_key):
+        """
+        :param str access_key: A private key file (RSA, ECDSA, Ed25519 or DSA).
+        :rtype: paramiko.PKey
+        """
+        digest = hashlib.sha256(access_key).hexdigest()
+        # the parsing is under the lock too, so concurrent checks with the same key parse it once
+        with self._lock:
+            key = self._keys.get(digest)
+            if not key:
+                key = self._parse(access_key)
+                self._keys[digest] = key
+            return key
+
+    def clear(self):
+        with self._lock:
+            self._keys.clear()
+
+    @staticmethod
+    def _parse(access_key):
+        """
+        :type access_key: str
+        :rtype: paramiko.PKey
+        """
+        key_classes = [key_class for header, key_class in PrivateKeyCache.KEY_CLASSES
+                       if key_class and header in access_key]
+        # a key without a known header (or of a newer format) is tried with all the classes
+        key_classes += [key_class for _, key_class in PrivateKeyCache.KEY_CLASSES
+                        if key_class and key_class not in key_classes]
+        error = None
+        for key_class in key_classes:
+            try:
+                return key_class.from_private_key(StringIO(access_key))
+            except SSHException as e:
+                error = error or e
+        raise error
+
+
 class LinuxConnectionService(IVMConnectionService):
+    def __init__(self):
+        self.key_cache = PrivateKeyCache()
+
     def check_connection(self, target_host, logger, ansible_port):
         """
 
@@ -70,6 +138,7 @@ class LinuxConnectionService(IVMConnectionService):
         :param logger Logger:
         :return:
         """
+        session = None
         try:
             logger.info("Creating a session.")
 
@@ -80,8 +149,7 @@ class LinuxConnectionService(IVMConnectionService):
                 session.connect(target_host.ip, port=ansible_port, username=target_host.username,
                                 password=target_host.password)
             elif target_host.access_key:
-                key_stream = StringIO(target_host.access_key)
-                key_obj = RSAKey.from_private_key(key_stream)
+                key_obj = self.key_cache.get(target_host.access_key)
                 session.connect(target_host.ip, port=ansible_port, username=target_host.username, pkey=key_obj)
             else:
                 raise Exception('Both password and access key are empty.')
@@ -93,6 +161,97 @@ class LinuxConnectionService(IVMConnectionService):
             raise ExcutorConnectionError(e.errno, e)
         except Exception as e:
             raise ExcutorConnectionError(0, e)
+        finally:
+            if session:
+                session.close()
+
+
+class OpenSshConnectionService(IVMConnectionService):
+    # the errors of the ssh client, and the matching errnos
+    ERRORS = [('Connection refused', 111), ('Connection timed out', 110), ('Operation timed out', 110),
+              ('No route to host', 113)]
+
+    def __init__(self, control_path_dir, persist_seconds, ssh='ssh'):
+        """
+        Check the connection with the OpenSSH client, and keep the connection open as a ControlMaster, so ansible
+        (configured with the same control path) reuses it instead of a new key exchange.
+        :param str control_path_dir: The folder of the control sockets.
+        :param int persist_seconds: How long an idle master connection is kept open.
+        :param str ssh: The ssh executable.
+        """
+        self.control_path_dir = control_path_dir
+        self.persist_seconds = persist_seconds
+        self.ssh = ssh
+
+    @staticmethod
+    def get_control_path(control_path_dir):
+        """
+        :param str control_path_dir: The folder of the control sockets.
+        :return: The control path of a host ('%C' is a hash of the local host, host, port and user, the same for
+        the ssh client of ansible).
+        :rtype: str
+        """
+        return os.path.join(control_path_dir, '%C')
+
+    def check_connection(self, target_host, logger, ansible_port):
+        """
+        :type target_host: cloudshell.cm.ansible.domain.ansible_configuration.HostConfiguration
+        :param logger Logger:
+        :param str ansible_port:
+        """
+        logger.info("Test connection (and open a master connection)")
+        args = ['-o', 'ControlMaster=auto',
+                '-o', 'ControlPersist=%ss' % self.persist_seconds,
+                '-o', 'ControlPath=' + self.get_control_path(self.control_path_dir),
+                '-o', 'BatchMode=yes',
+                '-o', 'StrictHostKeyChecking=no',
+                '-o', 'UserKnownHostsFile=' + os.devnull,
+                '-o', 'ConnectTimeout=10',
+                '-i', target_host.access_key_file,
+                '-p', str(ansible_port),
+                '-l', target_host.username,
+                target_host.ip, 'true']
+        try:
+            returncode, error = self._run(args)
+        except Exception as e:
+            raise ExcutorConnectionError(0, e)
+        if returncode != 0:
+            error_code = next((code for message, code in OpenSshConnectionService.ERRORS if message in error), 0)
+            raise ExcutorConnectionError(error_code, Exception('Ssh failed: ' + error.strip()))
+        logger.info("Done testing connection")
+
+    def close_masters(self, logger):
+        """
+        Stop the master connections (before their control sockets are deleted).
+        :param logger Logger:
+        """
+        if not os.path.isdir(self.control_path_dir):
+            return
+        for name in os.listdir(self.control_path_dir):
+            returncode, error = self._run(['-o', 'ControlPath=' + os.path.join(self.control_path_dir, name),
+                                           '-O', 'exit', 'unused'])
+            if returncode != 0:
+                logger.debug('Failed to stop the ssh master connection \'%s\': %s' % (name, error.strip()))
+
+    def _run(self, args):
+        """
+        Run the ssh client and wait for it to exit.
+        The master connection that the client leaves in the background may inherit its stdout/stderr (depending on
+        the OpenSSH version), so they are files instead of pipes: reading a pipe to its end would block until the
+        master exits.
+        :param list[str] args: The arguments of the ssh executable.
+        :return: The exit code and the stderr of the client.
+        :rtype: (int, str)
+        """
+        with open(os.devnull, 'r+') as devnull:
+            stderr = tempfile.TemporaryFile()
+            try:
+                process = Popen([self.ssh] + args, stdin=devnull, stdout=devnull, stderr=stderr)
+                returncode = process.wait()
+                stderr.seek(0)
+                return returncode, stderr.read()
+            finally:
+                stderr.close()
 
 
 class ConnectionService(object):
@@ -100,14 +259,29 @@ class ConnectionService(object):
         self.valid_errnos = [10060, 10061, 10064, 10065, 500, 113, 111, 110]
         self.linuxConnectionService = LinuxConnectionService()
         self.windowsConnectionService = WindowsConnectionService()
+        # the handshakes wait for the port to accept tcp connections (None: no pre-probe)
+        self.port_probe = PortProbe()
+
+    def clear_key_cache(self):
+        """
+        Forget the parsed private keys (they are kept for a single command).
+        """
+        self.linuxConnectionService.key_cache.clear()
 
-    def check_connection(self, logger, target_host, ansible_port=None, timeout_minutes=10):
+    def check_connection(self, logger, target_host, ansible_port=None, timeout_minutes=10, start_time=None,
+                         stop_event=None, probe_port=True, retry_policy=None, ssh_master=None):
         """
 
         :param timeout_minutes:
         :param ansible_port:
         :param Logger logger:
         :param cloudshell.cm.ansible.domain.ansible_configuration.HostConfiguration target_host:
+        :param float start_time: When the timeout started counting (defaults to now).
+        :param threading.Event stop_event: When set, the retries are aborted.
+        :param bool probe_port: Wait for the port to accept tcp connections before the first handshake.
+        :param RetryPolicy retry_policy: The delays between the attempts (default: RetryPolicy()).
+        :param OpenSshConnectionService ssh_master: Checks the ssh hosts with an access key, and keeps their
+        connections open for ansible (optional).
         :return:
         """
         # 10060  ETIMEDOUT                      Operation timed out
@@ -119,8 +293,17 @@ class ConnectionService(object):
         # 111    ERROR_SSH_APPLICATION_CLOSED   User on the other side of connection closed
         # application that led to disconnection
         # 110    ERROR_SSH_CONNECTION_LOST      Connection was lost by some reason
-        interval_seconds = 10
-        start_time = time.time()
+        retry_policy = retry_policy or RetryPolicy()
+        timeout_seconds = float(timeout_minutes) * 60
+        attempt = 0
+        start_time = start_time or time.time()
+        if probe_port and self.port_probe:
+            # when the port doesn't open in time, the handshake below fails with the actual error
+            try:
+                next(self._wait_for_ports(logger, [(target_host, ansible_port)], timeout_minutes, start_time,
+                                          stop_event), None)
+            except Exception:
+                logger.exception('Failed to probe the port, checking the connection without it.')
         while True:
             try:
                 logger.info("check connection")
@@ -132,6 +315,13 @@ class ConnectionService(object):
                                                                    ansible_port=ansible_port)
 
                     logger.info("Done checking connection on windows")
+                elif ssh_master and target_host.connection_method == 'ssh' and target_host.access_key_file and \
+                        not target_host.password:
+                    logger.info("Check connection on linux (with a ssh master connection)")
+                    ssh_master.check_connection(target_host=target_host,
+                                                logger=logger,
+                                                ansible_port=int(ansible_port))
+                    logger.info("Done checking connection on linux")
                 else:
                     logger.info("Check connection on linux")
                     self.linuxConnectionService.check_connection(target_host=target_host,
@@ -142,6 +332,99 @@ class ConnectionService(object):
             except ExcutorConnectionError as e:
                 if e.errno not in self.valid_errnos:
                     raise e.inner_error
-                if time.time() - start_time >= timeout_minutes * 60:
+                elapsed_seconds = time.time() - start_time
+                if elapsed_seconds >= timeout_seconds:
                     raise e.inner_error
-                time.sleep(interval_seconds)
+                attempt += 1
+                interval_seconds = retry_policy.get_delay(attempt, elapsed_seconds, timeout_seconds)
+                if stop_event:
+                    if stop_event.wait(interval_seconds):
+                        raise e.inner_error
+                else:
+                    time.sleep(interval_seconds)
+
+    def check_connections(self, logger, hosts_and_ports, timeout_minutes=10, max_workers=10, retry_policy=None,
+                          ssh_master=None):
+        """
+        Check the connection to all the hosts concurrently, using a bounded pool of worker threads.
+        The ports of all the hosts are probed on a single thread, and a host is handed to a worker (for the handshake)
+        only when its port accepts tcp connections, so the workers aren't busy with hosts that are still booting.
+        The timeout is shared by all the hosts (it starts counting when this method is called).
+        :param Logger logger:
+        :param list[(HostConfiguration, str)] hosts_and_ports: Pairs of host and its ansible port.
+        :param float timeout_minutes:
+        :param int max_workers: The maximum number of hosts to check at the same time.
+        :param RetryPolicy retry_policy: The delays between the attempts (default: RetryPolicy()).
+        :param OpenSshConnectionService ssh_master: Checks the ssh hosts with an access key, and keeps their
+        connections open for ansible (optional).
+        :return: Generator of the hosts, yielded in the order they become reachable.
+        :rtype: collections.Iterable[HostConfiguration]
+        """
+        if not hosts_and_ports:
+            return
+        start_time = time.time()
+        stop_event = Event()
+        # (host, None) for a reachable host, or (None, error)
+        results = Queue()
+
+        def check(host_and_port):
+            host, ansible_port = host_and_port
+            try:
+                self.check_connection(logger, host, ansible_port=ansible_port, timeout_minutes=timeout_minutes,
+                                      start_time=start_time, stop_event=stop_event, probe_port=False,
+                                      retry_policy=retry_policy, ssh_master=ssh_master)
+                results.put((host, None))
+            except Exception as e:
+                results.put((None, e))
+
+        pool = ThreadPool(max(1, min(int(max_workers), len(hosts_and_ports))))
+
+        def submit_when_open():
+            pending = list(hosts_and_ports)
+            try:
+                if self.port_probe:
+                    for host_and_port in self._wait_for_ports(logger, hosts_and_ports, timeout_minutes, start_time,
+                                                              stop_event):
+                        pending.remove(host_and_port)
+                        pool.apply_async(check, (host_and_port,))
+            except Exception:
+                logger.exception('Failed to probe the ports, checking the connections without it.')
+            # the ports that didn't open in time fail in the handshake, with the actual error
+            if not stop_event.is_set():
+                for host_and_port in pending:
+                    pool.apply_async(check, (host_and_port,))
+
+        probe_thread = Thread(target=submit_when_open, name='port-probe')
+        probe_thread.daemon = True
+        probe_thread.start()
+        try:
+            for _ in hosts_and_ports:
+                host, error = results.get()
+                if error:
+                    raise error
+                yield host
+        finally:
+            # a failing host fails the whole wait, so the rest of the hosts should stop retrying
+            stop_event.set()
+            probe_thread.join()
+            pool.terminate()
+
+    def _wait_for_ports(self, logger, hosts_and_ports, timeout_minutes, start_time, stop_event):
+        """
+        :param Logger logger:
+        :param list[(HostConfiguration, str)] hosts_and_ports: Pairs of host and its ansible port.
+        :param float timeout_minutes:
+        :param float start_time: When the timeout started counting.
+        :param threading.Event stop_event: When set, the wait is aborted.
+        :return: Generator of the pairs, in the order their ports accept tcp connections.
+        :rtype: collections.Iterable[(HostConfiguration, str)]
+        """
+        by_address = {}
+        for host_and_port in hosts_and_ports:
+            host, ansible_port = host_and_port
+            by_address.setdefault((host.ip, int(ansible_port)), []).append(host_and_port)
+        timeout_seconds = float(timeout_minutes) * 60 - (time.time() - start_time)
+        for address in self.port_probe.wait_for_ports(list(by_address.keys()), timeout_seconds, stop_event):
+            logger.info('Port %s of host %s is open.' % (address[1], address[0]))
+            for host_and_port in by_address[address]:
+                yield host_and_port
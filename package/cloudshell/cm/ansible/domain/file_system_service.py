@@ -45,6 +45,15 @@ class FileSystemService(object):
             os.chmod(path, int(chmod))
         return f
 
+    def read_file(self, path):
+        """
+        Read the whole content of a file.
+        :param str path: The path of the file.
+        :rtype: str
+        """
+        with open(path, 'rb') as f:
+            return f.read()
+
     def get_working_dir(self):
         """
         Get the current working directory.
@@ -6,7 +6,9 @@ from cloudshell.cm.ansible.domain.exceptions import AnsibleException
 
 class FilenameExtractor(object):
     def __init__(self):
-        self._filename_pattern = "(?P<filename>\s*[\w,\s-]+\.(yaml|yml|zip)\s*)"
+        # the name has to end with the extension (followed by a header parameter, a query or nothing), so neither
+        # 'site.yml.tar.gz' is taken for 'site.yml' nor 'site.yml.bak' for a playbook
+        self._filename_pattern = "(?P<filename>\s*[\w,\s.-]+\.(tar\.gz|tar\.zst|tgz|tzst|yaml|yml|zip)\s*)(?=[;?#]|$)"
         self.filename_patterns = {
             "content-disposition": "\s*((?i)inline|attachment|extension-token)\s*;\s*filename=" +
                                    self._filename_pattern,
@@ -46,5 +48,6 @@ class FilenameExtractor(object):
                 if file_name:
                     return file_name.strip()
 
-        raise AnsibleException("playbook file of supported types: '.yml', '.yaml', '.zip' was not found")
+        raise AnsibleException("playbook file of supported types: '.yml', '.yaml', '.zip', '.tar.gz', '.tar.zst' "
+                               "was not found")
 
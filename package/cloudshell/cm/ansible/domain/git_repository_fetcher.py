@@ -0,0 +1,148 @@
+import base64
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import uuid
+from subprocess import Popen, PIPE
+
+from cloudshell.cm.ansible.domain.cancellation_sampler import CancellationSampler
+from cloudshell.cm.ansible.domain.playbook_cache import FileLock, create_private_folder
+from logging import Logger
+from models import HttpAuth
+
+
+def is_git_url(url):
+    """
+    A git repository, should be of the following form: git+{remote url}#{branch, tag or commit}
+    ex input - git+https://github.com/org/playbooks.git#v1.2 (without the ref, the default branch is used)
+    :param str url: the user input url
+    """
+    return url.startswith('git+')
+
+
+class GitRepositoryFetcher(object):
+    FOLDER_NAME = 'cloudshell_ansible_git'
+    COMMIT_PATTERN = re.compile('^[0-9a-fA-F]{40}$')
+
+    def __init__(self, root=None, git='git'):
+        """
+        Checks out a ref of a git repository. Every remote has a persistent bare mirror on the machine (shared by all
+        the drivers), which is updated with an incremental fetch, and the files are checked out of it. A commit that
+        is already in the mirror is checked out without fetching (only the access to the remote is checked).
+        :param str root: The folder of the mirrors (default: a folder in the os tmp folder).
+        :param str git: The git executable.
+        """
+        self.root = root or os.path.join(tempfile.gettempdir(), GitRepositoryFetcher.FOLDER_NAME)
+        self.git = git
+
+    def fetch(self, url, auth, folder, logger, cancel_sampler):
+        """
+        :param str url: The git url (see is_git_url).
+        :param HttpAuth auth: Credentials of an https remote (optional, the password may be an access token).
+        :param str folder: The destination folder (usually the working dir).
+        :param Logger logger:
+        :param CancellationSampler cancel_sampler:
+        :return: The checked out files, relative to the folder.
+        :rtype: list[str]
+        """
+        remote, ref = self._parse_url(url)
+        mirror = os.path.join(self.root, hashlib.sha256(remote).hexdigest() + '.git')
+        config = self._get_auth_config(auth)
+        create_private_folder(self.root)
+
+        # one driver at a time updates a mirror (a checkout only reads the objects, which never change)
+        with FileLock(mirror + '.lock'):
+            if not os.path.exists(mirror):
+                logger.info('Cloning a mirror of \'%s\' ...' % remote)
+                self._clone_mirror(remote, mirror, config)
+            elif self.COMMIT_PATTERN.match(ref) and self._has_commit(mirror, ref):
+                # the mirror is shared by all the credentials of the remote, so the access is still checked
+                self._git(['--git-dir', mirror] + config + ['ls-remote', '--quiet', 'origin', 'HEAD'])
+                logger.info('The commit %s is already in the mirror of \'%s\'.' % (ref, remote))
+            else:
+                logger.info('Fetching \'%s\' into its mirror ...' % remote)
+                self._git(['--git-dir', mirror] + config + ['fetch', '--prune', '--quiet', 'origin'])
+            commit = self._git(['--git-dir', mirror, 'rev-parse', '--verify', '--quiet', ref + '^{commit}'],
+                               error='The ref \'%s\' was not found in \'%s\'' % (ref, remote)).strip()
+        cancel_sampler.throw_if_canceled()
+
+        logger.info('Checking out %s (%s) ...' % (ref, commit))
+        files = self._checkout(mirror, commit, folder)
+        logger.info('Done (%s files).' % len(files))
+        return files
+
+    @staticmethod
+    def _parse_url(url):
+        """
+        :type url: str
+        :return: The remote url and the ref.
+        :rtype: (str, str)
+        """
+        remote, _, ref = url[len('git+'):].partition('#')
+        return remote, ref or 'HEAD'
+
+    @staticmethod
+    def _get_auth_config(auth):
+        """
+        The credentials are sent in a header of the git commands, so they are never saved in the mirror.
+        :type auth: HttpAuth
+        :rtype: list[str]
+        """
+        if not auth:
+            return []
+        # gitlab (and github) accept an access token with any user name
+        credentials = base64.b64encode('%s:%s' % (auth.username or 'oauth2', auth.password or ''))
+        return ['-c', 'http.extraHeader=Authorization: Basic ' + credentials]
+
+    def _clone_mirror(self, remote, mirror, config):
+        # cloned next to the mirror and renamed, so a failed clone never leaves a broken mirror
+        new_mirror = mirror + '.new-' + uuid.uuid4().hex
+        try:
+            self._git(config + ['clone', '--mirror', '--quiet', remote, new_mirror])
+            os.rename(new_mirror, mirror)
+        finally:
+            if os.path.exists(new_mirror):
+                shutil.rmtree(new_mirror, ignore_errors=True)
+
+    def _has_commit(self, mirror, commit):
+        try:
+            self._git(['--git-dir', mirror, 'cat-file', '-e', commit + '^{commit}'])
+            return True
+        except Exception:
+            return False
+
+    def _checkout(self, mirror, commit, folder):
+        """
+        Check out the files of the commit with a temporary index, so the mirror itself is never modified.
+        :rtype: list[str]
+        """
+        index_fd, index_path = tempfile.mkstemp(prefix='cloudshell_ansible_index_')
+        os.close(index_fd)
+        os.remove(index_path)
+        env = dict(os.environ, GIT_INDEX_FILE=index_path)
+        try:
+            git = ['--git-dir', mirror, '--work-tree', folder]
+            self._git(git + ['read-tree', commit], env=env)
+            self._git(git + ['checkout-index', '--all', '--force'], env=env)
+        finally:
+            if os.path.exists(index_path):
+                os.remove(index_path)
+        names = self._git(['--git-dir', mirror, 'ls-tree', '-r', '-z', '--name-only', commit])
+        return [name.replace('/', os.sep) for name in names.split('\0') if name]
+
+    def _git(self, args, env=None, error=None):
+        """
+        :param list[str] args: The arguments of the git command.
+        :param dict env: The environment variables of the command (default: the ones of the driver).
+        :param str error: The error message when the command fails (default: the error of git).
+        :return: The output of the command.
+        :rtype: str
+        """
+        process = Popen([self.git] + args, stdout=PIPE, stderr=PIPE, env=env)
+        output, git_error = process.communicate()
+        if process.returncode != 0:
+            # without the credentials of a remote url
+            raise Exception(error or 'Git failed: ' + re.sub('//[^/@\s]+@', '//***@', git_error.strip()))
+        return output
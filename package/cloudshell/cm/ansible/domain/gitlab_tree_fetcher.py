@@ -0,0 +1,121 @@
+import json
+import os
+import urllib
+from multiprocessing.pool import ThreadPool
+from urlparse import urlparse, parse_qs
+
+from cloudshell.cm.ansible.domain.cancellation_sampler import CancellationSampler
+from cloudshell.cm.ansible.domain.http_request_service import HttpRequestService
+from cloudshell.cm.ansible.domain.playbook_cache import BlobCache
+from logging import Logger
+from models import HttpAuth
+
+
+class GitlabTreeFetcher(object):
+    PAGE_SIZE = 100
+    CHUNK_SIZE = 1024 * 1024
+    # not more than the connections that the session keeps per server (HttpRequestService.POOL_SIZE)
+    WORKERS = 8
+
+    def __init__(self, http_request_service, blob_cache=None, workers=None):
+        """
+        Downloads a folder of a gitlab repository (or the whole project): lists the files of the folder with the tree
+        api, and downloads the blobs that aren't cached yet concurrently.
+        :param HttpRequestService http_request_service:
+        :param BlobCache blob_cache: (optional, for tests)
+        :param int workers: Max concurrent downloads.
+        """
+        self.http_request_service = http_request_service
+        self.blob_cache = blob_cache or BlobCache()
+        self.workers = workers or GitlabTreeFetcher.WORKERS
+
+    def fetch(self, url, auth, folder, logger, cancel_sampler):
+        """
+        :param str url: The tree url (see is_gitlab_tree_url).
+        :param HttpAuth auth: The access token in the password (optional).
+        :param str folder: The destination folder (usually the working dir).
+        :param Logger logger:
+        :param CancellationSampler cancel_sampler:
+        :return: The downloaded files, relative to the folder (and to the folder in the repository).
+        :rtype: list[str]
+        """
+        repository_url, ref, path = self._parse_url(url)
+        blobs = self._list_blobs(repository_url, ref, path, auth, logger, cancel_sampler)
+
+        missing = []
+        for sha, file_name in blobs:
+            target = os.path.join(folder, file_name)
+            target_folder = os.path.dirname(target)
+            if not os.path.exists(target_folder):
+                os.makedirs(target_folder)
+            if not self.blob_cache.restore(sha, target):
+                missing.append((sha, target))
+        logger.info('Found %s files (%s cached), downloading %s files ...' %
+                    (len(blobs), len(blobs) - len(missing), len(missing)))
+
+        if missing:
+            pool = ThreadPool(min(self.workers, len(missing)))
+            try:
+                download = lambda blob: self._download_blob(repository_url, blob[0], blob[1], auth, logger,
+                                                            cancel_sampler)
+                # iterated to the end, so the first error (or cancellation) is raised
+                for _ in pool.imap_unordered(download, missing):
+                    pass
+            finally:
+                pool.terminate()
+            self.blob_cache.evict()
+        logger.info('Done.')
+
+        return [file_name for _, file_name in blobs]
+
+    @staticmethod
+    def _parse_url(url):
+        """
+        :type url: str
+        :return: The repository api url, the ref (None for the default branch) and the folder in the repository.
+        :rtype: (str, str, str)
+        """
+        parsed = urlparse(url)
+        query = parse_qs(parsed.query)
+        repository_url = url[:url.index('/repository/tree') + len('/repository')]
+        ref = query.get('ref', [None])[0]
+        path = query.get('path', [''])[0].strip('/')
+        return repository_url, ref, path
+
+    def _list_blobs(self, repository_url, ref, path, auth, logger, cancel_sampler):
+        """
+        :return: The blob SHA and the file name (relative to the path) of the files under the path.
+        :rtype: list[(str, str)]
+        """
+        blobs = []
+        page = '1'
+        while page:
+            query = {'recursive': 'true', 'per_page': GitlabTreeFetcher.PAGE_SIZE, 'page': page}
+            if ref:
+                query['ref'] = ref
+            if path:
+                query['path'] = path
+            response = self.http_request_service.get_response(
+                repository_url + '/tree?' + urllib.urlencode(sorted(query.items())), auth, logger)
+            try:
+                entries = json.loads(''.join(response.iter_content(GitlabTreeFetcher.CHUNK_SIZE)))
+            finally:
+                response.close()
+            for entry in entries:
+                # folders are created for their files, submodules ('commit') aren't part of the repository
+                if entry['type'] == 'blob':
+                    file_name = entry['path'][len(path) + 1:] if path else entry['path']
+                    blobs.append((entry['id'], file_name.replace('/', os.sep)))
+            page = response.headers.get('X-Next-Page')
+            cancel_sampler.throw_if_canceled()
+        return blobs
+
+    def _download_blob(self, repository_url, sha, target, auth, logger, cancel_sampler):
+        cancel_sampler.throw_if_canceled()
+        response = self.http_request_service.get_response(repository_url + '/blobs/' + sha + '/raw', auth, logger)
+        try:
+            self.blob_cache.store(sha, response.iter_content(GitlabTreeFetcher.CHUNK_SIZE))
+        finally:
+            response.close()
+        if not self.blob_cache.restore(sha, target):
+            raise Exception('The blob %s was evicted from the cache before it was used' % sha)
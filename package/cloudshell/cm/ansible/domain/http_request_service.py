@@ -1,23 +1,65 @@
+from contextlib import contextmanager
+
 import requests
 from requests import Response
-from Helpers.gitlab_api_url_validator import is_gitlab_rest_url
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+from Helpers.gitlab_api_url_validator import is_gitlab_rest_url, is_gitlab_api_url
 from models import HttpAuth
 
 
 class HttpRequestService(object):
-    def get_response(self, url, auth, logger):
+    CONNECT_TIMEOUT_SECONDS = 10
+    READ_TIMEOUT_SECONDS = 60
+    RETRIES = 3
+    BACKOFF_FACTOR = 0.5
+    RETRY_STATUS_CODES = [500, 502, 503, 504]
+    POOL_SIZE = 10
+    PEEK_SIZE = 4 * 1024
+
+    def __init__(self, session=None):
+        """
+        Owns a session that lives as long as the service (the driver), so the connections to the same server (and
+        their TLS handshakes) are reused across downloads.
+        :param requests.Session session: (optional, for tests)
+        """
+        self.session = session or self._create_session()
+        self.timeout = (HttpRequestService.CONNECT_TIMEOUT_SECONDS, HttpRequestService.READ_TIMEOUT_SECONDS)
+
+    @staticmethod
+    def _create_session():
+        """
+        :rtype: requests.Session
+        """
+        # 5xx responses and connection errors (refused, reset) are retried with an exponential backoff, the last
+        # 5xx response is returned (and not raised), so it is reported like any other failed response
+        retry = Retry(total=HttpRequestService.RETRIES, connect=HttpRequestService.RETRIES,
+                      read=HttpRequestService.RETRIES, backoff_factor=HttpRequestService.BACKOFF_FACTOR,
+                      status_forcelist=HttpRequestService.RETRY_STATUS_CODES, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=HttpRequestService.POOL_SIZE,
+                              pool_maxsize=HttpRequestService.POOL_SIZE, max_retries=retry)
+        session = requests.Session()
+        session.verify = False
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def get_response(self, url, auth, logger, headers=None):
         """
         :param str url:
         :param HttpAuth auth:
         :param logging.Logger logger:
+        :param dict headers: Additional request headers (for example, the validators of a cached copy).
         :return:
         """
-        is_gitlab_url = is_gitlab_rest_url(url)
+        # a single file, or any other url of the repository api (the archive, the tree, a blob)
+        is_gitlab_url = is_gitlab_rest_url(url) or is_gitlab_api_url(url)
         if is_gitlab_url:
             logger.info("=== GITLAB Rest API request ===".format(url))
-            response = self._get_gitlab_response(url, auth, logger)
-            self._validate_response_status_code(response)
-            self._invalidate_gitlab_login_page(response)
+            response = self._peek(self._get_gitlab_response(url, auth, logger, headers))
+            with self._closed_on_error(response):
+                self._validate_response_status_code(response)
+                self._invalidate_gitlab_login_page(response)
         else:
             # if auth:
             #     if not auth.username:
@@ -26,31 +68,58 @@ class HttpRequestService(object):
             auth = (auth.username, auth.password) if auth else None
             if auth:
                 logger.info("Auth download flow.")
-                response = requests.get(url, auth=auth, stream=True, verify=False)
+                response = self._get(url, auth=auth, headers=headers)
             else:
                 logger.info("No-auth download flow.")
-                response = requests.get(url, stream=True, verify=False)
-            self._validate_response_status_code(response)
-            self._invalidate_html(response.content)
+                response = self._get(url, headers=headers)
+            response = self._peek(response)
+            with self._closed_on_error(response):
+                self._validate_response_status_code(response)
+                self._invalidate_html(response.head)
 
             logger.info("Playbook download response: {}".format(response.status_code))
         return response
 
+    def _get(self, url, auth=None, headers=None):
+        """
+        :rtype: Response
+        """
+        return self.session.get(url, auth=auth, stream=True, verify=False, headers=headers, timeout=self.timeout)
+
     @staticmethod
-    def _get_gitlab_response(url, auth, logger):
+    def _peek(response):
+        """
+        Read only the head of the body (enough to recognize an html page), the rest is still streamed by iter_content.
+        :type response: Response
+        :rtype: PeekedResponse
+        """
+        return PeekedResponse(response, HttpRequestService.PEEK_SIZE)
+
+    @staticmethod
+    @contextmanager
+    def _closed_on_error(response):
+        # the rest of the body isn't read, so the connection is returned to the pool only when the response is closed
+        try:
+            yield
+        except Exception:
+            response.close()
+            raise
+
+    def _get_gitlab_response(self, url, auth, logger, headers=None):
         """
         :param url:
         :param auth:
         :param logging.Logger logger:
+        :param dict headers:
         :return:
         """
         if auth:
             logger.info("Gitlab download from private repo with token...")
-            headers = {"PRIVATE-TOKEN": auth.password}
-            return requests.get(url, stream=True, verify=False, headers=headers)
+            headers = dict(headers or {}, **{"PRIVATE-TOKEN": auth.password})
+            return self._get(url, headers=headers)
         else:
             logger.info("Gitlab no auth download...")
-            return requests.get(url, stream=True, verify=False)
+            return self._get(url, headers=headers)
 
     @staticmethod
     def _validate_response_status_code(response):
@@ -68,8 +137,33 @@ class HttpRequestService(object):
 
     def _invalidate_gitlab_login_page(self, response):
         """
-        :param Response response: requests response object
+        :param PeekedResponse response: requests response object
         :return:
         """
-        if self._is_content_html(response.content) and "users/sign_in" in response.url:
+        if self._is_content_html(response.head) and "users/sign_in" in response.url:
             raise Exception('Authentication failed. Reached Gitlab Login. Gitlab Access Token required.')
+
+
+class PeekedResponse(object):
+    def __init__(self, response, peek_size):
+        """
+        A streamed response whose first bytes were already read (to inspect them before the body is saved).
+        Everything else is delegated to the response.
+        :type response: Response
+        :param int peek_size: Number of bytes to read up front.
+        """
+        self._response = response
+        self.head = next(response.iter_content(peek_size), '')
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        """
+        The whole body, starting with the head that was already read.
+        """
+        if self.head:
+            yield self.head
+        # a new generator over the raw stream continues from where the head ended
+        for chunk in self._response.iter_content(chunk_size, decode_unicode):
+            yield chunk
@@ -1,23 +1,36 @@
 import json
+import mmap
 import os
 import re
+from cStringIO import StringIO
 
 from cloudshell.cm.ansible.domain.output.unixToHtmlConverter import UnixToHtmlColorConverter
 
+START = '\033\[\d+\;\d+m'
+END = '\033\[0m'
+# the host is the inventory name of the host (ipv4, ipv6 or hostname)
+RECAP_PATTERN = re.compile(
+    '^(' + START + ')?(?P<host>[^\s\033]+)(' + END + ')?\s*\\t*\:.+unreachable=(?P<unreachable>\d+).+failed=(?P<failed>\d+)')
+FATAL_PATTERN = re.compile(
+    '^(' + START + ')?fatal: \[(?P<host>[^\]]+)\]\:.*=>\s*(?P<details>\{.*\})\s*(' + END + ')?$')
+ERROR_PATTERN = re.compile('^(' + START + ')(\[ERROR\]\:|ERROR\!)\s*(?P<txt>.*)\s*(' + END + ')\s*', re.MULTILINE | re.DOTALL)
+
 
 class AnsibleResult(object):
-    START = '\033\[\d+\;\d+m'
-    END = '\033\[0m'
     DID_NOT_RUN_ERROR = 'Did not run / no information for this host.'
 
-    def __init__(self, output, error, ips):
+    def __init__(self, output, error, ips, events_path=None):
         """
-        :type result: boolean
-        :type success: dict
+        :param str|mmap.mmap output: The output of ansible (a memory map of the output file when it was spooled).
+        :param str error: The error of ansible.
+        :param list[str] ips: The hosts of the playbook.
+        :param str events_path: The json events file of the callback plugin (see CallbackPluginFile). When it holds the
+        stats of the playbook, the host results are taken from it instead of being scraped from the output.
         """
         self.error = str(error)
         self.output = output
         self.ips = ips
+        self.events_path = events_path
         self.host_results = self._load()
         self.success = not [h for h in self.host_results if not h.success]
 
@@ -27,8 +40,9 @@ class AnsibleResult(object):
 
     def _load(self):
         host_results = []
-        recap_table = self._get_final_table()
-        error_by_host = self._get_failing_hosts_errors()
+        recap_table, error_by_host = self._read_events()
+        if not recap_table:
+            recap_table, error_by_host = self._parse_output()
         general_error = self._get_parsed_error()
         for ip in self.ips:
             # Success
@@ -45,29 +59,66 @@ class AnsibleResult(object):
                 host_results.append(HostResult(ip, False, self.DID_NOT_RUN_ERROR+os.linesep+general_error))
         return host_results
 
-    def _get_final_table(self):
+    def _read_events(self):
+        """
+        :return: The recap table and the errors by host, or empty dicts when there are no stats in the events file
+        (ansible failed before the end of the playbook, or the plugin wasn't loaded by an old ansible version).
+        :rtype: (dict, dict)
+        """
         table = {}
-        pattern = '^('+self.START+')?(?P<ip>\d+\.\d+\.\d+\.\d+)('+self.END+')?\s*\\t*\:.+unreachable=(?P<unreachable>\d+).+failed=(?P<failed>\d+)'
-        matches = self._scan_for_groups(pattern)
-        for m in matches:
-            table[m['ip']] = True if int(m['unreachable'])+int(m['failed']) == 0 else False
-        return table
+        host_to_error = {}
+        if not self.events_path or not os.path.exists(self.events_path):
+            return table, host_to_error
+        with open(self.events_path, 'r') as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    # the last line may be incomplete if ansible was killed
+                    continue
+                kind = event.get('event')
+                host = event.get('host')
+                if kind == 'stats':
+                    table[host] = int(event.get('unreachable', 0)) + int(event.get('failures', 0)) == 0
+                elif kind == 'unreachable' or (kind == 'failed' and not event.get('ignore_errors')):
+                    host_to_error[host] = event.get('details')
+        if not table:
+            return {}, {}
+        return table, host_to_error
 
-    def _get_failing_hosts_errors(self):
-        pattern = '^('+self.START+')?fatal: \[(?P<ip>\d+\.\d+\.\d+\.\d+)\]\:.*=>\s*(?P<details>\{.*\})\s*('+self.END+')?$'
-        matches = self._scan_for_groups(pattern)
-        ip_to_error = dict([(m['ip'], UnixToHtmlColorConverter().remove_strike(m['details'])) for m in matches])
-        return ip_to_error
+    def _parse_output(self):
+        """
+        Walk the output once, line by line, and collect the recap table and the fatal errors of the hosts.
+        :return: The recap table (host -> success) and the errors by host.
+        :rtype: (dict, dict)
+        """
+        table = {}
+        host_to_error = {}
+        for line in self._iter_output_lines():
+            # cheap substring checks, so the patterns run only on the lines that may match
+            if 'fatal: [' in line:
+                m = FATAL_PATTERN.match(line.rstrip('\r\n'))
+                if m:
+                    host_to_error[m.group('host')] = UnixToHtmlColorConverter.remove_strike(m.group('details'))
+            elif 'unreachable=' in line:
+                m = RECAP_PATTERN.match(line)
+                if m:
+                    table[m.group('host')] = int(m.group('unreachable')) + int(m.group('failed')) == 0
+        return table, host_to_error
 
-    def _scan_for_groups(self, pattern):
-        matches = list(re.finditer(pattern, self.output, re.MULTILINE))
-        matches = [m.groupdict() for m in matches]
-        return matches
+    def _iter_output_lines(self):
+        """
+        :rtype: collections.Iterable[str]
+        """
+        if isinstance(self.output, mmap.mmap):
+            self.output.seek(0)
+            return iter(self.output.readline, '')
+        # a read only StringIO shares the buffer of the string (nothing is copied or split up front)
+        return iter(StringIO(self.output).readline, '')
 
     def _get_parsed_error(self):
-        pattern = '^('+self.START+')(\[ERROR\]\:|ERROR\!)\s*(?P<txt>.*)\s*('+self.END+')\s*'
         minimized_error = self.error.replace(os.linesep + os.linesep, os.linesep)
-        matches = list(re.finditer(pattern, minimized_error, re.MULTILINE|re.DOTALL))
+        matches = list(ERROR_PATTERN.finditer(minimized_error))
         if(matches):
             return '\n'.join([m.groupdict()['txt'] for m in matches])
         else:
@@ -0,0 +1,149 @@
+import mmap
+import os
+from collections import deque
+
+
+class OutputCapture(object):
+    OUT = 'out'
+    ERR = 'err'
+
+    def __init__(self):
+        """
+        Holds the output of a process once, as an append-only list of (stream, text) chunks in the order they were
+        read. Consumers iterate the chunks (or a view of them) instead of keeping their own concatenated copies.
+        """
+        self._chunks = []
+        self._sizes = {self.OUT: 0, self.ERR: 0}
+        self._line_counts = {self.OUT: 0, self.ERR: 0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def append(self, txt_out, txt_err):
+        """
+        :type txt_out: str
+        :type txt_err: str
+        """
+        for stream, txt in ((self.ERR, txt_err), (self.OUT, txt_out)):
+            if txt:
+                self._add_chunk(stream, txt)
+                self._sizes[stream] += len(txt)
+                self._line_counts[stream] += txt.count('\n')
+
+    def _add_chunk(self, stream, txt):
+        self._chunks.append((stream, txt))
+
+    def get_results(self):
+        """
+        The full output and error of the process, as passed to AnsibleResult.
+        :rtype: (str, str)
+        """
+        return self.get_text(self.OUT), self.get_text(self.ERR)
+
+    def iter_text(self, stream=None):
+        """
+        :param str stream: OUT, ERR or None for both (interleaved in the order they were read).
+        :rtype: collections.Iterable[str]
+        """
+        return (txt for chunk_stream, txt in self._chunks if stream is None or chunk_stream == stream)
+
+    def get_text(self, stream=None):
+        """
+        :param str stream: OUT, ERR or None for both (interleaved in the order they were read).
+        :rtype: str
+        """
+        return ''.join(self.iter_text(stream))
+
+    def view(self, stream=None):
+        """
+        :param str stream: OUT, ERR or None for both (interleaved in the order they were read).
+        :rtype: OutputView
+        """
+        return OutputView(self, stream)
+
+    def size(self, stream=None):
+        return sum(size for s, size in self._sizes.iteritems() if stream is None or s == stream)
+
+    def line_count(self, stream=None):
+        return sum(count for s, count in self._line_counts.iteritems() if stream is None or s == stream)
+
+
+class SpooledOutputCapture(OutputCapture):
+    OUT_FILE_NAME = 'ansible_stdout.log'
+    ERR_FILE_NAME = 'ansible_stderr.log'
+    TAIL_SIZE = 1024 * 1024
+
+    def __init__(self, folder, tail_size=None):
+        """
+        Writes the output of a process to files and keeps only its tail (the last tail_size characters of both streams)
+        in memory. The chunks of this capture (iter_text, get_text, view) are the tail.
+        Should be used as a context manager ('with'), which closes the files on exit.
+        :param str folder: The folder of the files (usually the temp folder of the command).
+        :param int tail_size: Number of characters to keep in memory.
+        """
+        super(SpooledOutputCapture, self).__init__()
+        self.tail_size = tail_size or self.TAIL_SIZE
+        self.paths = {self.OUT: os.path.join(folder, self.OUT_FILE_NAME),
+                      self.ERR: os.path.join(folder, self.ERR_FILE_NAME)}
+        self._files = {}
+        self._chunks = deque()
+        self._tail_size = 0
+
+    def __enter__(self):
+        self._files = dict((stream, open(path, 'wb')) for stream, path in self.paths.iteritems())
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        for f in self._files.itervalues():
+            f.close()
+
+    def _add_chunk(self, stream, txt):
+        self._files[stream].write(txt)
+        self._chunks.append((stream, txt))
+        self._tail_size += len(txt)
+        while self._tail_size > self.tail_size:
+            first_stream, first_txt = self._chunks.popleft()
+            excess = self._tail_size - self.tail_size
+            if excess < len(first_txt):
+                self._chunks.appendleft((first_stream, first_txt[excess:]))
+                self._tail_size -= excess
+            else:
+                self._tail_size -= len(first_txt)
+
+    def get_results(self):
+        """
+        The full output (as a read only memory map of its file) and error of the process, as passed to AnsibleResult.
+        Should be called after the capture was closed (exited).
+        :rtype: (mmap.mmap|str, str)
+        """
+        with open(self.paths[self.ERR], 'rb') as f:
+            error = f.read()
+        if not self.size(self.OUT):
+            return '', error
+        with open(self.paths[self.OUT], 'rb') as f:
+            output = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return output, error
+
+
+class OutputView(object):
+    def __init__(self, capture, stream=None):
+        """
+        A read only view of (one of the streams of) a captured output. The text is joined only when the view is
+        converted to a string (for example, by a logger that emits it).
+        :type capture: OutputCapture
+        :type stream: str
+        """
+        self._capture = capture
+        self._stream = stream
+
+    def __iter__(self):
+        return self._capture.iter_text(self._stream)
+
+    def __len__(self):
+        return sum(len(txt) for txt in self)
+
+    def __str__(self):
+        return self._capture.get_text(self._stream)
@@ -1,43 +1,173 @@
-import os
 import re
 
+STRIKE_PATTERN = re.compile(r"<S[^>]*>|<[^>]S>")
+# control sequences (CSI), only the SGR ones (ending with 'm') change the color, the others are dropped
+CSI_PATTERN = re.compile('\033\\[([0-9;?]*)([@-~])')
+# a control sequence that was cut at the end of a chunk
+PARTIAL_CSI_PATTERN = re.compile('\033(\\[[0-9;?]*)?\\Z')
+
+DEFAULT_COLOR = 'white'
+COLORS = ['#B0B0B0',  # Black (gray)
+          '#C75646',  # Red
+          '#8EB33B',  # Green
+          '#D0B03C',  # Yellow
+          '#72B3CC',  # Blue
+          '#C8A0D1',  # Purple
+          '#218693',  # Cyan
+          '#B0B0B0']  # Gray
+BRIGHT_COLORS = ['#5D5D5D',  # Bright Black (gray)
+                 '#E09690',  # Bright Red
+                 '#CDEE69',  # Bright Green
+                 '#FFE377',  # Bright Yellow
+                 '#9CD9F0',  # Bright Blue
+                 '#FBB1F9',  # Bright Purple
+                 '#77DFD8',  # Bright Cyan
+                 '#F7F7F7']  # Bright Gray
+
+
+def _xterm_256_colors():
+    levels = [0, 95, 135, 175, 215, 255]
+    cube = ['#%02X%02X%02X' % (levels[i / 36], levels[i / 6 % 6], levels[i % 6]) for i in range(216)]
+    grays = ['#%02X%02X%02X' % ((8 + 10 * i,) * 3) for i in range(24)]
+    return COLORS + BRIGHT_COLORS + cube + grays
+
+XTERM_256_COLORS = _xterm_256_colors()
+
 
 class UnixToHtmlColorConverter(object):
+    # the sequences ansible uses, and their colors
+    unixToHtml = dict([('\033[0m', DEFAULT_COLOR)] +
+                      [('\033[0;3%sm' % i, color) for i, color in enumerate(COLORS)] +
+                      [('\033[1;3%sm' % i, color) for i, color in enumerate(BRIGHT_COLORS)])
+
     def __init__(self):
-        self.unixToHtml = dict([
-            (re.escape('\033[0m'), 'white'),
-
-            (re.escape('\033[0;30m'), '#B0B0B0'),  # Black (gray)
-            (re.escape('\033[0;31m'), '#C75646'),  # Red
-            (re.escape('\033[0;32m'), '#8EB33B'),  # Green
-            (re.escape('\033[0;33m'), '#D0B03C'),  # Yellow
-            (re.escape('\033[0;34m'), '#72B3CC'),  # Blue
-            (re.escape('\033[0;35m'), '#C8A0D1'),  # Purple
-            (re.escape('\033[0;36m'), '#218693'),  # Cyan
-            (re.escape('\033[0;37m'), '#B0B0B0'),  # Gray
-
-            (re.escape('\033[1;30m'), '#5D5D5D'),  # Bright Black (gray)
-            (re.escape('\033[1;31m'), '#E09690'),  # Bright Red
-            (re.escape('\033[1;32m'), '#CDEE69'),  # Bright Green
-            (re.escape('\033[1;33m'), '#FFE377'),  # Bright Yellow
-            (re.escape('\033[1;34m'), '#9CD9F0'),  # Bright Blue
-            (re.escape('\033[1;35m'), '#FBB1F9'),  # Bright Purple
-            (re.escape('\033[1;36m'), '#77DFD8'),  # Bright Cyan
-            (re.escape('\033[1;37m'), '#F7F7F7'),  # Bright Gray
-        ])
-        self.is_first_color = True
-
-    def _add_font_tag(self, x):
-        return '</font><font color=' + self.unixToHtml[re.escape(x.group(0))] + '>'
+        """
+        Converts colored (ANSI/SGR) text to html, incrementally: feed() the chunks of the text as they arrive and
+        close() the html document at the end. The color (and the other state) carries over chunk boundaries, and over
+        documents, so consecutive chunks of the same output can also be converted separately with convert().
+        """
+        self.current_color = DEFAULT_COLOR
+        self._foreground = None
+        self._bold = False
+        self._started = False
+        self._pending = ''
+        self._sequence_cache = {}
 
     def convert(self, text):
-        result = '<html><body><font color=white>'
-        p_object = re.compile('|'.join(self.unixToHtml.keys()))
-        result += p_object.sub(lambda x: self._add_font_tag(x), text)
-        result += '</font></body></html>'
-        # result = '<br />'.join([line for line in result.split(os.linesep) if line])
-        result = '<br />'.join(result.replace(os.linesep + os.linesep, os.linesep).split(os.linesep))
-        return result
-
-    def remove_strike(self, raw_text):
-        return re.sub(r"<S[^>]*>|<[^>]S>", "", raw_text)
+        """
+        Convert the text to an html document. The color that is open at the end of the text is remembered, so
+        consecutive chunks of the same output can be converted separately by the same converter.
+        :type text: str
+        :rtype: str
+        """
+        return self.feed(text) + self._close_document()
+
+    def feed(self, chunk):
+        """
+        Convert the next chunk of the text.
+        :type chunk: str
+        :return: The html of the chunk (opens the html document on the first chunk).
+        :rtype: str
+        """
+        parts = []
+        self._open_document(parts)
+        text = self._pending + chunk if self._pending else chunk
+        self._pending = ''
+        partial = PARTIAL_CSI_PATTERN.search(text, max(0, len(text) - 32))
+        if partial:
+            self._pending = partial.group(0)
+            text = text[:partial.start()]
+        if text.endswith('\r'):
+            # may be the first half of '\r\n'
+            self._pending = '\r' + self._pending
+            text = text[:-1]
+        parts.append(CSI_PATTERN.sub(self._replace_sequence, self._replace_line_breaks(text)))
+        return ''.join(parts)
+
+    def close(self):
+        """
+        Close the html document (the next chunk opens a new one).
+        :rtype: str
+        """
+        parts = []
+        self._open_document(parts)
+        # the end of the text, so a cut control sequence will never be completed
+        parts.append(self._replace_line_breaks(self._pending.split('\033')[0]))
+        self._pending = ''
+        parts.append(self._close_document())
+        return ''.join(parts)
+
+    def _open_document(self, parts):
+        if not self._started:
+            self._started = True
+            parts.append('<html><body><font color=' + self.current_color + '>')
+
+    def _close_document(self):
+        self._started = False
+        return '</font></body></html>'
+
+    @staticmethod
+    def _replace_line_breaks(text):
+        # every line break is kept (a '\r\n' that is cut at the end of a chunk is completed by feed())
+        if '\n' not in text:
+            return text
+        if '\r\n' in text:
+            text = text.replace('\r\n', '\n')
+        return text.replace('\n', '<br />')
+
+    def _replace_sequence(self, m):
+        # the html of a sequence depends only on the sequence and the state before it
+        key = (m.group(0), self._foreground, self._bold)
+        state = self._sequence_cache.get(key)
+        if state is None:
+            html = ''
+            if m.group(2) == 'm':
+                self._apply_sgr_codes(m.group(1))
+                html = '</font><font color=' + self._get_color() + '>'
+            state = self._sequence_cache[key] = (self._foreground, self._bold, self._get_color(), html)
+        self._foreground, self._bold, self.current_color, html = state
+        return html
+
+    def _apply_sgr_codes(self, params):
+        codes = [int(p) if p.isdigit() else 0 for p in params.split(';')]
+        i = 0
+        while i < len(codes):
+            code = codes[i]
+            if code == 0:
+                self._foreground = None
+                self._bold = False
+            elif code == 1:
+                self._bold = True
+            elif code in (2, 22):
+                self._bold = False
+            elif 30 <= code <= 37:
+                self._foreground = code - 30
+            elif 90 <= code <= 97:
+                self._foreground = code - 90 + 8
+            elif code == 39:
+                self._foreground = None
+            elif code in (38, 48) and i + 1 < len(codes):
+                # extended colors: 5;n (256 colors) or 2;r;g;b (true color), the background is ignored
+                if codes[i + 1] == 5 and i + 2 < len(codes):
+                    if code == 38:
+                        self._foreground = XTERM_256_COLORS[codes[i + 2] % 256]
+                    i += 2
+                elif codes[i + 1] == 2 and i + 4 < len(codes):
+                    if code == 38:
+                        self._foreground = '#%02X%02X%02X' % tuple(c % 256 for c in codes[i + 2:i + 5])
+                    i += 4
+            i += 1
+
+    def _get_color(self):
+        foreground = self._foreground
+        if foreground is None:
+            return DEFAULT_COLOR
+        if isinstance(foreground, str):
+            return foreground
+        if foreground < 8 and self._bold:
+            return BRIGHT_COLORS[foreground]
+        return XTERM_256_COLORS[foreground]
+
+    @staticmethod
+    def remove_strike(raw_text):
+        return STRIKE_PATTERN.sub("", raw_text)
@@ -0,0 +1,522 @@
+import errno
+import hashlib
+import json
+import os
+import re
+import shutil
+import stat
+import tempfile
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+from models import HttpAuth
+
+
+def create_private_folder(path):
+    """
+    Create the root folder of a cache, which only the current user can access (the default roots are in the shared os
+    tmp folder, where anyone could create them first), or check the existing one.
+    :param str path:
+    """
+    if not os.path.exists(path):
+        try:
+            os.makedirs(path, 0o700)
+        except OSError:
+            # created by another driver
+            if not os.path.isdir(path):
+                raise
+    if not hasattr(os, 'getuid'):
+        # windows: the os tmp folder is a folder of the user
+        return
+    folder_stat = os.lstat(path)
+    if not stat.S_ISDIR(folder_stat.st_mode) or folder_stat.st_uid != os.getuid():
+        raise Exception('The cache folder \'%s\' is not a folder of the current user' % path)
+    if folder_stat.st_mode & 0o077:
+        # created by an older version
+        os.chmod(path, 0o700)
+
+
+class PlaybookCache(object):
+    FOLDER_NAME = 'cloudshell_ansible_playbooks'
+    LOCK_FILE_NAME = '.lock'
+    META_FILE_NAME = 'meta.json'
+    TREE_FOLDER_NAME = 'tree'
+    MAX_SIZE = 1024 * 1024 * 1024
+
+    def __init__(self, root=None, max_size=None):
+        """
+        A persistent cache of downloaded playbooks (the downloaded file and the files extracted from it), shared by
+        all the drivers on the machine. An entry is kept only if the server sent an 'ETag' or a 'Last-Modified'
+        header, so it can always be revalidated with a conditional request. The files of an entry are hard linked
+        (or copied, when a link isn't possible) into the working dir, so they must not be modified there (an entry
+        whose files were modified is dropped, by the sizes and modification times of its files).
+        :param str root: The folder of the cache (default: a folder in the os tmp folder).
+        :param int max_size: The max total size of the cached files in bytes, least recently used entries are evicted.
+        """
+        self.root = root or os.path.join(tempfile.gettempdir(), PlaybookCache.FOLDER_NAME)
+        self.max_size = max_size or PlaybookCache.MAX_SIZE
+
+    @staticmethod
+    def get_key(url, auth):
+        """
+        :param str url: Http url of the playbook.
+        :param HttpAuth auth: Authentication to the http server (optional), only a digest of the password is used.
+        :rtype: str
+        """
+        identity = [url]
+        if auth:
+            identity += [auth.username or '', hashlib.sha256(auth.password or '').hexdigest()]
+        return hashlib.sha256(json.dumps(identity)).hexdigest()
+
+    def get_entry(self, key):
+        """
+        :type key: str
+        :rtype: PlaybookCacheEntry
+        """
+        with self._lock():
+            return self._read_entry(key)
+
+    def restore(self, entry, folder):
+        """
+        Link (or copy) the files of the entry into the folder.
+        :type entry: PlaybookCacheEntry
+        :param str folder: The destination folder (usually the working dir).
+        :return: False if the entry was evicted since it was read (or its files were modified).
+        :rtype: bool
+        """
+        with self._lock():
+            entry = self._read_entry(entry.key)
+            if not entry:
+                return False
+            path = self._get_entry_path(entry.key)
+            tree = os.path.join(path, PlaybookCache.TREE_FOLDER_NAME)
+            if not entry.manifest or not self._verify(tree, entry.manifest, False):
+                self._delete_folder(path)
+                return False
+            for file_name in entry.files:
+                self._link_or_copy(os.path.join(tree, file_name), os.path.join(folder, file_name))
+            entry.last_used = time.time()
+            self._write_meta(path, entry)
+            return True
+
+    def store(self, key, url, folder, files, playbook_name, headers, sha256=None, sha256_verified=False,
+              manifest=None):
+        """
+        Add (or replace) the entry of the key, and evict the least recently used entries that exceed the max size.
+        :type key: str
+        :type url: str
+        :param str folder: The folder of the files (usually the working dir).
+        :param list[str] files: The downloaded and extracted files, relative to the folder.
+        :param str playbook_name: The playbook file name (that was found in the files).
+        :param dict headers: The headers of the response.
+        :param str sha256: The SHA-256 of the downloaded file (optional).
+        :param bool sha256_verified: True if the SHA-256 was the expected one, so the entry can be used (when the
+        same SHA-256 is expected) even if the response can't be revalidated.
+        :param dict manifest: The size, modification time and SHA-256 of the files (default: their size and
+        modification time).
+        :return: The new entry, or None if the response can't be revalidated nor verified (so it isn't cached).
+        :rtype: PlaybookCacheEntry
+        """
+        entry = PlaybookCacheEntry(key, url, headers.get('ETag'), headers.get('Last-Modified'), playbook_name, files,
+                                   sha256=sha256, manifest=manifest)
+        if not entry.etag and not entry.last_modified and not sha256_verified:
+            return None
+        self._create_root()
+        # the files are added to a new folder, which replaces the entry only when it is complete
+        new_path = os.path.join(self.root, 'new-' + uuid.uuid4().hex)
+        try:
+            tree = os.path.join(new_path, PlaybookCache.TREE_FOLDER_NAME)
+            described = {}
+            for file_name in files:
+                target = os.path.join(tree, file_name)
+                self._link_or_copy(os.path.join(folder, file_name), target)
+                described[file_name] = self._describe(target, False)
+                entry.size += described[file_name][0]
+            entry.last_used = time.time()
+            if manifest:
+                entry.verified_at = entry.last_used
+            else:
+                entry.manifest = described
+            self._write_meta(new_path, entry)
+            with self._lock():
+                path = self._get_entry_path(key)
+                if os.path.exists(path):
+                    self._delete_folder(path)
+                os.rename(new_path, path)
+                self._evict(self.max_size)
+        finally:
+            if os.path.exists(new_path):
+                shutil.rmtree(new_path, ignore_errors=True)
+        return entry
+
+    def _evict(self, max_size):
+        entries = [e for e in (self._read_entry(name) for name in os.listdir(self.root)
+                               if not name.startswith('.') and not name.startswith('new-')) if e]
+        total_size = sum(e.size for e in entries)
+        for entry in sorted(entries, key=lambda e: e.last_used):
+            if total_size <= max_size:
+                break
+            self._delete_folder(self._get_entry_path(entry.key))
+            total_size -= entry.size
+
+    def _read_entry(self, key):
+        path = os.path.join(self._get_entry_path(key), PlaybookCache.META_FILE_NAME)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r') as f:
+                return PlaybookCacheEntry.from_dict(json.load(f))
+        except (IOError, ValueError, KeyError):
+            # a corrupted entry is treated as missing (it is replaced by the next store)
+            return None
+
+    @staticmethod
+    def _write_meta(path, entry):
+        meta_path = os.path.join(path, PlaybookCache.META_FILE_NAME)
+        with open(meta_path + '.tmp', 'w') as f:
+            # dumps is much faster than dump (which writes the encoded parts one by one)
+            f.write(json.dumps(entry.to_dict()))
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        os.rename(meta_path + '.tmp', meta_path)
+
+    def _get_entry_path(self, key):
+        return os.path.join(self.root, key)
+
+    def _delete_folder(self, path):
+        # renamed first, so a half deleted folder is never read as an entry
+        trash_path = os.path.join(self.root, 'new-' + uuid.uuid4().hex)
+        os.rename(path, trash_path)
+        shutil.rmtree(trash_path, ignore_errors=True)
+
+    def _create_root(self):
+        create_private_folder(self.root)
+
+    def _lock(self):
+        self._create_root()
+        return FileLock(os.path.join(self.root, PlaybookCache.LOCK_FILE_NAME))
+
+    @staticmethod
+    def _link_or_copy(source, target):
+        # the link is tried first, the folder and an existing target are handled only when it fails (a tree of
+        # thousands of files is linked into a new folder, so the checks would cost more than the links)
+        if hasattr(os, 'link'):
+            try:
+                os.link(source, target)
+                return
+            except OSError as e:
+                if e.errno not in (errno.ENOENT, errno.EEXIST):
+                    # a different device, or a file system without hard links
+                    return PlaybookCache._copy(source, target)
+        PlaybookCache._prepare_target(target)
+        if hasattr(os, 'link'):
+            try:
+                os.link(source, target)
+                return
+            except OSError:
+                pass
+        PlaybookCache._copy(source, target)
+
+    @staticmethod
+    def _describe(path, with_content):
+        """
+        :return: The size, the modification time and the SHA-256 (or None, without the content) of the file.
+        :rtype: list
+        """
+        file_stat = os.stat(path)
+        sha256 = None
+        if with_content:
+            sha256 = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), ''):
+                    sha256.update(chunk)
+            sha256 = sha256.hexdigest()
+        return [file_stat.st_size, file_stat.st_mtime, sha256]
+
+    @staticmethod
+    def _verify(tree, manifest, with_content):
+        for file_name, (size, mtime, sha256) in manifest.iteritems():
+            try:
+                actual_size, actual_mtime, actual_sha256 = PlaybookCache._describe(os.path.join(tree, file_name),
+                                                                                   with_content)
+            except (IOError, OSError):
+                return False
+            if actual_size != size or actual_mtime != mtime or (with_content and actual_sha256 != sha256):
+                return False
+        return True
+
+    @staticmethod
+    def _copy(source, target):
+        PlaybookCache._prepare_target(target)
+        shutil.copy2(source, target)
+
+    @staticmethod
+    def _prepare_target(target):
+        folder = os.path.dirname(target)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        if os.path.exists(target):
+            os.remove(target)
+
+
+class ExtractedTreeCache(PlaybookCache):
+    FOLDER_NAME = 'cloudshell_ansible_trees'
+    MAX_SIZE = 2 * 1024 * 1024 * 1024
+    # the sizes and modification times of the files are checked on every use, their content once in this interval
+    VERIFY_INTERVAL_SECONDS = 24 * 60 * 60
+
+    def __init__(self, root=None, max_size=None):
+        """
+        A persistent cache of the files extracted from archives, by the SHA-256 of the archive, so an archive that was
+        already extracted (from any url) is never extracted again. Every entry has a manifest of its files, and an
+        entry whose files were modified (for example, through a hard link in a working dir) is dropped.
+        :param str root: The folder of the cache (default: a folder in the os tmp folder).
+        :param int max_size: The max total size of the cached files in bytes, least recently used entries are evicted.
+        """
+        super(ExtractedTreeCache, self).__init__(
+            root or os.path.join(tempfile.gettempdir(), ExtractedTreeCache.FOLDER_NAME),
+            max_size or ExtractedTreeCache.MAX_SIZE)
+
+    def get_tree(self, sha256, folder):
+        """
+        Link (or copy) the files extracted from the archive into the folder.
+        :param str sha256: The SHA-256 of the archive.
+        :param str folder: The destination folder (usually the working dir).
+        :return: The entry (the files, relative to the folder, and the playbook that was found in them), or None if
+        the archive isn't cached.
+        :rtype: PlaybookCacheEntry
+        """
+        with self._lock():
+            entry = self._read_entry(sha256)
+            if not entry or not entry.manifest:
+                return None
+            path = self._get_entry_path(sha256)
+            tree = os.path.join(path, PlaybookCache.TREE_FOLDER_NAME)
+            now = time.time()
+            full_check = now - entry.verified_at > ExtractedTreeCache.VERIFY_INTERVAL_SECONDS
+            if not self._verify(tree, entry.manifest, full_check):
+                self._delete_folder(path)
+                return None
+            for file_name in entry.files:
+                self._link_or_copy(os.path.join(tree, file_name), os.path.join(folder, file_name))
+            entry.last_used = now
+            if full_check:
+                entry.verified_at = now
+            self._write_meta(path, entry)
+            return entry
+
+    def add_tree(self, sha256, folder, files, playbook_name=None):
+        """
+        Add the files that were extracted from the archive.
+        :param str sha256: The SHA-256 of the archive.
+        :param str folder: The folder of the files (usually the working dir).
+        :param list[str] files: The extracted files, relative to the folder.
+        :param str playbook_name: The playbook that was found in the files (so it isn't looked for again).
+        :rtype: PlaybookCacheEntry
+        """
+        manifest = dict((file_name, self._describe(os.path.join(folder, file_name), True)) for file_name in files)
+        return self.store(sha256, None, folder, files, playbook_name, {}, sha256, True, manifest)
+
+
+class PlaybookCacheEntry(object):
+    def __init__(self, key, url, etag, last_modified, playbook_name, files, size=0, last_used=0, sha256=None,
+                 manifest=None, verified_at=0):
+        """
+        :type key: str
+        :type url: str
+        :param str etag: The 'ETag' header of the cached response.
+        :param str last_modified: The 'Last-Modified' header of the cached response.
+        :type playbook_name: str
+        :type files: list[str]
+        :param int size: The total size of the files in bytes.
+        :param float last_used: Time of the last store or restore (seconds since the epoch).
+        :param str sha256: The SHA-256 (hex digest) of the downloaded file.
+        :param dict manifest: The size, modification time and SHA-256 (None, if only the size and modification time
+        are checked) of every file.
+        :param float verified_at: Time of the last check of the content of the files against the manifest.
+        """
+        self.key = key
+        self.url = url
+        self.etag = etag
+        self.last_modified = last_modified
+        self.playbook_name = playbook_name
+        self.files = files
+        self.size = size
+        self.last_used = last_used
+        self.sha256 = sha256
+        self.manifest = manifest
+        self.verified_at = verified_at
+
+    def get_validation_headers(self):
+        """
+        The headers of a conditional request, which is answered with '304 Not Modified' if the entry is still valid.
+        :rtype: dict
+        """
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+    @staticmethod
+    def from_dict(d):
+        return PlaybookCacheEntry(d['key'], d['url'], d['etag'], d['last_modified'], d['playbook_name'], d['files'],
+                                  d['size'], d['last_used'], d.get('sha256'), d.get('manifest'),
+                                  d.get('verified_at', 0))
+
+
+class BlobCache(object):
+    FOLDER_NAME = 'cloudshell_ansible_blobs'
+    MAX_SIZE = 512 * 1024 * 1024
+
+    def __init__(self, root=None, max_size=None):
+        """
+        A persistent cache of git blobs (file contents), by their blob SHA, shared by all the drivers on the machine.
+        A blob never changes, so a cached blob is used without any request. The blobs are hard linked (or copied, when
+        a link isn't possible) into the working dir, so they must not be modified there.
+        :param str root: The folder of the cache (default: a folder in the os tmp folder).
+        :param int max_size: The max total size of the blobs in bytes, least recently used blobs are evicted.
+        """
+        self.root = root or os.path.join(tempfile.gettempdir(), BlobCache.FOLDER_NAME)
+        self.max_size = max_size or BlobCache.MAX_SIZE
+
+    @staticmethod
+    def get_git_blob_sha(path):
+        """
+        The id that git gives to the content of the file.
+        :type path: str
+        :rtype: str
+        """
+        sha1 = hashlib.sha1('blob %s\0' % os.path.getsize(path))
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), ''):
+                sha1.update(chunk)
+        return sha1.hexdigest()
+
+    def restore(self, sha, target):
+        """
+        Link (or copy) the blob to the target path.
+        :param str sha: The blob SHA.
+        :param str target: The path of the file.
+        :return: False if the blob isn't cached.
+        :rtype: bool
+        """
+        path = self._get_blob_path(sha)
+        create_private_folder(self.root)
+        try:
+            # the modification time is the last use (a blob is never modified)
+            os.utime(path, None)
+        except OSError:
+            return False
+        PlaybookCache._link_or_copy(path, target)
+        return True
+
+    def store(self, sha, chunks):
+        """
+        Add the blob, after checking that the content matches the SHA.
+        :param str sha: The blob SHA.
+        :param collections.Iterable[str] chunks: The content of the blob.
+        """
+        path = self._get_blob_path(sha)
+        folder = os.path.dirname(path)
+        create_private_folder(self.root)
+        if not os.path.exists(folder):
+            try:
+                os.makedirs(folder)
+            except OSError:
+                # created by another driver
+                if not os.path.isdir(folder):
+                    raise
+        new_path = os.path.join(folder, 'new-' + uuid.uuid4().hex)
+        try:
+            with open(new_path, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+            actual_sha = BlobCache.get_git_blob_sha(new_path)
+            if actual_sha != sha:
+                raise Exception('The content of the blob %s doesn\'t match its SHA (actual: %s)' % (sha, actual_sha))
+            # the same blob from another driver has the same content, so the rename can replace it
+            if os.path.exists(path):
+                os.remove(path)
+            os.rename(new_path, path)
+        finally:
+            if os.path.exists(new_path):
+                os.remove(new_path)
+
+    def evict(self):
+        """
+        Delete the least recently used blobs that exceed the max size.
+        """
+        if not os.path.exists(self.root):
+            return
+        blobs = []
+        for folder, _, file_names in os.walk(self.root):
+            for file_name in file_names:
+                if file_name.startswith('new-'):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(folder, file_name))
+                    blobs.append((stat.st_mtime, stat.st_size, os.path.join(folder, file_name)))
+                except OSError:
+                    # evicted by another driver
+                    pass
+        total_size = sum(size for _, size, _ in blobs)
+        for _, size, path in sorted(blobs):
+            if total_size <= self.max_size:
+                break
+            try:
+                # a linked copy in a working dir is not affected
+                os.remove(path)
+            except OSError:
+                pass
+            total_size -= size
+
+    def _get_blob_path(self, sha):
+        if not re.match('^[0-9a-f]{40}$', sha):
+            raise ValueError('Invalid blob SHA: %s' % sha)
+        return os.path.join(self.root, sha[:2], sha[2:])
+
+
+class FileLock(object):
+    def __init__(self, path):
+        """
+        An exclusive lock of a file, between processes (and between threads that use different FileLock objects).
+        :param str path: The path of the lock file (created if it doesn't exist).
+        """
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, 'a+')
+        if fcntl:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        else:
+            while True:
+                try:
+                    self._file.seek(0)
+                    msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except IOError:
+                    # LK_LOCK gives up after 10 seconds
+                    pass
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            if fcntl:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self._file.close()
@@ -1,7 +1,18 @@
+import hashlib
+import json
 import os
+import re
+import time
 
+from requests.exceptions import ConnectionError, ChunkedEncodingError, Timeout
+
+from cloudshell.cm.ansible.domain.Helpers.gitlab_api_url_validator import is_gitlab_tree_url
 from cloudshell.cm.ansible.domain.cancellation_sampler import CancellationSampler
+from cloudshell.cm.ansible.domain.git_repository_fetcher import GitRepositoryFetcher, is_git_url
+from cloudshell.cm.ansible.domain.gitlab_tree_fetcher import GitlabTreeFetcher
 from cloudshell.cm.ansible.domain.http_request_service import HttpRequestService
+from cloudshell.cm.ansible.domain.playbook_cache import PlaybookCache, ExtractedTreeCache
+from cloudshell.cm.ansible.domain.tar_service import TarService
 from file_system_service import FileSystemService
 from logging import Logger
 from models import HttpAuth
@@ -9,82 +20,445 @@ from models import HttpAuth
 
 class PlaybookDownloader(object):
     CHUNK_SIZE = 1024 * 1024
+    NOT_MODIFIED = 304
+    PARTIAL_CONTENT = 206
+    # a download that fails in the middle is resumed (from the end of the partial file) this number of times
+    DOWNLOAD_RETRIES = 3
+    RETRY_BACKOFF_SECONDS = 2
+    DOWNLOAD_ERRORS = (ConnectionError, ChunkedEncodingError, Timeout)
+    # yielded by _iter_content when a failed download starts again from the first byte
+    RESTART = object()
+    # a json file at the top of an archive (or a repository) that names the playbook: {"entryPoint": "deploy/site.yml"}
+    MANIFEST_FILE_NAME = 'cloudshell_playbook.json'
 
-    def __init__(self, file_system, zip_service, http_request_service, filename_extractor):
+    def __init__(self, file_system, zip_service, http_request_service, filename_extractor, playbook_cache=None,
+                 gitlab_tree_fetcher=None, git_repository_fetcher=None, tar_service=None, tree_cache=None):
         """
         :param FileSystemService file_system:
         :param zip_service:
         :param HttpRequestService http_request_service:
         :param filename_extractor:
+        :param PlaybookCache playbook_cache: Cache of the downloaded playbooks (optional).
+        :param GitlabTreeFetcher gitlab_tree_fetcher: Downloads gitlab tree urls (optional, created when needed).
+        :param GitRepositoryFetcher git_repository_fetcher: Checks out git urls (optional, created when needed).
+        :param TarService tar_service:
+        :param ExtractedTreeCache tree_cache: Cache of the files extracted from archives (optional).
         """
         self.file_system = file_system
         self.zip_service = zip_service
         self.http_request_service = http_request_service
         self.filename_extractor = filename_extractor
+        self.playbook_cache = playbook_cache
+        self.gitlab_tree_fetcher = gitlab_tree_fetcher
+        self.git_repository_fetcher = git_repository_fetcher
+        self.tar_service = tar_service or TarService()
+        self.tree_cache = tree_cache
 
-    def get(self, url, auth, logger, cancel_sampler):
+    def get(self, url, auth, logger, cancel_sampler, sha256=None, sha256_url=None, entry_point=None):
         """
         Download the file from the url (unzip if needed).
         :param str url: Http url of the file.
         :param HttpAuth auth: Authentication to the http server (optional).
         :param Logger logger:
         :param CancellationSampler cancel_sampler:
+        :param str sha256: The expected SHA-256 (hex digest) of the file (optional).
+        :param str sha256_url: Http url of a published SHA-256 of the file (optional, when sha256 isn't given).
+        :param str entry_point: The playbook in the downloaded files (optional, for archives and repositories).
         :rtype [str,int]
         :return The downloaded playbook file name
         """
-        file_name, file_size = self._download(url, auth, logger, cancel_sampler)
+        if is_git_url(url):
+            return self._get_git_repository(url, auth, logger, cancel_sampler, entry_point)
+        if is_gitlab_tree_url(url):
+            return self._get_gitlab_tree(url, auth, logger, cancel_sampler, entry_point)
+
+        if sha256_url and not sha256:
+            sha256 = self._get_published_sha256(sha256_url, auth, logger)
+        sha256 = sha256.strip().lower() if sha256 else None
+
+        cache_key = None
+        cache_entry = None
+        if self.playbook_cache:
+            cache_key = self.playbook_cache.get_key(url, auth)
+            cache_entry = self._get_cache_entry(cache_key, logger)
+
+        if cache_entry and sha256 and cache_entry.sha256 == sha256:
+            # the cached copy is the expected file, there is nothing to revalidate
+            if self.playbook_cache.restore(cache_entry, self.file_system.get_working_dir()):
+                logger.info('Using the cached copy with the expected checksum.')
+                return self._get_cached_playbook(cache_entry, entry_point, logger)
+
+        if sha256 and self.tree_cache:
+            # the expected archive was already extracted (maybe from another url)
+            tree_entry = self._get_cached_tree(sha256, logger)
+            if tree_entry:
+                logger.info('Using the cached files of the archive with the expected checksum (%s files).' %
+                            len(tree_entry.files))
+                return self._find_playbook(tree_entry.files, 'cached archive', logger, entry_point,
+                                           tree_entry.playbook_name)
+
+        headers = cache_entry.get_validation_headers() if cache_entry else None
+        response = self._request(url, auth, logger, headers)
+        if cache_entry and response.status_code == PlaybookDownloader.NOT_MODIFIED:
+            response.close()
+            if self.playbook_cache.restore(cache_entry, self.file_system.get_working_dir()):
+                logger.info('Not modified, using the cached copy.')
+                return self._get_cached_playbook(cache_entry, entry_point, logger)
+            # evicted since it was read
+            response = self._request(url, auth, logger)
+
+        file_name = self.filename_extractor.get_filename(response)
+        compression = self.tar_service.get_compression(file_name)
+        if compression:
+            # the tar file itself is never saved (so it isn't in the files)
+            files, file_sha256 = self._extract_download(response, file_name, compression, url, auth, logger,
+                                                        cancel_sampler)
+        else:
+            file_sha256 = self._download(response, file_name, url, auth, logger, cancel_sampler)
+            files = [file_name]
+        if sha256 and file_sha256 != sha256:
+            raise Exception('Checksum mismatch of the downloaded file \'%s\' (expected SHA-256: %s, actual: %s)' %
+                            (file_name, sha256, file_sha256))
+
+        if compression:
+            playbook_name = self._find_playbook(files, 'tar file', logger, entry_point)
+            self._add_to_tree_cache(file_sha256, files, None if entry_point else playbook_name, logger)
+        elif file_name.endswith(".zip"):
+            playbook_name, zip_files = self._unzip(file_name, file_sha256, entry_point, logger)
+            files += zip_files
+        else:
+            playbook_name = file_name
+
+        if self.playbook_cache:
+            # a configured entry point isn't a part of the cache key, so only a playbook that was found is cached
+            cached_playbook_name = None if entry_point and playbook_name != file_name else playbook_name
+            self._add_to_cache(cache_key, url, files, cached_playbook_name, response, file_sha256, bool(sha256),
+                               logger)
 
-        if file_name.endswith(".zip"):
-            file_name = self._unzip(file_name, logger)
+        return playbook_name
 
-        return file_name
+    def _get_git_repository(self, url, auth, logger, cancel_sampler, entry_point):
+        """
+        :rtype: str
+        :return The playbook file name
+        """
+        logger.info('Checking out the git repository \'%s\' ...' % url)
+        if not self.git_repository_fetcher:
+            self.git_repository_fetcher = GitRepositoryFetcher()
+        files = self.git_repository_fetcher.fetch(url, auth, self.file_system.get_working_dir(), logger,
+                                                  cancel_sampler)
+        logger.info('Files: ' + os.linesep + (os.linesep+'\t').join(files))
+        return self._find_playbook(files, 'git repository', logger, entry_point)
+
+    def _get_gitlab_tree(self, url, auth, logger, cancel_sampler, entry_point):
+        """
+        :rtype: str
+        :return The playbook file name
+        """
+        logger.info('Downloading the gitlab folder \'%s\' ...' % url)
+        if not self.gitlab_tree_fetcher:
+            self.gitlab_tree_fetcher = GitlabTreeFetcher(self.http_request_service)
+        files = self.gitlab_tree_fetcher.fetch(url, auth, self.file_system.get_working_dir(), logger, cancel_sampler)
+        logger.info('Files: ' + os.linesep + (os.linesep+'\t').join(files))
+        return self._find_playbook(files, 'gitlab folder', logger, entry_point)
 
-    def _download(self, url, auth, logger, cancel_sampler):
+    def _request(self, url, auth, logger, headers=None):
         """
-        Download the file from the url.
         :param str url: Http url of the file.
         :param HttpAuth auth: Authentication to the http server (optional).
         :param Logger logger:
-        :param CancellationSampler cancel_sampler:
-        :rtype [str,int]
-        :return The downloaded file name
+        :param dict headers: Additional request headers (optional).
         """
         logger.info('Downloading file from \'%s\' ...' % url)
-        response = self.http_request_service.get_response(url, auth, logger)
-        file_name = self.filename_extractor.get_filename(response)
+        if headers:
+            return self.http_request_service.get_response(url, auth, logger, headers=headers)
+        return self.http_request_service.get_response(url, auth, logger)
+
+    def _get_published_sha256(self, sha256_url, auth, logger):
+        """
+        :param str sha256_url: Http url of a checksum file (the 'sha256sum' format, or only the hex digest).
+        :type auth: HttpAuth
+        :type logger: Logger
+        :rtype: str
+        """
+        logger.info('Downloading the checksum from \'%s\' ...' % sha256_url)
+        response = self.http_request_service.get_response(sha256_url, auth, logger)
+        content = ''.join(response.iter_content(PlaybookDownloader.CHUNK_SIZE))
+        match = re.match(r'\s*([0-9a-fA-F]{64})\b', content)
+        if not match:
+            raise Exception('The checksum file \'%s\' doesn\'t start with a SHA-256 hex digest' % sha256_url)
+        return match.group(1)
+
+    def _get_cache_entry(self, cache_key, logger):
+        """
+        :type cache_key: str
+        :type logger: Logger
+        :rtype: PlaybookCacheEntry
+        """
+        try:
+            return self.playbook_cache.get_entry(cache_key)
+        except Exception as e:
+            # the cache is an optimization, the playbook is downloaded
+            logger.warning('Failed to read the playbook cache: %s' % e)
+            return None
+
+    def _get_cached_tree(self, sha256, logger):
+        """
+        Link the cached files that were extracted from the archive into the working dir.
+        :param str sha256: The SHA-256 of the archive.
+        :type logger: Logger
+        :rtype: PlaybookCacheEntry
+        """
+        try:
+            return self.tree_cache.get_tree(sha256, self.file_system.get_working_dir())
+        except Exception as e:
+            # the cache is an optimization, the archive is extracted
+            logger.warning('Failed to read the cache of the extracted files: %s' % e)
+            return None
+
+    def _add_to_cache(self, cache_key, url, files, playbook_name, response, sha256, sha256_verified, logger):
+        """
+        :type cache_key: str
+        :type url: str
+        :type files: list[str]
+        :type playbook_name: str
+        :param str sha256: The SHA-256 of the downloaded file.
+        :param bool sha256_verified: True if the SHA-256 was compared to the expected one.
+        :type logger: Logger
+        """
+        try:
+            entry = self.playbook_cache.store(cache_key, url, self.file_system.get_working_dir(), files,
+                                              playbook_name, response.headers, sha256, sha256_verified)
+            if entry:
+                logger.info('Added to the playbook cache (%s files, %s bytes).' % (len(files), entry.size))
+        except Exception as e:
+            # the cache is an optimization, the playbook was already downloaded
+            logger.warning('Failed to add the playbook to the cache: %s' % e)
+
+    def _add_to_tree_cache(self, sha256, files, playbook_name, logger):
+        """
+        :param str sha256: The SHA-256 of the archive.
+        :param list[str] files: The files that were extracted from the archive.
+        :param str playbook_name: The playbook that was found in the files (None, if it was configured).
+        :type logger: Logger
+        """
+        if not self.tree_cache:
+            return
+        try:
+            entry = self.tree_cache.add_tree(sha256, self.file_system.get_working_dir(), files, playbook_name)
+            logger.info('Added the extracted files to the cache (%s files, %s bytes).' % (len(files), entry.size))
+        except Exception as e:
+            # the cache is an optimization, the files were already extracted
+            logger.warning('Failed to add the extracted files to the cache: %s' % e)
 
+    def _download(self, response, file_name, url, auth, logger, cancel_sampler):
+        """
+        Download the file of the response.
+        :param requests.Response response: The (streamed) response of the file url.
+        :param str file_name: The name of the file.
+        :param str url: Http url of the file.
+        :param HttpAuth auth: Authentication to the http server (optional).
+        :param Logger logger:
+        :param CancellationSampler cancel_sampler:
+        :rtype str
+        :return The SHA-256 of the file
+        """
         with self.file_system.create_file(file_name) as f:
-            for chunk in response.iter_content(PlaybookDownloader.CHUNK_SIZE):
-                if chunk:
-                    f.write(chunk)
-                cancel_sampler.throw_if_canceled()
+            sha256 = hashlib.sha256()
+            for chunk in self._iter_content(response, url, auth, logger, cancel_sampler):
+                if chunk is PlaybookDownloader.RESTART:
+                    f.seek(0)
+                    f.truncate()
+                    sha256 = hashlib.sha256()
+                    continue
+                f.write(chunk)
+                sha256.update(chunk)
             file_size = f.tell()
 
         logger.info('Done (file: %s, size: %s bytes)).' % (file_name, file_size))
-        return file_name, file_size
+        return sha256.hexdigest()
+
+    def _extract_download(self, response, file_name, compression, url, auth, logger, cancel_sampler):
+        """
+        Extract the tar file of the response while it is downloaded.
+        :param requests.Response response: The (streamed) response of the file url.
+        :param str file_name: The name of the tar file.
+        :param str compression: The compression of the tar file (see TarService).
+        :rtype (list[str],str)
+        :return The extracted files, and the SHA-256 of the tar file
+        """
+        logger.info('Tar file was found, extracting file: %s while it is downloaded ...' % file_name)
+        sha256 = hashlib.sha256()
+
+        def chunks():
+            for chunk in self._iter_content(response, url, auth, logger, cancel_sampler):
+                if chunk is PlaybookDownloader.RESTART:
+                    raise Exception('The download of \'%s\' failed and the server doesn\'t support resuming it' %
+                                    file_name)
+                sha256.update(chunk)
+                yield chunk
+
+        content = chunks()
+        files = self.tar_service.extract_stream(content, compression, self.file_system.get_working_dir())
+        # the end of the tar file (the padding after the last member) is part of the checksum
+        for _ in content:
+            pass
+        logger.info('Done (extracted %s files).' % len(files))
+        logger.info('Files: ' + os.linesep + (os.linesep+'\t').join(files))
+        return files, sha256.hexdigest()
+
+    def _iter_content(self, response, url, auth, logger, cancel_sampler):
+        """
+        The content of the response. If the connection fails in the middle, the download is resumed with a range
+        request, or restarted if the server doesn't support it (RESTART is yielded before the content starts again).
+        :param requests.Response response: The (streamed) response of the file url.
+        :param str url: Http url of the file.
+        :param HttpAuth auth: Authentication to the http server (optional).
+        :param Logger logger:
+        :param CancellationSampler cancel_sampler:
+        :rtype collections.Iterable[str]
+        """
+        validator = response.headers.get('ETag') or response.headers.get('Last-Modified')
+        offset = 0
+        retries = 0
+        while True:
+            try:
+                for chunk in response.iter_content(PlaybookDownloader.CHUNK_SIZE):
+                    if chunk:
+                        offset += len(chunk)
+                        yield chunk
+                    cancel_sampler.throw_if_canceled()
+                return
+            except PlaybookDownloader.DOWNLOAD_ERRORS as e:
+                retries += 1
+                if retries > PlaybookDownloader.DOWNLOAD_RETRIES:
+                    raise
+                logger.warning('Download failed after %s bytes (%s), resuming (retry %s of %s) ...' %
+                               (offset, e, retries, PlaybookDownloader.DOWNLOAD_RETRIES))
+                time.sleep(PlaybookDownloader.RETRY_BACKOFF_SECONDS * 2 ** (retries - 1))
+                cancel_sampler.throw_if_canceled()
+                response = self._request_range(url, auth, logger, offset, validator)
+                if not self._is_resumed(response, offset):
+                    logger.info('The server doesn\'t support resuming the download, restarting it.')
+                    offset = 0
+                    yield PlaybookDownloader.RESTART
+
+    def _request_range(self, url, auth, logger, offset, validator):
+        """
+        :param int offset: The first byte to download.
+        :param str validator: The 'ETag' (or 'Last-Modified') of the first response, so a file that was modified
+        since is downloaded from the start.
+        """
+        headers = {'Range': 'bytes=%s-' % offset}
+        if validator:
+            headers['If-Range'] = validator
+        return self.http_request_service.get_response(url, auth, logger, headers=headers)
 
-    def _unzip(self, file_name, logger):
+    @staticmethod
+    def _is_resumed(response, offset):
+        if response.status_code != PlaybookDownloader.PARTIAL_CONTENT:
+            return False
+        match = re.match(r'\s*bytes\s+(\d+)-', response.headers.get('Content-Range', ''))
+        return bool(match) and int(match.group(1)) == offset
+
+    def _unzip(self, file_name, sha256, entry_point, logger):
         """
         :type file_name: str
+        :param str sha256: The SHA-256 of the zip file.
+        :param str entry_point: The configured playbook (optional).
         :type logger: Logger
-        :return: Playbook file name
-        :rtype str
+        :return: Playbook file name, and the extracted files
+        :rtype (str, list[str])
         """
-        logger.info('Zip file was found, extracting file: %s ...' % file_name)
-        zip_files = self.zip_service.extract_all(file_name)
-        logger.info('Done (extracted %s files).' % len(zip_files))
+        tree_entry = self._get_cached_tree(sha256, logger) if self.tree_cache else None
+        if tree_entry:
+            logger.info('Zip file was already extracted, using the %s cached files.' % len(tree_entry.files))
+            zip_files = tree_entry.files
+            playbook_name = self._find_playbook(zip_files, 'zip file', logger, entry_point, tree_entry.playbook_name)
+        else:
+            logger.info('Zip file was found, extracting file: %s ...' % file_name)
+            zip_files = self.zip_service.extract_all(file_name)
+            logger.info('Done (extracted %s files).' % len(zip_files))
+            playbook_name = self._find_playbook(zip_files, 'zip file', logger, entry_point)
+            self._add_to_tree_cache(sha256, zip_files, None if entry_point else playbook_name, logger)
         logger.info('Files: ' + os.linesep + (os.linesep+'\t').join(zip_files))
+        return playbook_name, zip_files
 
-        yaml_files = [file_name for file_name in self.file_system.get_entries(self.file_system.get_working_dir())
-                      if file_name.endswith(".yaml") or file_name.endswith(".yml")]
-        playbook_name = None
-        if len(yaml_files) > 1:
-            playbook_name = next((file_name for file_name in yaml_files
-                                  if file_name == "site.yaml" or file_name == "site.yml"), None)
-        if len(yaml_files) == 1:
-            playbook_name = yaml_files[0]
-        if not playbook_name:
-            raise Exception("Playbook file name was not found in zip file")
-        logger.info('Found playbook: \'%s\' in zip file' % playbook_name)
+    def _get_cached_playbook(self, entry, entry_point, logger):
+        """
+        :param PlaybookCacheEntry entry: A restored entry of the playbook cache.
+        :param str entry_point: The configured playbook (optional).
+        :type logger: Logger
+        :rtype: str
+        """
+        if entry.playbook_name and entry.files == [entry.playbook_name]:
+            # a single playbook file (an entry point doesn't apply to it)
+            return entry.playbook_name
+        return self._find_playbook(entry.files, 'cached copy', logger, entry_point, entry.playbook_name)
 
+    def _find_playbook(self, files, source, logger, entry_point=None, found_playbook_name=None):
+        """
+        Find the playbook in the files, without listing any folder. In this order: the configured entry point, the
+        playbook that was already found in the same files, the 'entryPoint' of the manifest file, the only yaml file
+        at the top of the files, or the 'site' yaml file if there are more.
+        :param list[str] files: The downloaded files (the member index of an archive), relative to the working dir.
+        :param str source: Where the files came from (for the messages).
+        :type logger: Logger
+        :param str entry_point: The configured playbook, relative to the working dir (optional).
+        :param str found_playbook_name: The playbook that was found in the same files before (optional).
+        :rtype: str
+        """
+        if found_playbook_name and not entry_point:
+            logger.info('Found playbook: \'%s\' in %s (cached)' % (found_playbook_name, source))
+            return found_playbook_name
+        index = set(file_name.replace(os.sep, '/') for file_name in files)
+        if entry_point:
+            playbook_name = self._get_member(index, entry_point, 'The entry point', source)
+            reason = 'configured'
+        elif PlaybookDownloader.MANIFEST_FILE_NAME in index:
+            playbook_name = self._get_member(index, self._read_manifest_entry_point(), 'The manifest entry point',
+                                             source)
+            reason = 'from the manifest'
+        else:
+            # sorted, so the result doesn't depend on the order of the files
+            yaml_files = sorted(file_name for file_name in index if '/' not in file_name and
+                                (file_name.endswith(".yaml") or file_name.endswith(".yml")))
+            playbook_name = None
+            if len(yaml_files) > 1:
+                playbook_name = next((file_name for file_name in yaml_files
+                                      if file_name == "site.yaml" or file_name == "site.yml"), None)
+            if len(yaml_files) == 1:
+                playbook_name = yaml_files[0]
+            if not playbook_name and yaml_files:
+                logger.info('More than one yaml file and no \'site\' yaml file (set the entry point): ' +
+                            ', '.join(yaml_files))
+            if not playbook_name:
+                raise Exception("Playbook file name was not found in " + source)
+            reason = 'found'
+        logger.info('Found playbook: \'%s\' in %s (%s)' % (playbook_name, source, reason))
         return playbook_name
+
+    @staticmethod
+    def _get_member(index, name, description, source):
+        """
+        :param set[str] index: The files ('/' separated).
+        :param str name: A path in the files.
+        :rtype: str
+        """
+        member = name.replace('\\', '/').strip('/') if name else ''
+        if member not in index:
+            raise Exception('%s \'%s\' was not found in %s' % (description, name, source))
+        return member
+
+    def _read_manifest_entry_point(self):
+        """
+        :rtype: str
+        """
+        path = os.path.join(self.file_system.get_working_dir(), PlaybookDownloader.MANIFEST_FILE_NAME)
+        try:
+            manifest = json.loads(self.file_system.read_file(path))
+        except ValueError as e:
+            raise Exception('Invalid manifest file \'%s\': %s' % (PlaybookDownloader.MANIFEST_FILE_NAME, e))
+        if not isinstance(manifest, dict) or not manifest.get('entryPoint'):
+            raise Exception('The manifest file \'%s\' has no \'entryPoint\'' % PlaybookDownloader.MANIFEST_FILE_NAME)
+        return manifest['entryPoint']
@@ -0,0 +1,116 @@
+import errno
+import select
+import socket
+import time
+
+
+class PortProbe(object):
+    # a connect that wasn't accepted or refused by then is dropped, and tried again
+    CONNECT_TIMEOUT_SECONDS = 3
+    # between the connects to a port that refused the previous one
+    INTERVAL_SECONDS = 1
+    # below the select limit of file descriptors (the rest of the ports wait for their turn)
+    MAX_CONNECTS = 256
+    IN_PROGRESS_ERRNOS = (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY, 10035)
+
+    def wait_for_ports(self, addresses, timeout_seconds, stop_event=None):
+        """
+        Wait for the ports to accept tcp connections, with non blocking connects to all the ports on the calling
+        thread (select based). A tcp connect is much cheaper than a ssh/winrm handshake, so the handshakes can wait
+        for the port to open.
+        :param list[(str, int)] addresses: Pairs of host and port.
+        :param float timeout_seconds: The time to wait for all the ports.
+        :param threading.Event stop_event: When set, the wait is aborted.
+        :return: Generator of the addresses, yielded in the order their ports accept a connection (ports that don't
+        open in time are not yielded).
+        :rtype: collections.Iterable[(str, int)]
+        """
+        deadline = time.time() + timeout_seconds
+        # address -> when to connect (again)
+        waiting = dict((address, 0) for address in addresses)
+        # socket -> (address, when the connect started)
+        connecting = {}
+        try:
+            while waiting or connecting:
+                now = time.time()
+                if now >= deadline or (stop_event and stop_event.is_set()):
+                    return
+                self._connect_due(waiting, connecting, now)
+                wait_seconds = self._get_wait_seconds(waiting, connecting, now, deadline)
+                if connecting:
+                    sockets = list(connecting.keys())
+                    # not longer than the interval, so a stop is noticed soon
+                    _, writable, failed = select.select([], sockets, sockets,
+                                                        min(wait_seconds, PortProbe.INTERVAL_SECONDS))
+                elif stop_event:
+                    stop_event.wait(wait_seconds)
+                    writable = failed = []
+                else:
+                    time.sleep(wait_seconds)
+                    writable = failed = []
+
+                now = time.time()
+                for sock in set(writable) | set(failed):
+                    address, _ = connecting.pop(sock)
+                    error = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                    sock.close()
+                    if error:
+                        waiting[address] = now + PortProbe.INTERVAL_SECONDS
+                    else:
+                        yield address
+                for sock, (address, started) in connecting.items():
+                    if now - started >= PortProbe.CONNECT_TIMEOUT_SECONDS:
+                        del connecting[sock]
+                        sock.close()
+                        waiting[address] = now
+        finally:
+            for sock in connecting:
+                sock.close()
+
+    def _connect_due(self, waiting, connecting, now):
+        """
+        :type waiting: dict[(str, int), float]
+        :type connecting: dict[socket.socket, ((str, int), float)]
+        :type now: float
+        """
+        for address, connect_time in sorted(waiting.items(), key=lambda item: item[1]):
+            if connect_time > now or len(connecting) >= PortProbe.MAX_CONNECTS:
+                break
+            del waiting[address]
+            sock = self._connect(address)
+            if sock:
+                connecting[sock] = (address, now)
+            else:
+                waiting[address] = now + PortProbe.INTERVAL_SECONDS
+
+    @staticmethod
+    def _connect(address):
+        """
+        Start a non blocking connect.
+        :param (str, int) address:
+        :return: The connecting socket, or None if the connect failed right away.
+        :rtype: socket.socket
+        """
+        host, port = address
+        try:
+            family, socktype, proto, _, sockaddr = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)[0]
+            sock = socket.socket(family, socktype, proto)
+        except socket.error:
+            return None
+        sock.setblocking(0)
+        error = sock.connect_ex(sockaddr)
+        if error and error not in PortProbe.IN_PROGRESS_ERRNOS:
+            sock.close()
+            return None
+        return sock
+
+    @staticmethod
+    def _get_wait_seconds(waiting, connecting, now, deadline):
+        """
+        :return: The time until something is due: a connect, a connect timeout, or the deadline.
+        :rtype: float
+        """
+        due = [deadline]
+        due.extend(waiting.values())
+        due.extend(started + PortProbe.CONNECT_TIMEOUT_SECONDS for _, started in connecting.values())
+        return max(0, min(due) - now)
@@ -0,0 +1,96 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+from cloudshell.cm.ansible.domain.playbook_cache import FileLock, create_private_folder
+
+
+class ReadinessCache(object):
+    FOLDER_NAME = 'cloudshell_ansible_readiness'
+    LOCK_FILE_NAME = '.lock'
+    TTL_SECONDS = 60
+    # the reservations that weren't updated by then are evicted (the drivers that share the cache may have different
+    # ttls, so a short one must not evict the hosts of the others)
+    MAX_AGE_SECONDS = 24 * 60 * 60
+
+    def __init__(self, root=None, ttl_seconds=None):
+        """
+        The hosts that were reachable a short time ago, by reservation, shared by all the drivers on the machine (so
+        the playbooks of a reservation that run one after the other don't wait for the same hosts again).
+        :param str root: The folder of the cache (default: a folder in the os tmp folder).
+        :param float ttl_seconds: How long a host is considered reachable after it was.
+        """
+        self.root = root or os.path.join(tempfile.gettempdir(), ReadinessCache.FOLDER_NAME)
+        self.ttl_seconds = ReadinessCache.TTL_SECONDS if ttl_seconds is None else float(ttl_seconds)
+
+    @staticmethod
+    def get_key(host, port, connection_method):
+        """
+        :param str host: The ip of the host.
+        :param str port: The ansible port.
+        :param str connection_method: ssh, winrm, ...
+        :rtype: str
+        """
+        return json.dumps([host, str(port), connection_method])
+
+    def get_reachable_at(self, reservation_id, key):
+        """
+        :type reservation_id: str
+        :param str key: See get_key.
+        :return: When the host was reachable, or None if it wasn't in the last ttl_seconds.
+        :rtype: float
+        """
+        with self._lock():
+            reachable_at = self._read(reservation_id).get(key)
+        if reachable_at is None or time.time() - reachable_at > self.ttl_seconds:
+            return None
+        return reachable_at
+
+    def set_reachable(self, reservation_id, reachable_at):
+        """
+        Mark the hosts as reachable, and evict the reservations that weren't updated in the last MAX_AGE_SECONDS.
+        :type reservation_id: str
+        :param dict[str, float] reachable_at: When every host was reachable, by key (see get_key).
+        """
+        now = time.time()
+        with self._lock():
+            hosts = self._read(reservation_id)
+            # a later check (of another driver) is kept
+            hosts.update((key, at) for key, at in reachable_at.iteritems() if at > hosts.get(key, 0))
+            path = self._get_path(reservation_id)
+            with open(path + '.tmp', 'w') as f:
+                f.write(json.dumps(hosts))
+            if os.path.exists(path):
+                os.remove(path)
+            os.rename(path + '.tmp', path)
+            self._evict(now)
+
+    def _read(self, reservation_id):
+        """
+        :rtype: dict[str, float]
+        """
+        path = self._get_path(reservation_id)
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, 'r') as f:
+                return json.loads(f.read())
+        except (IOError, ValueError):
+            # a corrupted file is treated as empty (it is replaced by the next update)
+            return {}
+
+    def _evict(self, now):
+        max_age_seconds = max(ReadinessCache.MAX_AGE_SECONDS, self.ttl_seconds)
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.endswith('.json') and now - os.path.getmtime(path) > max_age_seconds:
+                os.remove(path)
+
+    def _get_path(self, reservation_id):
+        return os.path.join(self.root, hashlib.sha256(reservation_id).hexdigest() + '.json')
+
+    def _lock(self):
+        create_private_folder(self.root)
+        return FileLock(os.path.join(self.root, ReadinessCache.LOCK_FILE_NAME))
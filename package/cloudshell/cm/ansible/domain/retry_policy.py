@@ -0,0 +1,40 @@
+import random
+
+
+class RetryPolicy(object):
+    INITIAL_INTERVAL_SECONDS = 1.0
+    MAX_INTERVAL_SECONDS = 10.0
+    MULTIPLIER = 2.0
+    JITTER = 0.2
+
+    def __init__(self, initial_interval_seconds=None, max_interval_seconds=None, multiplier=None, jitter=None,
+                 rand=None):
+        """
+        Exponential backoff with jitter, between the attempts to connect to a host.
+        :param float initial_interval_seconds: The delay after the first failed attempt.
+        :param float max_interval_seconds: The longest delay.
+        :param float multiplier: The growth of the delay after every failed attempt.
+        :param float jitter: The fraction of every delay that is randomly cut off (0 - 1), so the hosts are not
+        retried in lockstep.
+        :param random.Random rand: The random numbers of the jitter (for tests).
+        """
+        self.initial_interval_seconds = float(initial_interval_seconds or RetryPolicy.INITIAL_INTERVAL_SECONDS)
+        self.max_interval_seconds = float(max_interval_seconds or RetryPolicy.MAX_INTERVAL_SECONDS)
+        self.multiplier = max(1.0, float(multiplier or RetryPolicy.MULTIPLIER))
+        self.jitter = min(1.0, max(0.0, float(RetryPolicy.JITTER if jitter is None else jitter)))
+        self.rand = rand or random.Random()
+
+    def get_delay(self, attempt, elapsed_seconds, timeout_seconds):
+        """
+        :param int attempt: The number of failed attempts so far (1 after the first one).
+        :param float elapsed_seconds: The time since the timeout started counting.
+        :param float timeout_seconds: The time to keep retrying.
+        :return: The time to wait before the next attempt (never past the timeout, so the last attempt is made when
+        the timeout expires).
+        :rtype: float
+        """
+        # the exponent is capped, so the delay doesn't overflow after many attempts
+        exponent = min(attempt - 1, 64)
+        delay = min(self.max_interval_seconds, self.initial_interval_seconds * self.multiplier ** exponent)
+        delay *= 1 - self.jitter * self.rand.random()
+        return max(0.0, min(delay, timeout_seconds - elapsed_seconds))
@@ -1,43 +1,48 @@
 import os
-from Queue import Queue, Empty
-from threading import Thread, RLock
+from threading import Thread, Lock
+
 
 class StreamAccumulator(object):
+    READ_SIZE = 64 * 1024
+
     def __init__(self, stdout):
-        self.queue = Queue()
+        """
+        Reads a stream on a background thread (in blocks, as soon as they are available) into a growing buffer.
+        The text is not split into lines, so the consumer gets everything that was read so far with a single lock.
+        :type stdout: file
+        """
+        self.buffer = bytearray()
         self.stdout = stdout
-        self.thread = Thread(target=self._push_to_queue)
+        self.thread = Thread(target=self._read_blocks)
         self.thread.daemon = True
-        self.lock = RLock()
+        self.lock = Lock()
 
     def __enter__(self):
         self.thread.start()
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        with self.lock:
-            self.stdout.close()
+        # the fd can't be closed while it is read by the thread (a blocking read isn't interrupted by close)
         self.thread.join()
-
-    def _push_to_queue(self):
-        is_closed = False
-        while not is_closed:
+        self.stdout.close()
+
+    def _read_blocks(self):
+        fd = self.stdout.fileno()
+        while True:
+            block = os.read(fd, self.READ_SIZE)
+            if not block:
+                break
             with self.lock:
-                is_closed = self.stdout.closed
-                if not is_closed:
-                    line = self.stdout.readline()
-                    if line:
-                        self.queue.put(line)
+                self.buffer += block
 
     def read_all_txt(self):
-        try:
-            lines = []
-            while True:
-                lines.append(self.queue.get_nowait())
-        except Empty:
-            pass
-        finally:
-            return os.linesep.join(lines)
+        """
+        Take all the text that was read since the previous call.
+        :rtype: str
+        """
+        with self.lock:
+            block, self.buffer = self.buffer, bytearray()
+        return str(block)
 
 
 class StdoutAccumulator(StreamAccumulator):
@@ -0,0 +1,125 @@
+import os
+import shutil
+import tarfile
+import uuid
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from cloudshell.cm.ansible.domain.zip_service import get_safe_member_name, get_single_folder
+
+
+class TarService(object):
+    GZIP = 'gz'
+    ZSTD = 'zst'
+    CHUNK_SIZE = 1024 * 1024
+    EXTENSIONS = [('.tar.gz', GZIP), ('.tgz', GZIP), ('.tar.zst', ZSTD), ('.tzst', ZSTD)]
+
+    @staticmethod
+    def get_compression(file_name):
+        """
+        :param str file_name: The name of a downloaded file.
+        :return: The compression of the tar file (GZIP or ZSTD), or None if it isn't a tar file.
+        :rtype: str
+        """
+        return next((compression for extension, compression in TarService.EXTENSIONS
+                     if file_name.lower().endswith(extension)), None)
+
+    def extract_stream(self, chunks, compression, folder=None):
+        """
+        Extract the files of a compressed tar stream, while it is read (without the folder, when all the files are in
+        a single folder). Only files and folders are extracted (links and devices are skipped).
+        :param collections.Iterable[str] chunks: The compressed tar file (for example, the chunks of a download).
+        :param str compression: GZIP or ZSTD.
+        :param str folder: The destination folder (default: the working dir).
+        :return: The member index: the extracted files, relative to the folder ('/' separated, in the tar order).
+        :rtype: list[str]
+        """
+        folder = folder or os.getcwd()
+        stream = ChunkStream(chunks)
+        if compression == TarService.ZSTD:
+            if not zstandard:
+                raise Exception('Extracting a \'.tar.zst\' file requires the \'zstandard\' python package '
+                                '(the \'zstd\' extra of cloudshell-cm-ansible)')
+            tar = tarfile.open(fileobj=zstandard.ZstdDecompressor().stream_reader(stream), mode='r|')
+        else:
+            tar = tarfile.open(fileobj=stream, mode='r|' + compression)
+
+        # the single folder is known only at the end of the stream, so the files are moved from a staging folder
+        staging = os.path.join(folder, '.extract-' + uuid.uuid4().hex)
+        try:
+            names = self._extract(tar, staging)
+            single_folder = get_single_folder(names)
+            root = os.path.join(staging, single_folder) if single_folder else staging
+            for entry in os.listdir(root):
+                self._move(os.path.join(root, entry), os.path.join(folder, entry))
+        finally:
+            tar.close()
+            shutil.rmtree(staging, ignore_errors=True)
+        if single_folder:
+            names = [name[len(single_folder) + 1:] for name in names]
+        return names
+
+    @staticmethod
+    def _extract(tar, folder):
+        """
+        :type tar: tarfile.TarFile
+        :type folder: str
+        :rtype: list[str]
+        """
+        names = []
+        os.makedirs(folder)
+        # in stream mode, every member is read when it is reached (there is no index up front)
+        for member in tar:
+            if not member.isfile():
+                continue
+            name = get_safe_member_name(member.name, 'Tar')
+            target = os.path.join(folder, *name.split('/'))
+            if not os.path.isdir(os.path.dirname(target)):
+                os.makedirs(os.path.dirname(target))
+            with open(target, 'wb') as f:
+                shutil.copyfileobj(tar.extractfile(member), f, TarService.CHUNK_SIZE)
+            names.append(name)
+        return names
+
+    @staticmethod
+    def _move(source, target):
+        if os.path.isdir(target) and os.path.isdir(source):
+            for entry in os.listdir(source):
+                TarService._move(os.path.join(source, entry), os.path.join(target, entry))
+            return
+        if os.path.isdir(target):
+            shutil.rmtree(target)
+        elif os.path.exists(target):
+            os.remove(target)
+        os.rename(source, target)
+
+
+class ChunkStream(object):
+    def __init__(self, chunks):
+        """
+        A read only file over chunks of data (for example, the chunks of a download), that are pulled as they are read.
+        :type chunks: collections.Iterable[str]
+        """
+        self._chunks = iter(chunks)
+        self._buffer = ''
+        # the read position in the buffer (the buffer is replaced only when a chunk is pulled)
+        self._offset = 0
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            data = self._buffer[self._offset:] + ''.join(self._chunks)
+            self._buffer = ''
+            self._offset = 0
+            return data
+        while len(self._buffer) - self._offset < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer = self._buffer[self._offset:] + chunk
+            self._offset = 0
+        data = self._buffer[self._offset:self._offset + size]
+        self._offset += len(data)
+        return data
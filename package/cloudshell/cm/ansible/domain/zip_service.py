@@ -1,38 +1,86 @@
 import os
+import shutil
+from contextlib import closing
+from multiprocessing.pool import ThreadPool
 from zipfile import ZipFile, ZipInfo
 
+
+def get_safe_member_name(filename, archive_type='Zip'):
+    """
+    :param str filename: The name of a member of an archive.
+    :param str archive_type: The type of the archive (for the error message).
+    :return: The normalized name, relative to the destination folder ('/' separated).
+    :rtype: str
+    """
+    parts = [p for p in filename.replace('\\', '/').split('/') if p and p != '.']
+    # 'zip slip': a member that would be extracted outside of the destination folder
+    if filename.startswith(('/', '\\')) or '..' in parts or (parts and ':' in parts[0]) or not parts:
+        raise Exception('%s file contains an invalid file path: \'%s\'' % (archive_type, filename))
+    return '/'.join(parts)
+
+
+def get_single_folder(names):
+    """
+    :param list[str] names: The names of the files of an archive ('/' separated).
+    :return: The folder that holds all the files, if there is one.
+    :rtype: str
+    """
+    folder = names[0].split('/')[0] if names else None
+    if folder and all(name.startswith(folder + '/') for name in names):
+        return folder
+    return None
+
+
 class ZipService(object):
+    # zlib releases the GIL while it decompresses, so the members are extracted in parallel
+    WORKERS = 4
+    # smaller zip files are extracted on the calling thread (a pool costs more than it saves)
+    PARALLEL_MIN_SIZE = 4 * 1024 * 1024
+    CHUNK_SIZE = 1024 * 1024
 
-    def extract_all(self, zip_file_name):
-        zip = None
-        try:
-            zip = ZipFile(zip_file_name, 'r')
-            if self._contain_sinlge_folder(zip):
-                for file_info in self._get_files(zip):
-                    file_info.filename = self._remove_first_folder(file_info.filename)
-                    zip.extract(file_info)
-            else:
-                zip.extractall()
-            return [f.filename for f in self._get_files(zip)]
-        finally:
-            if zip:
-                zip.close()
+    def __init__(self, workers=None):
+        """
+        :param int workers: Max concurrent extractions.
+        """
+        self.workers = workers or ZipService.WORKERS
 
-    @staticmethod
-    def _remove_first_folder(filename):
-        '''
-        :type filename: filename
-        :rtype: filename
-        '''
-        return '/'.join(filename.split('/')[1:])
+    def extract_all(self, zip_file_name, folder=None):
+        """
+        Extract the files of the zip file (without the folder, when all the files are in a single folder).
+        :param str zip_file_name: The path of the zip file.
+        :param str folder: The destination folder (default: the working dir).
+        :return: The member index: the extracted files, relative to the folder ('/' separated, in the zip order).
+        :rtype: list[str]
+        """
+        folder = folder or os.getcwd()
+        with closing(ZipFile(zip_file_name, 'r')) as zip:
+            # the central directory is read once, when the zip file is opened
+            members = self._get_members(zip.infolist())
+            self._create_folders(folder, members)
+            groups = self._split(members, self.workers)
+            if len(groups) < 2:
+                self._extract(zip, members, folder)
+            else:
+                pool = ThreadPool(len(groups))
+                try:
+                    # the zip file was opened by its name, so every member is read with a handle of its own
+                    pool.map(lambda group: self._extract(zip, group, folder), groups)
+                finally:
+                    pool.terminate()
+        return [name for _, name in members]
 
     @staticmethod
-    def _get_files(zip):
-        '''
-        :type zip: ZipFile
-        :rtype: list[ZipInfo]
-        '''
-        return [f for f in zip.infolist() if not ZipService._is_folder(f)]
+    def _get_members(infos):
+        """
+        :param list[ZipInfo] infos: The central directory.
+        :return: The files and their (validated) names.
+        :rtype: list[(ZipInfo, str)]
+        """
+        files = [(info, get_safe_member_name(info.filename)) for info in infos if not ZipService._is_folder(info)]
+        single_folder = get_single_folder([name for _, name in files])
+        if single_folder:
+            files = [(info, name[len(single_folder) + 1:]) for info, name in files]
+        return files
 
     @staticmethod
     def _is_folder(zipped_item):
@@ -43,11 +91,37 @@ class ZipService(object):
         return zipped_item.filename[-1] == '/'
 
     @staticmethod
-    def _contain_sinlge_folder(zip):
-        '''
+    def _create_folders(folder, members):
+        # created up front, so the workers don't race to create the same folder
+        folders = set(os.path.dirname(name) for _, name in members)
+        for name in sorted(f for f in folders if f):
+            path = os.path.join(folder, *name.split('/'))
+            if not os.path.isdir(path):
+                os.makedirs(path)
+
+    @staticmethod
+    def _split(members, count):
+        """
+        Split the members to groups of about the same (compressed) size.
+        :rtype: list[list[(ZipInfo, str)]]
+        """
+        if sum(info.compress_size for info, _ in members) < ZipService.PARALLEL_MIN_SIZE:
+            return [members] if members else []
+        groups = [[] for _ in range(min(count, len(members)))]
+        sizes = [0] * len(groups)
+        for member in sorted(members, key=lambda m: m[0].compress_size, reverse=True):
+            smallest = sizes.index(min(sizes))
+            groups[smallest].append(member)
+            sizes[smallest] += member[0].compress_size
+        return groups
+
+    @staticmethod
+    def _extract(zip, members, folder):
+        """
         :type zip: ZipFile
-        :rtype: bool
-        '''
-        files = zip.namelist();
-        folder = next((f for f in files if f[-1] == '/'), None)
-        return folder and all(f.startswith(folder) for f in files)
\ No newline at end of file
+        :type members: list[(ZipInfo, str)]
+        :type folder: str
+        """
+        for info, name in members:
+            with closing(zip.open(info)) as source, open(os.path.join(folder, *name.split('/')), 'wb') as target:
+                shutil.copyfileobj(source, target, ZipService.CHUNK_SIZE)
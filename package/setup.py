@@ -21,6 +21,8 @@ setup(
         test_requires=required_for_tests,
         package_data={'': ['*.txt']},
         install_requires=required,
+        # '.tar.zst' playbooks (the last zstandard versions that support python 2.7)
+        extras_require={'zstd': ['zstandard>=0.11,<0.15']},
         version=version_from_file,
         include_package_data=True,
         keywords="ansible cloudshell configuration configuration-manager",
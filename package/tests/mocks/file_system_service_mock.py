@@ -48,6 +48,9 @@ class FileSystemServiceMock(FileSystemService):
             raise ValueError("File '%s' could not be found."%path)
         return f.data
 
+    def read_file(self, path):
+        return self.read_all_lines(path)
+
     def read_deleted_file(self, *path):
         f = next((f for f in self.deleted_files if f.path == os.path.join(*path) or f.full_path == os.path.join(*path)), None)
         if not f:
@@ -65,6 +68,7 @@ class FileMock(object):
     def __init__(self, path, full_path):
         self.path = path
         self.data = ''
+        self.position = 0
         self.full_path = full_path
 
 
@@ -78,7 +82,14 @@ class FileMock(object):
         self.data += ''.join(lines)
 
     def write(self, line):
-        self.data = line
+        self.data = self.data[:self.position] + line
+        self.position = len(self.data)
 
     def tell(self):
-        return len(self.data)
+        return self.position
+
+    def seek(self, position):
+        self.position = position
+
+    def truncate(self):
+        self.data = self.data[:self.position]
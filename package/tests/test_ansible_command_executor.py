@@ -1,8 +1,12 @@
 import os
-from unittest import TestCase
+import time
+from unittest import TestCase, skipUnless
 from mock import Mock, MagicMock, patch
-from subprocess import PIPE
+from subprocess import Popen, PIPE
 from cloudshell.cm.ansible.domain.ansible_command_executor import AnsibleCommandExecutor
+from cloudshell.cm.ansible.domain.cancellation_sampler import CancellationSampler
+from cloudshell.cm.ansible.domain.output.output_capture import OutputCapture
+from cloudshell.cm.ansible.domain.exceptions import CancellationException
 from helpers import mock_enter_exit_self
 
 
@@ -20,34 +24,42 @@ class TestAnsibleCommandExecutor(TestCase):
         self.stdout_patcher = patch('cloudshell.cm.ansible.domain.ansible_command_executor.StdoutAccumulator')
         self.stderr_patcher = patch('cloudshell.cm.ansible.domain.ansible_command_executor.StderrAccumulator')
         self.convert_patcher = patch('cloudshell.cm.ansible.domain.ansible_command_executor.UnixToHtmlColorConverter.convert')
+        self.feed_patcher = patch('cloudshell.cm.ansible.domain.ansible_command_executor.UnixToHtmlColorConverter.feed')
+        self.close_patcher = patch('cloudshell.cm.ansible.domain.ansible_command_executor.UnixToHtmlColorConverter.close')
         self.sleep_patcher = patch('cloudshell.cm.ansible.domain.ansible_command_executor.time.sleep')
 
         self.popen_patcher.start().return_value = self.process_mock
         self.stdout_patcher.start().return_value = self.stdout_mock
         self.stderr_patcher.start().return_value = self.stderr_mock
         self.convert_mock = self.convert_patcher.start()
+        self.feed_patcher.start().side_effect = (lambda x: x)
+        self.close_patcher.start().return_value = ''
         self.sleep_mock = self.sleep_patcher.start()
 
         self.convert_mock.side_effect = (lambda x: x)
         self.sleep_mock.side_effect = (lambda x: 0)
 
-        self.executor = AnsibleCommandExecutor()
+        self.executor = AnsibleCommandExecutor(event_driven=False)
 
     def tearDown(self):
         self.popen_patcher.stop()
         self.stdout_patcher.stop()
         self.stderr_patcher.stop()
         self.convert_patcher.stop()
+        self.feed_patcher.stop()
+        self.close_patcher.stop()
         self.sleep_patcher.stop()
 
     def test_run_prcess_with_corrent_command_line(self):
+        self.stdout_mock.read_all_txt.return_value = ''
+        self.stderr_mock.read_all_txt.return_value = ''
         with patch('cloudshell.cm.ansible.domain.ansible_command_executor.Popen') as popen:
             self.executor.execute_playbook('playbook1','inventory1','-arg1 -args2',Mock(),Mock(), Mock())
 
             popen.assert_called_once_with('ansible-playbook playbook1 -i inventory1 -arg1 -args2',shell=True,stdout=PIPE,stderr=PIPE)
 
     def test_sample_in_interval_of_2_seconds(self):
-        self.stdout_mock.read_all_txt.side_effect = ['1','2']
+        self.stdout_mock.read_all_txt.side_effect = ['1','2','']
         self.stderr_mock.read_all_txt.return_value = ''
         self.process_mock.poll = MagicMock(side_effect=[None, '0'])
 
@@ -55,9 +67,18 @@ class TestAnsibleCommandExecutor(TestCase):
 
         self.sleep_mock.assert_any_call(2)
 
-    def test_result_contains_output_and_error_texts(self):
+    def test_reads_output_that_remains_after_exit(self):
         self.stdout_mock.read_all_txt.side_effect = ['1', '2']
-        self.stderr_mock.read_all_txt.side_effect = ['3', '4']
+        self.stderr_mock.read_all_txt.return_value = ''
+        self.process_mock.poll = MagicMock(return_value='0')
+
+        output, error = self.executor.execute_playbook('p', 'i', '', self.output_writer_mock, Mock(), Mock())
+
+        self.assertEqual('12', output)
+
+    def test_result_contains_output_and_error_texts(self):
+        self.stdout_mock.read_all_txt.side_effect = ['1', '2', '']
+        self.stderr_mock.read_all_txt.side_effect = ['3', '4', '']
         self.process_mock.poll = MagicMock(side_effect=[None, '0'])
 
         output,error = self.executor.execute_playbook('p', 'i', '', self.output_writer_mock, Mock(), Mock())
@@ -66,8 +87,8 @@ class TestAnsibleCommandExecutor(TestCase):
         self.assertEqual('34', error)
 
     def test_every_output_bulk_is_written_to_outputwriter(self):
-        self.stdout_mock.read_all_txt.side_effect = ['123', '456', '789']
-        self.stderr_mock.read_all_txt.side_effect = ['a', 'b', '']
+        self.stdout_mock.read_all_txt.side_effect = ['123'+os.linesep, '456'+os.linesep, '789', '']
+        self.stderr_mock.read_all_txt.side_effect = ['a'+os.linesep, 'b'+os.linesep, '', '']
         self.stderr_mock.read_all_txt.return_value = ''
         self.process_mock.poll = MagicMock(side_effect=[None, None, '0'])
 
@@ -75,6 +96,30 @@ class TestAnsibleCommandExecutor(TestCase):
 
         self.output_writer_mock.write.assert_any_call('a'+os.linesep+'123'+os.linesep+'b'+os.linesep+'456'+os.linesep+'789')
 
+    def test_output_is_converted_chunk_by_chunk(self):
+        self.stdout_mock.read_all_txt.side_effect = ['123\n', '456\n', '']
+        self.stderr_mock.read_all_txt.return_value = ''
+        self.process_mock.poll = MagicMock(side_effect=[None, '0'])
+
+        with patch.object(OutputCapture, 'get_text', autospec=True, side_effect=OutputCapture.get_text) as get_text:
+            output, _ = self.executor.execute_playbook('p', 'i', '', self.output_writer_mock, Mock(), Mock())
+
+        # only the results (of each stream) are joined
+        self.assertEqual([OutputCapture.OUT, OutputCapture.ERR], [c[0][1] for c in get_text.call_args_list])
+        self.output_writer_mock.write.assert_called_once_with('123\n456\n')
+        self.assertEqual('123\n456\n', output)
+
+    def test_stream_output_writes_output_while_running(self):
+        self.stdout_mock.read_all_txt.side_effect = ['123\n', '456\n', '']
+        self.stderr_mock.read_all_txt.return_value = ''
+        self.process_mock.poll = MagicMock(side_effect=[None, '0'])
+
+        output, error = self.executor.execute_playbook('p', 'i', '', self.output_writer_mock, Mock(), Mock(),
+                                                       stream_output=True)
+
+        self.output_writer_mock.write.assert_called_once_with('123\n456\n')
+        self.assertEqual('123\n456\n', output)
+
     # def test_reads_all_output(self):
     #     self.output_parser_mock.parse = Mock(return_value='parsedresults')
     #     self.stdout_mock.read_all_txt.side_effect = ['123','456','789']
@@ -87,4 +132,45 @@ class TestAnsibleCommandExecutor(TestCase):
     #     self.output_writer_mock.write.assert_any_call('789')
     #     self.sleep_mock.assert_any_call(2)
     #     self.assertEqual('parsedresults',results)
-    #     self.output_parser_mock.parse.assert_called_once_with('123456789','p')
\ No newline at end of file
+    #     self.output_parser_mock.parse.assert_called_once_with('123456789','p')
+
+
+@skipUnless(os.name == 'posix', 'select supports pipes only on posix')
+class TestAnsibleCommandExecutorEventDriven(TestCase):
+
+    def setUp(self):
+        self.executor = AnsibleCommandExecutor(event_driven=True)
+        self.cancellation_context = Mock()
+        self.cancellation_context.is_cancelled = False
+        self.cancel_sampler = CancellationSampler(self.cancellation_context)
+
+    def _read_all(self, shell_command):
+        process = Popen(shell_command, shell=True, stdout=PIPE, stderr=PIPE)
+        chunks = list(self.executor._select_output(process, self.cancel_sampler))
+        return ''.join(c[0] for c in chunks), ''.join(c[1] for c in chunks), process
+
+    def test_is_event_driven_by_default_on_posix(self):
+        self.assertTrue(AnsibleCommandExecutor().event_driven)
+
+    def test_reads_stdout_and_stderr(self):
+        output, error, process = self._read_all('echo 123; echo abc 1>&2')
+
+        self.assertEqual('123\n', output)
+        self.assertEqual('abc\n', error)
+        self.assertEqual(0, process.returncode)
+
+    def test_returns_when_process_exits(self):
+        start = time.time()
+
+        self._read_all('true')
+
+        self.assertLess(time.time() - start, 1)
+
+    def test_kills_process_when_cancelled(self):
+        self.cancellation_context.is_cancelled = True
+        start = time.time()
+
+        with self.assertRaises(CancellationException):
+            self._read_all('sleep 10')
+
+        self.assertLess(time.time() - start, 1)
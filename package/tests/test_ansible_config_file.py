@@ -22,4 +22,21 @@ class TestAnsibleConfigFile(TestCase):
     def test_can_add_set_retry_path(self):
         with AnsibleConfigFile(self.file_system, Mock()) as f:
             f.set_retry_path(678)
-        self.assertEquals(os.linesep.join(['[defaults]', 'retry_files_save_path = 678']), self.file_system.read_all_lines('ansible.cfg'))
\ No newline at end of file
+        self.assertEquals(os.linesep.join(['[defaults]', 'retry_files_save_path = 678']), self.file_system.read_all_lines('ansible.cfg'))
+
+    def test_can_enable_callback_plugin(self):
+        with AnsibleConfigFile(self.file_system, Mock()) as f:
+            f.enable_callback_plugin('plugins', 'my_plugin')
+        lines = self.file_system.read_all_lines('ansible.cfg').split(os.linesep)
+        self.assertIn('callback_plugins = plugins', lines)
+        self.assertIn('callback_whitelist = my_plugin', lines)
+        self.assertIn('callbacks_enabled = my_plugin', lines)
+
+    def test_can_reuse_ssh_connections(self):
+        with AnsibleConfigFile(self.file_system, Mock()) as f:
+            f.reuse_ssh_connections('/tmp/cp')
+        lines = self.file_system.read_all_lines('ansible.cfg').split(os.linesep)
+        self.assertEqual('[ssh_connection]', lines[1])
+        self.assertIn('ssh_args = -C -o ControlMaster=auto -o ControlPersist=60s', lines)
+        self.assertIn('control_path_dir = /tmp/cp', lines)
+        self.assertIn('control_path = %(directory)s/%%C', lines)
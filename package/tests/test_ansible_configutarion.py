@@ -4,6 +4,7 @@ from cloudshell.api.cloudshell_api import AttributeValueInfo
 from mock import Mock
 
 from cloudshell.cm.ansible.domain.ansible_configuration import AnsibleConfigurationParser
+from cloudshell.cm.ansible.domain.retry_policy import RetryPolicy
 
 
 class TestAnsibleConfigurationParser(TestCase):
@@ -100,4 +101,56 @@ class TestAnsibleConfigurationParser(TestCase):
         host1 = next((h for h in conf.hosts_conf if h.ip == 'E2'), None)
         self.assertIsNotNone(host1)
         self.api.DecryptPassword.assert_any_call('G')
-        self.api.DecryptPassword.assert_any_call('H')
\ No newline at end of file
+        self.api.DecryptPassword.assert_any_call('H')
+        self.assertEquals(1, conf.parallel_connection_checks)
+        self.assertEquals(False, conf.stream_output)
+
+    def test_parallel_connection_checks(self):
+        json = '{"repositoryDetails":{"url":"someurl"},"hostsDetails":[{"ip":"x.x.x.x","connectionMethod":"ssh"}],' \
+               '"parallelConnectionChecks":20}'
+        conf = self.parser.json_to_object(json)
+        self.assertEquals(20, conf.parallel_connection_checks)
+
+    def test_stream_output(self):
+        json = '{"repositoryDetails":{"url":"someurl"},"hostsDetails":[{"ip":"x.x.x.x","connectionMethod":"ssh"}],' \
+               '"streamOutput":true}'
+        conf = self.parser.json_to_object(json)
+        self.assertEquals(True, conf.stream_output)
+    def test_repository_checksum(self):
+        json = '{"repositoryDetails":{"url":"someurl","sha256":"AB12","publishedChecksum":"True"},' \
+               '"hostsDetails":[{"ip":"x.x.x.x","connectionMethod":"ssh"}]}'
+        conf = self.parser.json_to_object(json)
+        self.assertEquals("AB12", conf.playbook_repo.sha256)
+        self.assertEquals(True, conf.playbook_repo.published_checksum)
+    def test_repository_entry_point(self):
+        json = '{"repositoryDetails":{"url":"someurl","entryPoint":"deploy/site.yml"},' \
+               '"hostsDetails":[{"ip":"x.x.x.x","connectionMethod":"ssh"}]}'
+        conf = self.parser.json_to_object(json)
+        self.assertEquals("deploy/site.yml", conf.playbook_repo.entry_point)
+    def test_retry_policy(self):
+        json = '{"repositoryDetails":{"url":"someurl"},"hostsDetails":[{"ip":"x.x.x.x","connectionMethod":"ssh"}],' \
+               '"retryInitialIntervalSeconds":0.5,"retryMaxIntervalSeconds":30,"retryMultiplier":3,"retryJitter":0}'
+        conf = self.parser.json_to_object(json)
+        self.assertEquals(0.5, conf.retry_policy.initial_interval_seconds)
+        self.assertEquals(30, conf.retry_policy.max_interval_seconds)
+        self.assertEquals(3, conf.retry_policy.multiplier)
+        self.assertEquals(0, conf.retry_policy.jitter)
+    def test_default_retry_policy(self):
+        json = '{"repositoryDetails":{"url":"someurl"},"hostsDetails":[{"ip":"x.x.x.x","connectionMethod":"ssh"}]}'
+        conf = self.parser.json_to_object(json)
+        self.assertEquals(RetryPolicy.INITIAL_INTERVAL_SECONDS, conf.retry_policy.initial_interval_seconds)
+        self.assertEquals(RetryPolicy.JITTER, conf.retry_policy.jitter)
+    def test_reuse_ssh_connections(self):
+        json = '{"repositoryDetails":{"url":"someurl"},"hostsDetails":[{"ip":"x.x.x.x","connectionMethod":"ssh"}],' \
+               '"reuseSshConnections":true}'
+        conf = self.parser.json_to_object(json)
+        self.assertEquals(True, conf.reuse_ssh_connections)
+    def test_readiness_cache_seconds(self):
+        json = '{"repositoryDetails":{"url":"someurl"},"hostsDetails":[{"ip":"x.x.x.x","connectionMethod":"ssh"}],' \
+               '"readinessCacheSeconds":30}'
+        conf = self.parser.json_to_object(json)
+        self.assertEquals(30, conf.readiness_cache_seconds)
+    def test_readiness_cache_is_disabled_by_default(self):
+        json = '{"repositoryDetails":{"url":"someurl"},"hostsDetails":[{"ip":"x.x.x.x","connectionMethod":"ssh"}]}'
+        conf = self.parser.json_to_object(json)
+        self.assertEquals(0, conf.readiness_cache_seconds)
@@ -1,5 +1,7 @@
 import json
+import mmap
 import os
+import tempfile
 from unittest import TestCase
 
 from cloudshell.cm.ansible.domain.output.ansible_result import AnsibleResult
@@ -102,6 +104,64 @@ PLAY RECAP *********************************************************************
             self.assertIn(AnsibleResult.DID_NOT_RUN_ERROR,
                           get_error_for(result, '192.168.85.11'))
 
+    def test_result_of_hostname_and_ipv6_hosts(self):
+        resultTxt = """
+TASK [Do something stupid] *****************************************************
+\033[0;31mfatal: [fe80::1]: FAILED! => {"changed": false, "failed": true, "msg": "failed", "rc": 2}\033[0m
+
+PLAY RECAP *********************************************************************
+\033[0;32mweb1.example.com\033[0m           : \033[0;32mok=12  \033[0m changed=1    unreachable=0    failed=0
+\033[0;31mfe80::1\033[0m                    : \033[0;32mok=1   \033[0m changed=0    unreachable=0    \033[0;31mfailed=1   \033[0m"""
+        result = AnsibleResult(resultTxt, '', ['web1.example.com', 'fe80::1'])
+        self.assertTrue(next(h for h in result.host_results if h.ip == 'web1.example.com').success)
+        self.assertEquals('{"changed": false, "failed": true, "msg": "failed", "rc": 2}', get_error_for(result, 'fe80::1'))
+
+    def test_result_of_memory_mapped_output(self):
+        resultTxt = """
+PLAY RECAP *********************************************************************
+\033[0;32m192.168.85.11\033[0m              : \033[0;32mok=12  \033[0m changed=1    unreachable=0    failed=0
+\033[0;31m192.168.85.12\033[0m              : \033[0;32mok=1   \033[0m changed=0    unreachable=0    \033[0;31mfailed=1   \033[0m"""
+        with tempfile.TemporaryFile() as f:
+            f.write(resultTxt)
+            f.flush()
+            output = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            result = AnsibleResult(output, 'general error', ['192.168.85.11', '192.168.85.12'])
+            output.close()
+        self.assertTrue(next(h for h in result.host_results if h.ip == '192.168.85.11').success)
+        self.assertEquals('general error', get_error_for(result, '192.168.85.12'))
+
+    def _write_events(self, events):
+        fd, path = tempfile.mkstemp(suffix='.jsonl')
+        with os.fdopen(fd, 'w') as f:
+            for event in events:
+                f.write(json.dumps(event) + '\n')
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_result_from_events_file(self):
+        events_path = self._write_events([
+            {'event': 'failed', 'host': 'web1.example.com', 'ignore_errors': True, 'details': '{"msg": "ignored"}'},
+            {'event': 'failed', 'host': 'fe80::1', 'ignore_errors': False, 'details': '{"msg": "failed"}'},
+            {'event': 'unreachable', 'host': '192.168.85.13', 'details': '{"msg": "unreachable"}'},
+            {'event': 'stats', 'host': 'web1.example.com', 'ok': 2, 'failures': 0, 'unreachable': 0},
+            {'event': 'stats', 'host': 'fe80::1', 'ok': 1, 'failures': 1, 'unreachable': 0},
+            {'event': 'stats', 'host': '192.168.85.13', 'ok': 0, 'failures': 0, 'unreachable': 1}])
+        result = AnsibleResult('not scraped', '', ['web1.example.com', 'fe80::1', '192.168.85.13', '192.168.85.14'],
+                               events_path=events_path)
+        self.assertFalse(result.success)
+        self.assertTrue(next(h for h in result.host_results if h.ip == 'web1.example.com').success)
+        self.assertEquals('{"msg": "failed"}', get_error_for(result, 'fe80::1'))
+        self.assertEquals('{"msg": "unreachable"}', get_error_for(result, '192.168.85.13'))
+        self.assertIn(AnsibleResult.DID_NOT_RUN_ERROR, get_error_for(result, '192.168.85.14'))
+
+    def test_result_falls_back_to_output_without_stats_events(self):
+        events_path = self._write_events([{'event': 'failed', 'host': '192.168.85.11', 'details': '{}'}])
+        resultTxt = """
+PLAY RECAP *********************************************************************
+\033[0;32m192.168.85.11\033[0m              : \033[0;32mok=12  \033[0m changed=1    unreachable=0    failed=0"""
+        result = AnsibleResult(resultTxt, '', ['192.168.85.11'], events_path=events_path)
+        self.assertTrue(result.success)
+
     def test_result_to_json(self):
         result = AnsibleResult('', 'error', ['192.168.85.11','192.168.85.12'])
         json_str = result.to_json()
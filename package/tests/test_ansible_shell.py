@@ -1,4 +1,5 @@
 import os
+import time
 from unittest import TestCase
 from cloudshell.shell.core.context import ResourceCommandContext, ResourceContextDetails
 
@@ -6,6 +7,7 @@ from cloudshell.cm.ansible.ansible_shell import AnsibleShell
 from cloudshell.cm.ansible.domain.Helpers.ansible_connection_helper import AnsibleConnectionHelper
 from cloudshell.cm.ansible.domain.exceptions import AnsibleException
 from cloudshell.cm.ansible.domain.ansible_configuration import AnsibleConfiguration, HostConfiguration
+from cloudshell.cm.ansible.domain.readiness_cache import ReadinessCache
 from mock import Mock, patch
 from helpers import mock_enter_exit, mock_enter_exit_self, Any
 
@@ -42,8 +44,15 @@ class TestAnsibleShell(TestCase):
         self.ansible_result.ctor = self.ansible_result_patcher.start()
         self.ansible_result.ctor.return_value = self.ansible_result
 
+        self.readiness_cache_patcher = patch('cloudshell.cm.ansible.ansible_shell.ReadinessCache')
+        self.readiness_cache_ctor = self.readiness_cache_patcher.start()
+        self.readiness_cache_ctor.get_key = ReadinessCache.get_key
+        self.readiness_cache = self.readiness_cache_ctor.return_value
+        self.readiness_cache.get_reachable_at.return_value = None
+
     def tearDown(self):
         self.ansible_result_patcher.stop()
+        self.readiness_cache_patcher.stop()
 
     # Helper
 
@@ -76,6 +85,38 @@ class TestAnsibleShell(TestCase):
             m.force_color.assert_called_once()
             m.set_retry_path.assert_called_once_with("." + os.pathsep)
 
+    def test_ansible_config_file_reuses_ssh_connections(self):
+        self.conf.reuse_ssh_connections = True
+        self.file_system.get_working_dir.return_value = '/tmp/work'
+        host1 = HostConfiguration()
+        host1.ip = 'host1'
+        host1.connection_method = AnsibleConnectionHelper.CONNECTION_METHOD_SSH
+        host1.access_key = 'key'
+        self.conf.hosts_conf.append(host1)
+        with patch('cloudshell.cm.ansible.ansible_shell.AnsibleConfigFile') as file:
+            m = mock_enter_exit_self()
+            file.return_value = m
+            with patch('cloudshell.cm.ansible.ansible_shell.OpenSshConnectionService') as service:
+
+                self._execute_playbook()
+
+        control_path_dir = os.path.join('/tmp/work', 'cp')
+        self.file_system.create_folder.assert_called_once_with(control_path_dir)
+        service.assert_called_once_with(control_path_dir, 300)
+        m.reuse_ssh_connections.assert_called_once_with(service.return_value.control_path_dir)
+        self.shell.connection_service.check_connection.assert_called_once_with(
+            Any(), host1, ansible_port='22', timeout_minutes=Any(), retry_policy=Any(),
+            ssh_master=service.return_value)
+        self.assertEqual('host1_access_key.pem', host1.access_key_file)
+        service.return_value.close_masters.assert_called_once()
+
+    def test_parsed_keys_are_forgotten_after_the_command(self):
+        self.shell.connection_service.clear_key_cache = Mock()
+
+        self._execute_playbook()
+
+        self.shell.connection_service.clear_key_cache.assert_called_once()
+
     # Inventory File
 
     def test_inventory_file(self):
@@ -197,7 +238,8 @@ class TestAnsibleShell(TestCase):
 
         self._execute_playbook()
 
-        self.downloader.get.assert_called_once_with('someurl', Any(), Any(), Any())
+        self.downloader.get.assert_called_once_with('someurl', Any(), Any(), Any(), sha256=None, sha256_url=None,
+                                                    entry_point=None)
 
     def test_download_playbook_with_auth(self):
         self.conf.playbook_repo.url = 'someurl'
@@ -208,7 +250,132 @@ class TestAnsibleShell(TestCase):
 
         self.downloader.get.assert_called_once_with('someurl',
                                                     Any(lambda x: x.username == 'user' and x.password == 'pass'), Any(),
-                                                    Any())
+                                                    Any(), sha256=None, sha256_url=None, entry_point=None)
+
+    def test_download_playbook_with_published_checksum(self):
+        self.conf.playbook_repo.url = 'http://server/playbook.zip?ref=master'
+        self.conf.playbook_repo.sha256 = None
+        self.conf.playbook_repo.published_checksum = True
+
+        self._execute_playbook()
+
+        self.downloader.get.assert_called_once_with(
+            'http://server/playbook.zip?ref=master', Any(), Any(), Any(), sha256=None,
+            sha256_url='http://server/playbook.zip.sha256?ref=master', entry_point=None)
+
+    def test_download_playbook_with_entry_point(self):
+        self.conf.playbook_repo.url = 'someurl'
+        self.conf.playbook_repo.entry_point = 'deploy/site.yml'
+
+        self._execute_playbook()
+
+        self.downloader.get.assert_called_once_with('someurl', Any(), Any(), Any(), sha256=None, sha256_url=None,
+                                                    entry_point='deploy/site.yml')
+
+    # Wait For Hosts
+
+    def test_wait_for_hosts_sequentially_by_default(self):
+        host1 = HostConfiguration()
+        host1.ip = 'host1'
+        host1.connection_method = AnsibleConnectionHelper.CONNECTION_METHOD_SSH
+        self.conf.hosts_conf.append(host1)
+
+        self._execute_playbook()
+
+        self.shell.connection_service.check_connection.assert_called_once_with(Any(), host1, ansible_port='22',
+                                                                               timeout_minutes=Any(),
+                                                                               retry_policy=self.conf.retry_policy,
+                                                                               ssh_master=None)
+
+    def test_wait_for_hosts_concurrently(self):
+        host1 = HostConfiguration()
+        host1.ip = 'host1'
+        host1.connection_method = AnsibleConnectionHelper.CONNECTION_METHOD_SSH
+        host2 = HostConfiguration()
+        host2.ip = 'host2'
+        host2.connection_method = AnsibleConnectionHelper.CONNECTION_METHOD_WIN_RM
+        self.conf.hosts_conf.extend([host1, host2])
+        self.conf.parallel_connection_checks = 5
+        self.shell.connection_service.check_connections = Mock(return_value=iter([host2, host1]))
+
+        self._execute_playbook()
+
+        self.shell.connection_service.check_connections.assert_called_once_with(
+            Any(), [(host1, '22'), (host2, '5985')], timeout_minutes=Any(), max_workers=5,
+            retry_policy=self.conf.retry_policy, ssh_master=None)
+        self.shell.connection_service.check_connection.assert_not_called()
+
+    def test_wait_skips_hosts_that_were_reachable_in_the_reservation(self):
+        host1 = HostConfiguration()
+        host1.ip = 'host1'
+        host1.connection_method = AnsibleConnectionHelper.CONNECTION_METHOD_SSH
+        host2 = HostConfiguration()
+        host2.ip = 'host2'
+        host2.connection_method = AnsibleConnectionHelper.CONNECTION_METHOD_SSH
+        self.conf.hosts_conf.extend([host1, host2])
+        self.conf.readiness_cache_seconds = 30
+        self.readiness_cache.get_reachable_at.side_effect = \
+            lambda reservation_id, key: 100.0 if key == '["host1", "22", "ssh"]' else None
+
+        self._execute_playbook()
+
+        self.readiness_cache_ctor.assert_called_once_with(ttl_seconds=30)
+        self.readiness_cache.get_reachable_at.assert_any_call(self.context.reservation.reservation_id,
+                                                              '["host1", "22", "ssh"]')
+        self.shell.connection_service.check_connection.assert_called_once_with(
+            Any(), host2, ansible_port='22', timeout_minutes=Any(), retry_policy=Any(), ssh_master=None)
+        self.readiness_cache.set_reachable.assert_called_once_with(self.context.reservation.reservation_id,
+                                                                   {'["host2", "22", "ssh"]': Any()})
+
+    def test_wait_marks_reachable_hosts_even_if_another_host_fails(self):
+        host1 = HostConfiguration()
+        host1.ip = 'host1'
+        host1.connection_method = AnsibleConnectionHelper.CONNECTION_METHOD_SSH
+        host2 = HostConfiguration()
+        host2.ip = 'host2'
+        host2.connection_method = AnsibleConnectionHelper.CONNECTION_METHOD_SSH
+        self.conf.hosts_conf.extend([host1, host2])
+        self.conf.readiness_cache_seconds = 30
+        self.shell.connection_service.check_connection.side_effect = [None, Exception('unreachable')]
+
+        with self.assertRaises(Exception):
+            self._execute_playbook()
+
+        self.readiness_cache.set_reachable.assert_called_once_with(self.context.reservation.reservation_id,
+                                                                   {'["host1", "22", "ssh"]': Any()})
+
+    def test_wait_marks_every_host_with_the_time_it_was_reachable(self):
+        host1 = HostConfiguration()
+        host1.ip = 'host1'
+        host1.connection_method = AnsibleConnectionHelper.CONNECTION_METHOD_SSH
+        host2 = HostConfiguration()
+        host2.ip = 'host2'
+        host2.connection_method = AnsibleConnectionHelper.CONNECTION_METHOD_SSH
+        self.conf.hosts_conf.extend([host1, host2])
+        self.conf.readiness_cache_seconds = 30
+        checked_at = []
+        def check_connection(*args, **kwargs):
+            checked_at.append(time.time())
+            time.sleep(0.01)
+        self.shell.connection_service.check_connection.side_effect = check_connection
+
+        self._execute_playbook()
+
+        self.readiness_cache.set_reachable.assert_called_once_with(
+            self.context.reservation.reservation_id,
+            {'["host1", "22", "ssh"]': Any(lambda at: checked_at[0] < at < checked_at[1]),
+             '["host2", "22", "ssh"]': Any(lambda at: checked_at[1] < at)})
+
+    def test_wait_without_readiness_cache(self):
+        host1 = HostConfiguration()
+        host1.ip = 'host1'
+        host1.connection_method = AnsibleConnectionHelper.CONNECTION_METHOD_SSH
+        self.conf.hosts_conf.append(host1)
+
+        self._execute_playbook()
+
+        self.readiness_cache_ctor.assert_not_called()
+        self.shell.connection_service.check_connection.assert_called_once()
 
     # Playbook Executor
 
@@ -233,4 +400,23 @@ class TestAnsibleShell(TestCase):
 
         self._execute_playbook()
 
-        self.ansible_result.ctor.assert_called_once_with('some output', 'some error', ['some ip'])
+        self.ansible_result.ctor.assert_called_once_with('some output', 'some error', ['some ip'], events_path=Any())
+
+    def test_spooled_output_is_closed(self):
+        output = Mock()
+        self.conf.spool_output = True
+        self.executor.execute_playbook = Mock(return_value=[output, ''])
+
+        self._execute_playbook()
+
+        output.close.assert_called_once()
+
+    def test_spooled_output_is_closed_when_the_result_fails_to_parse(self):
+        output = Mock()
+        self.conf.spool_output = True
+        self.executor.execute_playbook = Mock(return_value=[output, ''])
+        self.ansible_result.ctor.side_effect = ValueError('bad events file')
+
+        with self.assertRaises(ValueError):
+            self._execute_playbook()
+        output.close.assert_called_once()
@@ -0,0 +1,26 @@
+import os
+from unittest import TestCase
+
+from mock import Mock
+
+from cloudshell.cm.ansible.domain.callback_plugin_file import CallbackPluginFile
+from mocks.file_system_service_mock import FileSystemServiceMock
+
+
+class TestCallbackPluginFile(TestCase):
+    def setUp(self):
+        self.file_system = FileSystemServiceMock()
+
+    def test_plugin_is_created_in_plugins_folder(self):
+        with CallbackPluginFile(self.file_system, Mock()):
+            pass
+        self.assertIn(CallbackPluginFile.FOLDER_NAME, self.file_system.folders)
+        source = self.file_system.read_all_lines(CallbackPluginFile.FOLDER_NAME, CallbackPluginFile.PLUGIN_NAME + '.py')
+        self.assertIn("CALLBACK_NAME = '%s'" % CallbackPluginFile.PLUGIN_NAME, source)
+        compile(source, 'plugin', 'exec')
+
+    def test_plugin_writes_to_events_file(self):
+        with CallbackPluginFile(self.file_system, Mock()) as f:
+            f.set_events_file('events.jsonl')
+        source = self.file_system.read_all_lines(CallbackPluginFile.FOLDER_NAME, CallbackPluginFile.PLUGIN_NAME + '.py')
+        self.assertIn("open('events.jsonl', 'w')", source)
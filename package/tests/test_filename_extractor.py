@@ -2,6 +2,7 @@ from unittest import TestCase
 
 from mock import Mock
 
+from cloudshell.cm.ansible.domain.exceptions import AnsibleException
 from cloudshell.cm.ansible.domain.filename_extractor import FilenameExtractor
 
 
@@ -41,5 +42,33 @@ class TestFilenameExtractor(TestCase):
         self.response.url = "http://www.template.myurl/a/b/c/" + filename
         with self.assertRaises(Exception) as unsupportedExc:
             self.filename_extractor.get_filename(self.response)
-        self.assertEqual(unsupportedExc.exception.message,"playbook file of supported types: '.yml', '.yaml', '.zip' was not found")
+        self.assertEqual(unsupportedExc.exception.message,"playbook file of supported types: '.yml', '.yaml', '.zip', '.tar.gz', '.tar.zst' was not found")
 
+
+    def test_tar_filename_from_url(self):
+        for filename in ["my_file.tar.gz", "my_file.tgz", "my_file.tar.zst"]:
+            self.response.headers = {}
+            self.response.url = "http://www.template.myurl/a/b/c/" + filename
+            self.assertEqual(filename, self.filename_extractor.get_filename(self.response))
+
+    def test_double_extension_filename_from_url(self):
+        for filename in ["site.yml.tar.gz", "site.yaml.tgz", "site.yml.zip", "my.site.yml"]:
+            self.response.headers = {}
+            self.response.url = "http://www.template.myurl/a/b/c/" + filename
+            self.assertEqual(filename, self.filename_extractor.get_filename(self.response))
+
+    def test_double_extension_filename_from_header(self):
+        self.response.headers = {'content-disposition': 'attachment; filename=site.yml.tar.gz'}
+        self.assertEqual('site.yml.tar.gz', self.filename_extractor.get_filename(self.response))
+
+    def test_filename_from_url_with_query(self):
+        self.response.headers = {}
+        self.response.url = "http://www.template.myurl/a/b/c/site.yml?token=abc"
+        self.assertEqual('site.yml', self.filename_extractor.get_filename(self.response))
+
+    def test_unsupported_playbook_file_with_supported_inner_extension(self):
+        for filename in ["x.yml.bak", "site.yml.tar.gz.part"]:
+            self.response.headers = {'x-artifactory-filename': filename}
+            self.response.url = "http://www.template.myurl/a/b/c/" + filename
+            with self.assertRaises(AnsibleException):
+                self.filename_extractor.get_filename(self.response)
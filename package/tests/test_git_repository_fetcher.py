@@ -0,0 +1,104 @@
+import os
+import shutil
+import subprocess
+import tempfile
+from unittest import TestCase
+
+from mock import Mock, patch
+
+from cloudshell.cm.ansible.domain.git_repository_fetcher import GitRepositoryFetcher, is_git_url
+
+
+class TestGitRepositoryFetcher(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.remote = os.path.join(self.root, 'remote.git')
+        self.clone = os.path.join(self.root, 'clone')
+        self.fetcher = GitRepositoryFetcher(os.path.join(self.root, 'mirrors'))
+        self.logger = Mock()
+        self._git('init', '--quiet', '--bare', self.remote)
+        self._git('clone', '--quiet', self.remote, self.clone)
+        self._git('-C', self.clone, 'config', 'user.email', 'test@test')
+        self._git('-C', self.clone, 'config', 'user.name', 'test')
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    @staticmethod
+    def _git(*args):
+        return subprocess.check_output(('git',) + args).strip()
+
+    def _commit(self, files, tag=None):
+        for name, content in files.items():
+            path = os.path.join(self.clone, name)
+            if not os.path.exists(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'w') as f:
+                f.write(content)
+        self._git('-C', self.clone, 'add', '-A')
+        self._git('-C', self.clone, 'commit', '--quiet', '-m', 'commit')
+        if tag:
+            self._git('-C', self.clone, 'tag', tag)
+        self._git('-C', self.clone, 'push', '--quiet', '--tags', 'origin', 'HEAD:master')
+        return self._git('-C', self.clone, 'rev-parse', 'HEAD')
+
+    def _fetch(self, ref=''):
+        folder = tempfile.mkdtemp(dir=self.root)
+        url = 'git+file://' + self.remote + ('#' + ref if ref else '')
+        files = self.fetcher.fetch(url, None, folder, self.logger, Mock())
+        return folder, files
+
+    @staticmethod
+    def _read(folder, *path):
+        with open(os.path.join(folder, *path)) as f:
+            return f.read()
+
+    def test_is_git_url(self):
+        self.assertTrue(is_git_url('git+https://server/org/playbooks.git#v1'))
+        self.assertFalse(is_git_url('https://server/org/playbooks.zip'))
+
+    def test_checks_out_the_ref(self):
+        self._commit({'site.yml': 'v1', 'roles/r/tasks/main.yml': 'tasks'}, tag='v1')
+        self._commit({'site.yml': 'v2'})
+
+        folder, files = self._fetch('v1')
+
+        self.assertItemsEqual(['site.yml', os.path.join('roles', 'r', 'tasks', 'main.yml')], files)
+        self.assertEqual('v1', self._read(folder, 'site.yml'))
+        self.assertEqual('tasks', self._read(folder, 'roles', 'r', 'tasks', 'main.yml'))
+        self.assertEqual('v2', self._read(self._fetch()[0], 'site.yml'))
+
+    def test_mirror_is_updated_with_new_commits(self):
+        self._commit({'site.yml': 'v1'})
+        self._fetch('master')
+        self._commit({'site.yml': 'v2'})
+
+        folder, _ = self._fetch('master')
+
+        self.assertEqual('v2', self._read(folder, 'site.yml'))
+
+    def test_commit_in_mirror_is_checked_out_without_fetching(self):
+        commit = self._commit({'site.yml': 'v1'})
+        self._fetch('master')
+
+        with patch.object(self.fetcher, '_git', wraps=self.fetcher._git) as git:
+            folder, _ = self._fetch(commit)
+
+        self.assertEqual('v1', self._read(folder, 'site.yml'))
+        self.assertFalse([c for c in git.call_args_list if 'fetch' in c[0][0]])
+        self.assertTrue([c for c in git.call_args_list if 'ls-remote' in c[0][0]])
+
+    def test_commit_in_mirror_is_not_checked_out_without_access_to_the_remote(self):
+        commit = self._commit({'site.yml': 'v1'})
+        self._fetch('master')
+        shutil.rmtree(self.remote)
+
+        with self.assertRaises(Exception):
+            self._fetch(commit)
+
+    def test_unknown_ref_fails(self):
+        self._commit({'site.yml': 'v1'})
+
+        with self.assertRaises(Exception) as e:
+            self._fetch('no-such-branch')
+        self.assertIn('The ref \'no-such-branch\' was not found', e.exception.message)
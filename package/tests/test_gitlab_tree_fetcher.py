@@ -0,0 +1,115 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from mock import Mock
+
+from cloudshell.cm.ansible.domain.Helpers.gitlab_api_url_validator import is_gitlab_tree_url, is_gitlab_api_url
+from cloudshell.cm.ansible.domain.gitlab_tree_fetcher import GitlabTreeFetcher
+from cloudshell.cm.ansible.domain.playbook_cache import BlobCache
+
+REPOSITORY_URL = 'http://server/api/v4/projects/4/repository'
+
+
+def git_blob_sha(content):
+    return hashlib.sha1('blob %s\0' % len(content) + content).hexdigest()
+
+
+class TestGitlabTreeFetcher(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.work_dir = os.path.join(self.root, 'work')
+        os.mkdir(self.work_dir)
+        self.blob_cache = BlobCache(os.path.join(self.root, 'cache'))
+        self.http_request_service = Mock()
+        self.http_request_service.get_response.side_effect = self._get_response
+        self.fetcher = GitlabTreeFetcher(self.http_request_service, self.blob_cache)
+        self.logger = Mock()
+        self.pages = []
+        self.blobs = {}
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _add_files(self, files, per_page=None):
+        entries = [{'id': git_blob_sha('x'), 'type': 'tree', 'path': 'roles'}]
+        for path, content in sorted(files.items()):
+            self.blobs[git_blob_sha(content)] = content
+            entries.append({'id': git_blob_sha(content), 'type': 'blob', 'path': path})
+        per_page = per_page or len(entries)
+        self.pages = [entries[i:i + per_page] for i in range(0, len(entries), per_page)]
+
+    def _get_response(self, url, auth, logger):
+        response = Mock()
+        response.headers = {}
+        if url.startswith(REPOSITORY_URL + '/tree?'):
+            page = int(url.split('page=')[1].split('&')[0])
+            response.iter_content.return_value = [json.dumps(self.pages[page - 1])]
+            response.headers['X-Next-Page'] = str(page + 1) if page < len(self.pages) else ''
+        else:
+            sha = url[len(REPOSITORY_URL + '/blobs/'):-len('/raw')]
+            response.iter_content.return_value = [self.blobs[sha]]
+        return response
+
+    def _read(self, *path):
+        with open(os.path.join(self.work_dir, *path)) as f:
+            return f.read()
+
+    def _blob_requests(self):
+        return [c[0][0] for c in self.http_request_service.get_response.call_args_list if '/blobs/' in c[0][0]]
+
+    def test_urls(self):
+        self.assertTrue(is_gitlab_tree_url(REPOSITORY_URL + '/tree?ref=master&path=roles'))
+        self.assertTrue(is_gitlab_tree_url(REPOSITORY_URL + '/tree'))
+        self.assertFalse(is_gitlab_tree_url(REPOSITORY_URL + '/archive.zip?sha=master'))
+        self.assertTrue(is_gitlab_api_url(REPOSITORY_URL + '/archive.zip?sha=master'))
+        self.assertFalse(is_gitlab_api_url('http://server/playbooks/site.yml'))
+
+    def test_fetches_all_pages_of_the_folder(self):
+        self._add_files({'ansible/site.yml': 'site', 'ansible/roles/r/tasks/main.yml': 'tasks'}, per_page=1)
+
+        files = self.fetcher.fetch(REPOSITORY_URL + '/tree?ref=v1&path=ansible/', None, self.work_dir, self.logger,
+                                   Mock())
+
+        self.assertItemsEqual(['site.yml', os.path.join('roles', 'r', 'tasks', 'main.yml')], files)
+        self.assertEqual('site', self._read('site.yml'))
+        self.assertEqual('tasks', self._read('roles', 'r', 'tasks', 'main.yml'))
+        list_url = self.http_request_service.get_response.call_args_list[0][0][0]
+        self.assertEqual(REPOSITORY_URL + '/tree?page=1&path=ansible&per_page=100&recursive=true&ref=v1', list_url)
+
+    def test_cached_blobs_are_not_downloaded_again(self):
+        self._add_files({'site.yml': 'site', 'vars.yml': 'vars'})
+        self.fetcher.fetch(REPOSITORY_URL + '/tree', None, self.work_dir, self.logger, Mock())
+        shutil.rmtree(self.work_dir)
+        os.mkdir(self.work_dir)
+        self._add_files({'site.yml': 'site', 'vars.yml': 'changed'})
+        self.http_request_service.get_response.reset_mock()
+
+        self.fetcher.fetch(REPOSITORY_URL + '/tree', None, self.work_dir, self.logger, Mock())
+
+        self.assertEqual([REPOSITORY_URL + '/blobs/' + git_blob_sha('changed') + '/raw'], self._blob_requests())
+        self.assertEqual('site', self._read('site.yml'))
+        self.assertEqual('changed', self._read('vars.yml'))
+
+    def test_blob_with_wrong_content_fails(self):
+        self._add_files({'site.yml': 'site'})
+        self.blobs[git_blob_sha('site')] = 'tampered'
+
+        with self.assertRaises(Exception) as e:
+            self.fetcher.fetch(REPOSITORY_URL + '/tree', None, self.work_dir, self.logger, Mock())
+        self.assertIn('doesn\'t match', e.exception.message)
+        self.assertFalse(self.blob_cache.restore(git_blob_sha('site'), os.path.join(self.work_dir, 'site.yml')))
+
+    def test_least_recently_used_blobs_are_evicted(self):
+        self.blob_cache.max_size = 15
+        for content in ['a' * 10, 'b' * 10]:
+            self.blob_cache.store(git_blob_sha(content), [content])
+            os.utime(self.blob_cache._get_blob_path(git_blob_sha(content)), (0, 0) if content[0] == 'a' else None)
+
+        self.blob_cache.evict()
+
+        self.assertFalse(self.blob_cache.restore(git_blob_sha('a' * 10), os.path.join(self.work_dir, 'a')))
+        self.assertTrue(self.blob_cache.restore(git_blob_sha('b' * 10), os.path.join(self.work_dir, 'b')))
@@ -0,0 +1,84 @@
+import threading
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from unittest import TestCase
+
+from mock import Mock
+
+from cloudshell.cm.ansible.domain.http_request_service import HttpRequestService
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    statuses = []
+    client_ports = []
+    body = 'playbook'
+
+    def do_GET(self):
+        _Handler.client_ports.append(self.client_address[1])
+        status = _Handler.statuses.pop(0) if _Handler.statuses else 200
+        body = _Handler.body
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHttpRequestServiceSession(TestCase):
+    def setUp(self):
+        _Handler.statuses = []
+        _Handler.client_ports = []
+        _Handler.body = 'playbook'
+        self.server = HTTPServer(('127.0.0.1', 0), _Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = 'http://127.0.0.1:%s/site.yml' % self.server.server_address[1]
+        self.service = HttpRequestService()
+
+    def tearDown(self):
+        self.service.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connection_is_reused_across_downloads(self):
+        for i in range(3):
+            response = self.service.get_response(self.url, None, Mock())
+            self.assertEqual('playbook', ''.join(response.iter_content(1024)))
+
+        self.assertEqual(3, len(_Handler.client_ports))
+        self.assertEqual(1, len(set(_Handler.client_ports)))
+
+    def test_server_error_is_retried(self):
+        _Handler.statuses = [503]
+
+        response = self.service.get_response(self.url, None, Mock())
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(2, len(_Handler.client_ports))
+
+    def test_server_error_is_reported_after_retries(self):
+        _Handler.statuses = [500] * (HttpRequestService.RETRIES + 1)
+        self.service.session.adapters['http://'].max_retries.backoff_factor = 0
+
+        with self.assertRaises(Exception) as e:
+            self.service.get_response(self.url, None, Mock())
+        self.assertIn('500', e.exception.message)
+
+    def test_only_head_of_body_is_read_before_download(self):
+        _Handler.body = ''.join(chr(i % 256) for i in range(3 * 1024 * 1024 + 7))
+
+        response = self.service.get_response(self.url, None, Mock())
+
+        self.assertEqual(HttpRequestService.PEEK_SIZE, len(response.head))
+        self.assertEqual(_Handler.body, ''.join(response.iter_content(1024 * 1024)))
+
+    def test_html_page_is_rejected(self):
+        _Handler.body = '\n<!DOCTYPE html><html>' + ' ' * 100000 + '</html>'
+
+        with self.assertRaises(Exception) as e:
+            self.service.get_response(self.url, None, Mock())
+        self.assertIn('html', e.exception.message)
@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from cloudshell.cm.ansible.domain.output.output_capture import OutputCapture, SpooledOutputCapture
+
+
+class TestOutputCapture(TestCase):
+    def setUp(self):
+        self.capture = OutputCapture()
+
+    def test_get_text_of_each_stream(self):
+        self.capture.append('1', 'a')
+        self.capture.append('2\n', '')
+        self.capture.append('', 'b\n')
+
+        self.assertEqual('12\n', self.capture.get_text(OutputCapture.OUT))
+        self.assertEqual('ab\n', self.capture.get_text(OutputCapture.ERR))
+
+    def test_get_text_of_both_streams_keeps_read_order(self):
+        self.capture.append('1', 'a')
+        self.capture.append('2', 'b')
+
+        self.assertEqual('a1b2', self.capture.get_text())
+
+    def test_counts_sizes_and_lines(self):
+        self.capture.append('1\n2\n', 'a')
+        self.capture.append('3', 'b\n')
+
+        self.assertEqual(5, self.capture.size(OutputCapture.OUT))
+        self.assertEqual(3, self.capture.size(OutputCapture.ERR))
+        self.assertEqual(2, self.capture.line_count(OutputCapture.OUT))
+        self.assertEqual(1, self.capture.line_count(OutputCapture.ERR))
+        self.assertEqual(3, self.capture.line_count())
+
+    def test_view_reflects_appended_text(self):
+        view = self.capture.view(OutputCapture.OUT)
+        self.capture.append('1', 'a')
+        self.capture.append('2', 'b')
+
+        self.assertEqual('12', str(view))
+        self.assertEqual(['1', '2'], list(view))
+        self.assertEqual(2, len(view))
+
+
+class TestSpooledOutputCapture(TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.capture = SpooledOutputCapture(self.folder, tail_size=5)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_writes_streams_to_files(self):
+        with self.capture:
+            self.capture.append('123', 'a')
+            self.capture.append('456', 'b')
+
+        with open(os.path.join(self.folder, SpooledOutputCapture.OUT_FILE_NAME)) as f:
+            self.assertEqual('123456', f.read())
+        with open(os.path.join(self.folder, SpooledOutputCapture.ERR_FILE_NAME)) as f:
+            self.assertEqual('ab', f.read())
+
+    def test_keeps_only_tail_in_memory(self):
+        with self.capture:
+            self.capture.append('123', 'a')
+            self.capture.append('456', 'b')
+
+        self.assertEqual('3b456', self.capture.get_text())
+        self.assertEqual('3456', self.capture.get_text(OutputCapture.OUT))
+        self.assertEqual(8, self.capture.size())
+
+    def test_results_are_read_from_files(self):
+        with self.capture:
+            self.capture.append('123', 'a')
+            self.capture.append('456', 'b')
+
+        output, error = self.capture.get_results()
+
+        self.assertEqual('123456', output[:])
+        self.assertEqual('ab', error)
+        output.close()
+
+    def test_results_of_empty_output(self):
+        with self.capture:
+            pass
+
+        self.assertEqual(('', ''), self.capture.get_results())
@@ -1,6 +1,9 @@
 from unittest import TestCase
-from cloudshell.cm.ansible.domain.ansible_command_executor import OutputWriter, ReservationOutputWriter
-from mock import Mock
+import os
+from threading import Event
+from cloudshell.cm.ansible.domain.ansible_command_executor import OutputWriter, ReservationOutputWriter, \
+    OutputStreamer, BufferedOutputWriter
+from mock import Mock, patch
 
 
 class TestOutputWriter(TestCase):
@@ -20,3 +23,171 @@ class TestReservationOutputWriter(TestCase):
         output_writer.write('msg')
 
         self.assertTrue(session.WriteMessageToReservationOutput.called_with('msg'))
+
+
+class TestOutputStreamer(TestCase):
+
+    def setUp(self):
+        self.output_writer = Mock()
+        self.time_patcher = patch('cloudshell.cm.ansible.domain.ansible_command_executor.time.time')
+        self.time_mock = self.time_patcher.start()
+        self.time_mock.return_value = 0
+        self.streamer = OutputStreamer(self.output_writer, Mock(), max_chunk_size=10, max_delay_seconds=5)
+
+    def tearDown(self):
+        self.time_patcher.stop()
+
+    def _written_texts(self):
+        return [c[0][0] for c in self.output_writer.write.call_args_list]
+
+    def test_does_not_write_before_a_threshold_is_reached(self):
+        self.streamer.write('123\n', '')
+
+        self.output_writer.write.assert_not_called()
+
+    def test_writes_when_delay_passes(self):
+        self.streamer.write('123\n', '')
+        self.time_mock.return_value = 5
+        self.streamer.write('', '')
+
+        self.assertEqual(['<html><body><font color=white>123<br /></font></body></html>'], self._written_texts())
+
+    def test_writes_complete_lines_when_size_is_reached(self):
+        self.streamer.write('1234\n5678\nabc', '')
+
+        self.assertEqual(['<html><body><font color=white>1234<br />5678<br /></font></body></html>'],
+                         self._written_texts())
+
+    def test_writes_partial_lines_on_close(self):
+        self.streamer.write('abc', '')
+        self.streamer.write('def', 'err')
+        self.streamer.close()
+
+        self.assertEqual(['<html><body><font color=white>errabcdef</font></body></html>'], self._written_texts())
+
+    def test_splits_long_text_to_bounded_chunks(self):
+        self.streamer.write('123456789\n123456789\n', '')
+
+        self.assertEqual(['<html><body><font color=white>123456789<br /></font></body></html>',
+                          '<html><body><font color=white>123456789<br /></font></body></html>'],
+                         self._written_texts())
+
+    def test_color_is_carried_to_next_chunk(self):
+        self.streamer.write('\033[0;31m12345\n', '')
+        self.streamer.close()
+        self.streamer.write('67890\n', '')
+        self.streamer.close()
+
+        self.assertEqual('<html><body><font color=#C75646>67890<br /></font></body></html>', self._written_texts()[-1])
+
+
+class TestBufferedOutputWriter(TestCase):
+
+    def setUp(self):
+        self.inner_writer = Mock()
+
+    def _written_texts(self):
+        return [c[0][0] for c in self.inner_writer.write.call_args_list]
+
+    def test_writes_all_messages_on_exit(self):
+        with BufferedOutputWriter(self.inner_writer, max_latency_seconds=60) as writer:
+            for i in range(5):
+                writer.write(str(i))
+
+        self.assertEqual(['0', '1', '2', '3', '4'],
+                         [m for txt in self._written_texts() for m in txt.split(os.linesep)])
+
+    def test_merges_messages_written_while_a_batch_is_written(self):
+        writing = Event()
+        release = Event()
+
+        def slow_write(msg):
+            writing.set()
+            release.wait()
+        self.inner_writer.write.side_effect = slow_write
+
+        with BufferedOutputWriter(self.inner_writer, max_latency_seconds=0.01) as writer:
+            writer.write('first')
+            writing.wait()
+            writer.write('second')
+            writer.write('third')
+            release.set()
+
+        self.assertEqual(['first', 'second' + os.linesep + 'third'], self._written_texts())
+
+    def test_html_messages_are_merged_only_with_html_messages(self):
+        writing = Event()
+        release = Event()
+
+        def slow_write(msg):
+            writing.set()
+            release.wait()
+        self.inner_writer.write.side_effect = slow_write
+
+        with BufferedOutputWriter(self.inner_writer, max_latency_seconds=0.01) as writer:
+            writer.write('first')
+            writing.wait()
+            writer.write('text 1')
+            writer.write("<span style='color: red'>error 1</span>")
+            writer.write("<span style='color: red'>error 2</span>")
+            writer.write('<html><body><font color=white>ok<br /></font></body></html>')
+            writer.write('text 2')
+            writer.write('text 3')
+            release.set()
+
+        self.assertEqual(['first',
+                          'text 1',
+                          "<span style='color: red'>error 1</span><br /><span style='color: red'>error 2</span><br />"
+                          '<html><body><font color=white>ok<br /></font></body></html>',
+                          'text 2' + os.linesep + 'text 3'],
+                         self._written_texts())
+
+    def test_batches_are_bounded(self):
+        with BufferedOutputWriter(self.inner_writer, max_batch_size=10, max_latency_seconds=60) as writer:
+            writer.write('12345')
+            writer.write('12345')
+            writer.write('12345678901')
+            writer.write('1')
+
+        for txt in self._written_texts():
+            self.assertTrue(len(txt) <= 10 or txt == '12345678901')
+        self.assertEqual(['12345', '12345', '12345678901', '1'],
+                         [m for txt in self._written_texts() for m in txt.split(os.linesep)])
+
+    def test_flush_waits_for_all_messages(self):
+        with BufferedOutputWriter(self.inner_writer, max_latency_seconds=0.01) as writer:
+            writer.write('1')
+            writer.write('2')
+            writer.flush()
+
+            self.assertEqual(['1', '2'], [m for txt in self._written_texts() for m in txt.split(os.linesep)])
+
+    def test_writes_messages_when_an_exception_is_raised(self):
+        with self.assertRaises(ValueError):
+            with BufferedOutputWriter(self.inner_writer, max_latency_seconds=60) as writer:
+                writer.write('1')
+                raise ValueError()
+
+        self.assertEqual(['1'], self._written_texts())
+
+    def test_writes_a_notice_instead_of_a_batch_that_failed(self):
+        def write(msg):
+            if len(msg) > 5 and not msg.startswith('failed'):
+                raise Exception('message too long')
+        self.inner_writer.write.side_effect = write
+
+        with BufferedOutputWriter(self.inner_writer, max_latency_seconds=60) as writer:
+            writer.write('1234567890')
+
+        self.assertEqual(['1234567890', 'failed to write text of 10 characters (message too long)'],
+                         self._written_texts())
+
+    def test_does_not_raise_error_of_inner_writer(self):
+        self.inner_writer.write.side_effect = IOError('api is down')
+        logger = Mock()
+
+        with BufferedOutputWriter(self.inner_writer, logger=logger) as writer:
+            writer.write('1')
+            writer.flush()
+
+        logger.warning.assert_called_once()
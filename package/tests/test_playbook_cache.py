@@ -0,0 +1,185 @@
+import os
+import shutil
+import stat
+import tempfile
+from unittest import TestCase
+
+from mock import patch
+
+from cloudshell.cm.ansible.domain.models import HttpAuth
+from cloudshell.cm.ansible.domain.playbook_cache import PlaybookCache, ExtractedTreeCache, create_private_folder
+
+
+class TestPlaybookCache(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.work_dir = tempfile.mkdtemp()
+        self.cache = PlaybookCache(os.path.join(self.root, 'cache'))
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    @staticmethod
+    def _create_files(folder, files):
+        for file_name, content in files.iteritems():
+            path = os.path.join(folder, file_name)
+            if not os.path.exists(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'w') as f:
+                f.write(content)
+
+    def _store(self, key, files, headers=None):
+        # a working dir of its own, like every command (the files are linked into the cache)
+        work_dir = tempfile.mkdtemp(dir=self.root)
+        self._create_files(work_dir, files)
+        return self.cache.store(key, 'http://server/' + key, work_dir, sorted(files.keys()), 'site.yml',
+                                {'ETag': '"v1"'} if headers is None else headers)
+
+    def test_key_depends_on_url_and_credentials(self):
+        key = PlaybookCache.get_key('http://server/p.zip', HttpAuth('user', 'pass'))
+        self.assertEqual(key, PlaybookCache.get_key('http://server/p.zip', HttpAuth('user', 'pass')))
+        self.assertNotEqual(key, PlaybookCache.get_key('http://server/p.zip', HttpAuth('user', 'other')))
+        self.assertNotEqual(key, PlaybookCache.get_key('http://server/p.zip', None))
+        self.assertNotIn('pass', key)
+
+    def test_stored_entry_is_restored_to_folder(self):
+        self._store('a', {'p.zip': 'zip', 'site.yml': 'site', os.path.join('roles', 'r.yml'): 'role'})
+        entry = self.cache.get_entry('a')
+        self.assertEqual('"v1"', entry.etag)
+        self.assertEqual({'If-None-Match': '"v1"'}, entry.get_validation_headers())
+
+        dest = os.path.join(self.root, 'dest')
+        self.assertTrue(self.cache.restore(entry, dest))
+        with open(os.path.join(dest, 'roles', 'r.yml')) as f:
+            self.assertEqual('role', f.read())
+        self.assertEqual('site.yml', entry.playbook_name)
+
+    def test_response_without_validators_is_not_stored(self):
+        self.assertIsNone(self._store('a', {'site.yml': 'site'}, headers={}))
+        self.assertIsNone(self.cache.get_entry('a'))
+
+    def test_verified_response_without_validators_is_stored(self):
+        self._create_files(self.work_dir, {'site.yml': 'site'})
+        self.cache.store('a', 'http://server/a', self.work_dir, ['site.yml'], 'site.yml', {}, 'ab' * 32, True)
+        entry = self.cache.get_entry('a')
+        self.assertEqual('ab' * 32, entry.sha256)
+        self.assertEqual({}, entry.get_validation_headers())
+
+    def test_store_replaces_entry(self):
+        self._store('a', {'site.yml': 'old'})
+        self._store('a', {'site.yml': 'new'}, headers={'Last-Modified': 'Mon, 01 Jan 2018 00:00:00 GMT'})
+        entry = self.cache.get_entry('a')
+        self.assertEqual({'If-Modified-Since': 'Mon, 01 Jan 2018 00:00:00 GMT'}, entry.get_validation_headers())
+        dest = os.path.join(self.root, 'dest')
+        self.cache.restore(entry, dest)
+        with open(os.path.join(dest, 'site.yml')) as f:
+            self.assertEqual('new', f.read())
+
+    def test_least_recently_used_entries_are_evicted(self):
+        self.cache.max_size = 25
+        self._store('a', {'site.yml': 'a' * 10})
+        self._store('b', {'site.yml': 'b' * 10})
+        self.cache.restore(self.cache.get_entry('a'), os.path.join(self.root, 'dest'))
+        self._store('c', {'site.yml': 'c' * 10})
+
+        self.assertIsNotNone(self.cache.get_entry('a'))
+        self.assertIsNone(self.cache.get_entry('b'))
+        self.assertIsNotNone(self.cache.get_entry('c'))
+
+    def test_restore_of_evicted_entry_returns_false(self):
+        entry = self._store('a', {'site.yml': 'a'})
+        self.cache.max_size = 1
+        self._store('b', {'site.yml': 'bb'})
+        self.assertFalse(self.cache.restore(entry, os.path.join(self.root, 'dest')))
+
+    def test_modified_entry_is_dropped(self):
+        entry = self._store('a', {'site.yml': 'site'})
+        dest = os.path.join(self.root, 'dest')
+        self.cache.restore(entry, dest)
+        # a playbook that rewrites its own file, through the hard link
+        with open(os.path.join(dest, 'site.yml'), 'a') as f:
+            f.write(' modified')
+
+        self.assertFalse(self.cache.restore(entry, os.path.join(self.root, 'dest2')))
+        self.assertIsNone(self.cache.get_entry('a'))
+
+    def test_root_is_private(self):
+        self._store('a', {'site.yml': 'site'})
+
+        self.assertEqual(0o700, stat.S_IMODE(os.stat(self.cache.root).st_mode))
+
+    def test_root_of_an_older_version_is_made_private(self):
+        os.makedirs(self.cache.root, 0o777)
+        os.chmod(self.cache.root, 0o777)
+
+        create_private_folder(self.cache.root)
+
+        self.assertEqual(0o700, stat.S_IMODE(os.stat(self.cache.root).st_mode))
+
+    def test_root_that_is_a_link_is_refused(self):
+        # someone else could create the default root first, in the shared os tmp folder
+        target = tempfile.mkdtemp(dir=self.root)
+        os.symlink(target, self.cache.root)
+
+        with self.assertRaises(Exception) as e:
+            self._store('a', {'site.yml': 'site'})
+        self.assertIn('is not a folder of the current user', e.exception.message)
+
+    def test_root_of_another_user_is_refused(self):
+        os.makedirs(self.cache.root)
+
+        with patch('cloudshell.cm.ansible.domain.playbook_cache.os.getuid', return_value=os.getuid() + 1):
+            with self.assertRaises(Exception):
+                self.cache.get_entry('a')
+
+
+class TestExtractedTreeCache(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.work_dir = tempfile.mkdtemp()
+        self.tree_cache = ExtractedTreeCache(os.path.join(self.root, 'trees'))
+        self.files = {'site.yml': 'site', os.path.join('roles', 'r.yml'): 'role'}
+        self._create_files(self.work_dir, self.files)
+        self.entry = self.tree_cache.add_tree('a' * 64, self.work_dir, sorted(self.files.keys()), 'site.yml')
+        self.folder = tempfile.mkdtemp(dir=self.root)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    _create_files = staticmethod(TestPlaybookCache._create_files)
+
+    def test_tree_is_linked_into_folder(self):
+        entry = self.tree_cache.get_tree('a' * 64, self.folder)
+
+        self.assertEqual(sorted(self.files.keys()), entry.files)
+        self.assertEqual('site.yml', entry.playbook_name)
+        with open(os.path.join(self.folder, 'roles', 'r.yml')) as f:
+            self.assertEqual('role', f.read())
+        self.assertEqual(8, self.entry.size)
+        self.assertIsNone(self.tree_cache.get_tree('b' * 64, self.folder))
+
+    def test_modified_tree_is_dropped(self):
+        # the files of the working dir are hard links of the cached files
+        with open(os.path.join(self.work_dir, 'site.yml'), 'a') as f:
+            f.write(' modified')
+
+        self.assertIsNone(self.tree_cache.get_tree('a' * 64, self.folder))
+        self.assertIsNone(self.tree_cache.get_entry('a' * 64))
+
+    def test_content_is_checked_after_interval(self):
+        path = os.path.join(self.work_dir, 'vars.yml')
+        self._create_files(self.work_dir, {'vars.yml': 'vars'})
+        os.utime(path, (1000, 1000))
+        self.tree_cache.add_tree('c' * 64, self.work_dir, ['vars.yml'])
+        # the same size and modification time
+        os.remove(path)
+        cached_path = os.path.join(self.tree_cache.root, 'c' * 64, PlaybookCache.TREE_FOLDER_NAME, 'vars.yml')
+        with open(cached_path, 'w') as f:
+            f.write('evil')
+        os.utime(cached_path, (1000, 1000))
+        self.assertIsNotNone(self.tree_cache.get_tree('c' * 64, self.folder))
+
+        with patch.object(ExtractedTreeCache, 'VERIFY_INTERVAL_SECONDS', -1):
+            self.assertIsNone(self.tree_cache.get_tree('c' * 64, self.folder))
@@ -1,9 +1,12 @@
+import hashlib
 from unittest import TestCase
 from mock import Mock, patch
+from requests.exceptions import ConnectionError
 
 from cloudshell.cm.ansible.domain.filename_extractor import FilenameExtractor
 from cloudshell.cm.ansible.domain.http_request_service import HttpRequestService
 from cloudshell.cm.ansible.domain.playbook_downloader import PlaybookDownloader, HttpAuth
+from tests.helpers import Any
 from tests.mocks.file_system_service_mock import FileSystemServiceMock
 
 
@@ -82,3 +85,267 @@ class TestPlaybookDownloader(TestCase):
         file_name = self.playbook_downloader.get("", auth, self.logger, Mock())
 
         self.assertEquals(file_name, "lie.yaml")
+
+    def test_playbook_downloader_restores_not_modified_playbook_from_cache(self):
+        cache = Mock()
+        cache.get_entry.return_value.get_validation_headers.return_value = {'If-None-Match': '"v1"'}
+        cache.get_entry.return_value.playbook_name = 'site.yml'
+        cache.restore.return_value = True
+        self.reqeust.status_code = 304
+        self.http_request_serivce.get_response = Mock(return_value=self.reqeust)
+        self.playbook_downloader.playbook_cache = cache
+
+        file_name = self.playbook_downloader.get("url", None, self.logger, Mock())
+
+        self.assertEquals(file_name, "site.yml")
+        self.http_request_serivce.get_response.assert_called_once_with("url", None, self.logger,
+                                                                       headers={'If-None-Match': '"v1"'})
+        cache.restore.assert_called_once_with(cache.get_entry.return_value, self.file_system.get_working_dir())
+        cache.store.assert_not_called()
+
+    def test_playbook_downloader_adds_downloaded_playbook_to_cache(self):
+        cache = Mock()
+        cache.get_entry.return_value = None
+        self.zip_service.extract_all = lambda zip_file_name: self._set_extract_all_zip(["site.yaml"])
+        self.reqeust.url = "blabla/lie.zip"
+        self.reqeust.status_code = 200
+        self.reqeust.headers = {'content-disposition': 'lie.zip', 'ETag': '"v1"'}
+        self.reqeust.iter_content.return_value = ''
+        self.http_request_serivce.get_response = Mock(return_value=self.reqeust)
+        self.playbook_downloader.playbook_cache = cache
+
+        file_name = self.playbook_downloader.get("url", None, self.logger, Mock())
+
+        self.assertEquals(file_name, "site.yaml")
+        cache.store.assert_called_once_with(cache.get_key.return_value, "url", self.file_system.get_working_dir(),
+                                            ["lie.zip", "site.yaml"], "site.yaml", self.reqeust.headers,
+                                            hashlib.sha256('').hexdigest(), False)
+
+    def test_playbook_downloader_downloads_playbook_when_cache_cannot_be_read(self):
+        cache = Mock()
+        cache.get_entry.side_effect = Exception('The cache folder is not a folder of the current user')
+        self.reqeust.url = "blabla/site.yml"
+        self.reqeust.status_code = 200
+        self.reqeust.headers = {'content-disposition': 'site.yml'}
+        self.reqeust.iter_content.return_value = ''
+        self.http_request_serivce.get_response = Mock(return_value=self.reqeust)
+        self.playbook_downloader.playbook_cache = cache
+
+        file_name = self.playbook_downloader.get("url", None, self.logger, Mock())
+
+        self.assertEquals(file_name, "site.yml")
+        self.http_request_serivce.get_response.assert_called_once_with("url", None, self.logger)
+        cache.restore.assert_not_called()
+
+    def _set_response(self, chunks, status_code=200, headers=None):
+        response = Mock()
+        response.url = "blabla/lie.yaml"
+        response.status_code = status_code
+        response.headers = dict({'content-disposition': 'lie.yaml', 'ETag': '"v1"'}, **(headers or {}))
+
+        def iter_content(chunk_size):
+            for chunk in chunks:
+                if isinstance(chunk, Exception):
+                    raise chunk
+                yield chunk
+        response.iter_content = iter_content
+        return response
+
+    @patch('cloudshell.cm.ansible.domain.playbook_downloader.time.sleep')
+    def test_playbook_downloader_resumes_failed_download(self, sleep):
+        first = self._set_response(['abc', ConnectionError('reset')])
+        rest = self._set_response(['def'], 206, {'Content-Range': 'bytes 3-5/6'})
+        self.http_request_serivce.get_response = Mock(side_effect=[first, rest])
+
+        self.playbook_downloader.get("url", None, self.logger, Mock(), sha256=hashlib.sha256('abcdef').hexdigest())
+
+        self.assertEqual('abcdef', ''.join(self.file_system.read_all_lines('lie.yaml')))
+        self.http_request_serivce.get_response.assert_called_with(
+            "url", None, self.logger, headers={'Range': 'bytes=3-', 'If-Range': '"v1"'})
+
+    @patch('cloudshell.cm.ansible.domain.playbook_downloader.time.sleep')
+    def test_playbook_downloader_gives_up_after_retries(self, sleep):
+        responses = [self._set_response(['a', ConnectionError('reset')])
+                     for i in range(PlaybookDownloader.DOWNLOAD_RETRIES + 1)]
+        self.http_request_serivce.get_response = Mock(side_effect=responses)
+
+        with self.assertRaises(ConnectionError):
+            self.playbook_downloader.get("url", None, self.logger, Mock())
+
+    def test_playbook_downloader_fails_on_checksum_mismatch(self):
+        self.http_request_serivce.get_response = Mock(return_value=self._set_response(['abc']))
+
+        with self.assertRaises(Exception) as e:
+            self.playbook_downloader.get("url", None, self.logger, Mock(), sha256='0' * 64)
+        self.assertIn('Checksum mismatch', e.exception.message)
+
+    def test_playbook_downloader_verifies_published_checksum(self):
+        checksum = self._set_response([hashlib.sha256('abc').hexdigest().upper() + '  lie.yaml\n'])
+        self.http_request_serivce.get_response = Mock(side_effect=[checksum, self._set_response(['abc'])])
+
+        file_name = self.playbook_downloader.get("url", None, self.logger, Mock(), sha256_url="url.sha256")
+
+        self.assertEquals(file_name, "lie.yaml")
+
+    def test_playbook_downloader_trusts_cached_copy_with_expected_checksum(self):
+        cache = Mock()
+        cache.get_entry.return_value.sha256 = hashlib.sha256('abc').hexdigest()
+        cache.get_entry.return_value.playbook_name = 'site.yml'
+        cache.restore.return_value = True
+        self.http_request_serivce.get_response = Mock()
+        self.playbook_downloader.playbook_cache = cache
+
+        file_name = self.playbook_downloader.get("url", None, self.logger, Mock(),
+                                                 sha256=hashlib.sha256('abc').hexdigest())
+
+        self.assertEquals(file_name, "site.yml")
+        self.http_request_serivce.get_response.assert_not_called()
+
+    def test_playbook_downloader_fetches_gitlab_tree(self):
+        fetcher = Mock()
+        fetcher.fetch.side_effect = lambda *args: self._set_extract_all_zip(["site.yml", "vars.yml"])
+        self.playbook_downloader.gitlab_tree_fetcher = fetcher
+        url = "http://server/api/v4/projects/4/repository/tree?ref=master&path=ansible"
+
+        file_name = self.playbook_downloader.get(url, None, self.logger, Mock())
+
+        self.assertEquals(file_name, "site.yml")
+        fetcher.fetch.assert_called_once_with(url, None, self.file_system.get_working_dir(), self.logger, Any())
+
+    def test_playbook_downloader_checks_out_git_repository(self):
+        fetcher = Mock()
+        fetcher.fetch.side_effect = lambda *args: self._set_extract_all_zip(["deploy.yml", "roles"])
+        self.playbook_downloader.git_repository_fetcher = fetcher
+        url = "git+https://server/org/playbooks.git#v1"
+
+        file_name = self.playbook_downloader.get(url, None, self.logger, Mock())
+
+        self.assertEquals(file_name, "deploy.yml")
+        fetcher.fetch.assert_called_once_with(url, None, self.file_system.get_working_dir(), self.logger, Any())
+
+    def test_playbook_downloader_extracts_tar_while_downloading(self):
+        tar_service = Mock()
+        tar_service.get_compression.return_value = 'gz'
+        extracted = []
+        tar_service.extract_stream.side_effect = \
+            lambda chunks, compression, folder: extracted.append(next(chunks)) or ["site.yml", "roles/r.yml"]
+        self.playbook_downloader.tar_service = tar_service
+        self.http_request_serivce.get_response = Mock(return_value=self._set_response(['tar', 'padding']))
+        self.http_request_serivce.get_response.return_value.url = 'blabla/lie.tar.gz'
+
+        file_name = self.playbook_downloader.get("url", None, self.logger, Mock(),
+                                                 sha256=hashlib.sha256('tarpadding').hexdigest())
+
+        self.assertEquals(file_name, "site.yml")
+        self.assertEqual(['tar'], extracted)
+        self.assertFalse(self.file_system.exists('lie.tar.gz'))
+
+    def test_playbook_downloader_uses_extracted_tree_of_same_zip(self):
+        tree_cache = Mock()
+        tree_cache.get_tree.return_value = Mock(files=["site.yml", "roles/r.yml"], playbook_name=None)
+        self.playbook_downloader.tree_cache = tree_cache
+        self.zip_service.extract_all = Mock()
+        self.http_request_serivce.get_response = Mock(return_value=self._set_response(['zip']))
+        self.http_request_serivce.get_response.return_value.url = 'blabla/lie.zip'
+
+        file_name = self.playbook_downloader.get("url", None, self.logger, Mock())
+
+        self.assertEquals(file_name, "site.yml")
+        tree_cache.get_tree.assert_called_once_with(hashlib.sha256('zip').hexdigest(),
+                                                    self.file_system.get_working_dir())
+        self.zip_service.extract_all.assert_not_called()
+
+    def test_playbook_downloader_adds_extracted_zip_to_tree_cache(self):
+        tree_cache = Mock()
+        tree_cache.get_tree.return_value = None
+        self.playbook_downloader.tree_cache = tree_cache
+        self.zip_service.extract_all = lambda zip_file_name: self._set_extract_all_zip(["site.yml"])
+        self.http_request_serivce.get_response = Mock(return_value=self._set_response(['zip']))
+        self.http_request_serivce.get_response.return_value.url = 'blabla/lie.zip'
+
+        self.playbook_downloader.get("url", None, self.logger, Mock())
+
+        tree_cache.add_tree.assert_called_once_with(hashlib.sha256('zip').hexdigest(),
+                                                    self.file_system.get_working_dir(), ["site.yml"], "site.yml")
+
+    def test_playbook_downloader_skips_download_of_extracted_archive_with_expected_checksum(self):
+        tree_cache = Mock()
+        tree_cache.get_tree.return_value = Mock(files=["site.yml"], playbook_name=None)
+        self.playbook_downloader.tree_cache = tree_cache
+        self.http_request_serivce.get_response = Mock()
+
+        file_name = self.playbook_downloader.get("url", None, self.logger, Mock(), sha256='AB' * 32)
+
+        self.assertEquals(file_name, "site.yml")
+        tree_cache.get_tree.assert_called_once_with('ab' * 32, self.file_system.get_working_dir())
+        self.http_request_serivce.get_response.assert_not_called()
+
+    def test_playbook_downloader_uses_cached_playbook_name_of_extracted_tree(self):
+        tree_cache = Mock()
+        tree_cache.get_tree.return_value = Mock(files=["a.yml", "b.yml"], playbook_name="b.yml")
+        self.playbook_downloader.tree_cache = tree_cache
+        self.http_request_serivce.get_response = Mock()
+
+        file_name = self.playbook_downloader.get("url", None, self.logger, Mock(), sha256='ab' * 32)
+
+        self.assertEquals(file_name, "b.yml")
+
+    def test_playbook_downloader_zip_file_with_entry_point(self):
+        self.zip_service.extract_all = lambda zip_file_name: self._set_extract_all_zip(
+            ["site.yml", "deploy/web.yml", "deploy/db.yml"])
+        self.http_request_serivce.get_response = Mock(return_value=self._set_response(['zip']))
+        self.http_request_serivce.get_response.return_value.url = 'blabla/lie.zip'
+
+        file_name = self.playbook_downloader.get("url", None, self.logger, Mock(), entry_point='/deploy\\db.yml')
+
+        self.assertEquals(file_name, "deploy/db.yml")
+
+    def test_playbook_downloader_fails_on_missing_entry_point(self):
+        self.zip_service.extract_all = lambda zip_file_name: self._set_extract_all_zip(["site.yml"])
+        self.http_request_serivce.get_response = Mock(return_value=self._set_response(['zip']))
+        self.http_request_serivce.get_response.return_value.url = 'blabla/lie.zip'
+
+        with self.assertRaises(Exception) as e:
+            self.playbook_downloader.get("url", None, self.logger, Mock(), entry_point='deploy/db.yml')
+        self.assertIn("The entry point 'deploy/db.yml' was not found in zip file", e.exception.message)
+
+    def test_playbook_downloader_zip_file_with_manifest(self):
+        def extract_all(zip_file_name):
+            self.file_system.create_file('cloudshell_playbook.json').write('{"entryPoint": "deploy/web.yml"}')
+            return ["cloudshell_playbook.json", "site.yml", "deploy/web.yml"]
+        self.zip_service.extract_all = extract_all
+        self.http_request_serivce.get_response = Mock(return_value=self._set_response(['zip']))
+        self.http_request_serivce.get_response.return_value.url = 'blabla/lie.zip'
+
+        file_name = self.playbook_downloader.get("url", None, self.logger, Mock())
+
+        self.assertEquals(file_name, "deploy/web.yml")
+
+    def test_playbook_downloader_does_not_cache_configured_entry_point(self):
+        cache = Mock()
+        cache.get_entry.return_value = None
+        self.zip_service.extract_all = lambda zip_file_name: self._set_extract_all_zip(
+            ["site.yml", "deploy/other.yml"])
+        self.http_request_serivce.get_response = Mock(return_value=self._set_response(['zip']))
+        self.http_request_serivce.get_response.return_value.url = 'blabla/lie.zip'
+        self.playbook_downloader.playbook_cache = cache
+
+        file_name = self.playbook_downloader.get("url", None, self.logger, Mock(), entry_point='deploy/other.yml')
+
+        self.assertEquals(file_name, "deploy/other.yml")
+        cache.store.assert_called_once_with(Any(), "url", Any(), ["lie.zip", "site.yml", "deploy/other.yml"], None,
+                                            Any(), Any(), False)
+
+    def test_playbook_downloader_finds_playbook_of_cached_copy_without_entry_point(self):
+        cache = Mock()
+        cache.get_entry.return_value.get_validation_headers.return_value = {'If-None-Match': '"v1"'}
+        cache.get_entry.return_value.files = ["lie.zip", "site.yml", "deploy/other.yml"]
+        cache.get_entry.return_value.playbook_name = None
+        cache.restore.return_value = True
+        self.reqeust.status_code = 304
+        self.http_request_serivce.get_response = Mock(return_value=self.reqeust)
+        self.playbook_downloader.playbook_cache = cache
+
+        self.assertEquals("site.yml", self.playbook_downloader.get("url", None, self.logger, Mock()))
+        self.assertEquals("deploy/other.yml", self.playbook_downloader.get("url", None, self.logger, Mock(),
+                                                                           entry_point='deploy/other.yml'))
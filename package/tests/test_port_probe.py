@@ -0,0 +1,54 @@
+import socket
+import time
+from threading import Event
+from unittest import TestCase
+
+from cloudshell.cm.ansible.domain.port_probe import PortProbe
+
+
+class TestPortProbe(TestCase):
+    def setUp(self):
+        self.probe = PortProbe()
+        self.listener = socket.socket()
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(5)
+        self.open_address = ('127.0.0.1', self.listener.getsockname()[1])
+        # a port that was just released, so it refuses connections
+        closed = socket.socket()
+        closed.bind(('127.0.0.1', 0))
+        self.closed_address = ('127.0.0.1', closed.getsockname()[1])
+        closed.close()
+
+    def tearDown(self):
+        self.listener.close()
+
+    def test_yields_open_ports(self):
+        opened = list(self.probe.wait_for_ports([self.open_address], 5))
+
+        self.assertEqual([self.open_address], opened)
+
+    def test_closed_port_is_not_yielded_after_timeout(self):
+        start = time.time()
+
+        opened = list(self.probe.wait_for_ports([self.closed_address, self.open_address], 1.5))
+
+        self.assertEqual([self.open_address], opened)
+        self.assertLess(time.time() - start, 5)
+
+    def test_port_that_opens_later_is_yielded(self):
+        listener = socket.socket()
+        opened = []
+        for address in self.probe.wait_for_ports([self.open_address, self.closed_address], 10):
+            opened.append(address)
+            if address == self.open_address:
+                listener.bind(self.closed_address)
+                listener.listen(5)
+        listener.close()
+
+        self.assertEqual([self.open_address, self.closed_address], opened)
+
+    def test_stop_event_aborts_the_wait(self):
+        stop_event = Event()
+        stop_event.set()
+
+        self.assertEqual([], list(self.probe.wait_for_ports([self.open_address], 5, stop_event)))
@@ -0,0 +1,81 @@
+import os
+import shutil
+import tempfile
+import time
+from unittest import TestCase
+
+from mock import patch
+
+from cloudshell.cm.ansible.domain.readiness_cache import ReadinessCache
+
+
+class TestReadinessCache(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.cache = ReadinessCache(self.root, ttl_seconds=60)
+        self.key = ReadinessCache.get_key('1.1.1.1', '22', 'ssh')
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_reachable_host(self):
+        with patch('cloudshell.cm.ansible.domain.readiness_cache.time.time', return_value=1010.0):
+            self.cache.set_reachable('res1', {self.key: 1000.0})
+        with patch('cloudshell.cm.ansible.domain.readiness_cache.time.time', return_value=1030.0):
+            self.assertEqual(1000.0, self.cache.get_reachable_at('res1', self.key))
+
+    def test_host_is_forgotten_after_the_ttl(self):
+        with patch('cloudshell.cm.ansible.domain.readiness_cache.time.time', return_value=1050.0):
+            self.cache.set_reachable('res1', {self.key: 1000.0})
+        with patch('cloudshell.cm.ansible.domain.readiness_cache.time.time', return_value=1061.0):
+            self.assertIsNone(self.cache.get_reachable_at('res1', self.key))
+
+    def test_later_time_of_a_host_is_kept(self):
+        self.cache.set_reachable('res1', {self.key: time.time()})
+        later = self.cache.get_reachable_at('res1', self.key)
+
+        self.cache.set_reachable('res1', {self.key: later - 10})
+
+        self.assertEqual(later, self.cache.get_reachable_at('res1', self.key))
+
+    def test_hosts_are_per_reservation_port_and_connection_method(self):
+        self.cache.set_reachable('res1', {self.key: time.time()})
+
+        self.assertIsNone(self.cache.get_reachable_at('res2', self.key))
+        self.assertIsNone(self.cache.get_reachable_at('res1', ReadinessCache.get_key('1.1.1.1', '2222', 'ssh')))
+        self.assertIsNone(self.cache.get_reachable_at('res1', ReadinessCache.get_key('1.1.1.1', '22', 'winrm')))
+
+    def test_is_shared_by_cache_instances(self):
+        self.cache.set_reachable('res1', {self.key: time.time()})
+
+        self.assertIsNotNone(ReadinessCache(self.root).get_reachable_at('res1', self.key))
+
+    def test_old_reservations_are_evicted(self):
+        self.cache.set_reachable('res1', {self.key: time.time()})
+        path = self.cache._get_path('res1')
+        os.utime(path, (0, 0))
+
+        self.cache.set_reachable('res2', {self.key: time.time()})
+
+        self.assertFalse(os.path.exists(path))
+        self.assertTrue(os.path.exists(self.cache._get_path('res2')))
+
+    def test_short_ttl_does_not_evict_reservations_of_a_longer_ttl(self):
+        long_ttl_cache = ReadinessCache(self.root, ttl_seconds=600)
+        long_ttl_cache.set_reachable('res1', {self.key: time.time()})
+        path = long_ttl_cache._get_path('res1')
+        os.utime(path, (time.time() - 120, time.time() - 120))
+
+        ReadinessCache(self.root, ttl_seconds=60).set_reachable('res2', {self.key: time.time()})
+
+        self.assertTrue(os.path.exists(path))
+        self.assertIsNotNone(long_ttl_cache.get_reachable_at('res1', self.key))
+
+    def test_corrupted_file_is_treated_as_empty(self):
+        self.cache.set_reachable('res1', {self.key: time.time()})
+        with open(self.cache._get_path('res1'), 'w') as f:
+            f.write('{')
+
+        self.assertIsNone(self.cache.get_reachable_at('res1', self.key))
+        self.cache.set_reachable('res1', {self.key: time.time()})
+        self.assertIsNotNone(self.cache.get_reachable_at('res1', self.key))
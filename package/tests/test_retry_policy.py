@@ -0,0 +1,106 @@
+import random
+from unittest import TestCase
+
+from mock import Mock, patch
+
+from cloudshell.cm.ansible.domain.ansible_configuration import HostConfiguration
+from cloudshell.cm.ansible.domain.connection_service import ConnectionService, ExcutorConnectionError
+from cloudshell.cm.ansible.domain.retry_policy import RetryPolicy
+
+
+class SimulatedClock(object):
+    def __init__(self):
+        """
+        A clock for the connection service, that moves only when the service sleeps.
+        """
+        self.now = 0.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestRetryPolicy(TestCase):
+    def test_delays_grow_exponentially_up_to_the_max(self):
+        policy = RetryPolicy(initial_interval_seconds=1, max_interval_seconds=10, multiplier=2, jitter=0)
+
+        delays = [policy.get_delay(attempt, 0, 600) for attempt in range(1, 7)]
+
+        self.assertEqual([1, 2, 4, 8, 10, 10], delays)
+
+    def test_jitter_cuts_off_part_of_the_delay(self):
+        policy = RetryPolicy(initial_interval_seconds=10, max_interval_seconds=10, jitter=0.5, rand=random.Random(1))
+
+        delays = [policy.get_delay(1, 0, 600) for _ in range(100)]
+
+        self.assertTrue(all(5 <= delay <= 10 for delay in delays))
+        self.assertGreater(len(set(delays)), 1)
+
+    def test_delay_does_not_pass_the_timeout(self):
+        policy = RetryPolicy(initial_interval_seconds=10, jitter=0)
+
+        self.assertEqual(3, policy.get_delay(1, 57, 60))
+        self.assertEqual(0, policy.get_delay(1, 61, 60))
+
+    def test_many_attempts_do_not_overflow(self):
+        policy = RetryPolicy(jitter=0)
+
+        self.assertEqual(RetryPolicy.MAX_INTERVAL_SECONDS, policy.get_delay(10000, 0, 600))
+
+
+class TestRetryPolicyTimeToDetectReady(TestCase):
+    """
+    Simulated hosts that become ready at random times, and the time it takes the connection service to notice.
+    """
+    HOSTS = 200
+
+    def setUp(self):
+        self.clock = SimulatedClock()
+        self.patchers = [patch('cloudshell.cm.ansible.domain.connection_service.time.time', self.clock.time),
+                         patch('cloudshell.cm.ansible.domain.connection_service.time.sleep', self.clock.sleep)]
+        for patcher in self.patchers:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+
+    def _mean_time_to_detect_ready(self, retry_policy, max_ready_seconds=120):
+        rand = random.Random(7)
+        total = 0.0
+        for _ in range(self.HOSTS):
+            ready_at = rand.uniform(0, max_ready_seconds)
+            service = ConnectionService()
+            service.port_probe = None
+            service.linuxConnectionService = Mock()
+
+            def check_connection(target_host, logger, ansible_port):
+                if self.clock.now < ready_at:
+                    raise ExcutorConnectionError(111, Exception('refused'))
+            service.linuxConnectionService.check_connection.side_effect = check_connection
+            host = HostConfiguration()
+            host.ip = '1.1.1.1'
+            host.connection_method = 'ssh'
+
+            self.clock.now = 0.0
+            service.check_connection(Mock(), host, ansible_port='22', timeout_minutes=10, retry_policy=retry_policy)
+            total += self.clock.now - ready_at
+        return total / self.HOSTS
+
+    def test_backoff_detects_ready_hosts_sooner_than_a_fixed_interval(self):
+        fixed = self._mean_time_to_detect_ready(
+            RetryPolicy(initial_interval_seconds=10, max_interval_seconds=10, jitter=0))
+        backoff = self._mean_time_to_detect_ready(RetryPolicy(rand=random.Random(7)))
+
+        # a fixed interval misses a host by half of the interval, on average
+        self.assertAlmostEqual(5, fixed, delta=1)
+        self.assertLess(backoff, fixed)
+
+    def test_backoff_detects_quickly_ready_hosts_much_sooner(self):
+        fixed = self._mean_time_to_detect_ready(
+            RetryPolicy(initial_interval_seconds=10, max_interval_seconds=10, jitter=0), max_ready_seconds=5)
+        backoff = self._mean_time_to_detect_ready(RetryPolicy(rand=random.Random(7)), max_ready_seconds=5)
+
+        self.assertLess(backoff, fixed / 2)
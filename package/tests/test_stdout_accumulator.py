@@ -0,0 +1,39 @@
+import os
+import sys
+from subprocess import Popen, PIPE
+from unittest import TestCase
+
+from cloudshell.cm.ansible.domain.stdout_accumulator import StdoutAccumulator
+
+
+class TestStreamAccumulator(TestCase):
+
+    def _start_process(self, script):
+        return Popen([sys.executable, '-c', script], stdout=PIPE)
+
+    def test_reads_all_text_until_end_of_stream(self):
+        process = self._start_process('import sys\nfor i in range(1000): sys.stdout.write("line %s\\n" % i)')
+
+        with StdoutAccumulator(process.stdout) as stdout:
+            process.wait()
+        txt = stdout.read_all_txt()
+
+        self.assertEqual(''.join('line %s\n' % i for i in range(1000)), txt)
+
+    def test_read_all_txt_returns_only_new_text(self):
+        read_fd, write_fd = os.pipe()
+        with StdoutAccumulator(os.fdopen(read_fd, 'rb')) as stdout:
+            os.write(write_fd, 'abc')
+            os.close(write_fd)
+            stdout.thread.join()
+            self.assertEqual('abc', stdout.read_all_txt())
+            self.assertEqual('', stdout.read_all_txt())
+
+    def test_closes_stream_on_exit(self):
+        process = self._start_process('print("x")')
+
+        with StdoutAccumulator(process.stdout):
+            pass
+
+        self.assertTrue(process.stdout.closed)
+        process.wait()
@@ -0,0 +1,90 @@
+import os
+import shutil
+import tarfile
+import tempfile
+from io import BytesIO
+from unittest import TestCase
+
+from cloudshell.cm.ansible.domain.tar_service import TarService, ChunkStream, zstandard
+
+
+class TestTarService(TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.tar_service = TarService()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    @staticmethod
+    def _create_tar(files, compression='gz', links=None):
+        data = BytesIO()
+        tar = tarfile.open(fileobj=data, mode='w:' + compression)
+        for name, content in files:
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            tar.addfile(info, BytesIO(content))
+        for name, link in (links or {}).items():
+            info = tarfile.TarInfo(name)
+            info.type = tarfile.SYMTYPE
+            info.linkname = link
+            tar.addfile(info)
+        tar.close()
+        return data.getvalue()
+
+    @staticmethod
+    def _chunks(data, size=7):
+        return (data[i:i + size] for i in range(0, len(data), size))
+
+    def _read(self, *path):
+        with open(os.path.join(self.folder, *path)) as f:
+            return f.read()
+
+    def test_get_compression(self):
+        self.assertEqual(TarService.GZIP, TarService.get_compression('playbook.tar.gz'))
+        self.assertEqual(TarService.GZIP, TarService.get_compression('playbook.TGZ'))
+        self.assertEqual(TarService.ZSTD, TarService.get_compression('playbook.tar.zst'))
+        self.assertIsNone(TarService.get_compression('playbook.zip'))
+
+    def test_extracts_stream_of_chunks(self):
+        data = self._create_tar([('site.yml', 'site'), ('roles/r/tasks/main.yml', 'tasks')], links={'link': '/etc'})
+
+        files = self.tar_service.extract_stream(self._chunks(data), TarService.GZIP, self.folder)
+
+        self.assertEqual(['site.yml', 'roles/r/tasks/main.yml'], files)
+        self.assertEqual('site', self._read('site.yml'))
+        self.assertEqual('tasks', self._read('roles', 'r', 'tasks', 'main.yml'))
+        self.assertItemsEqual(['site.yml', 'roles'], os.listdir(self.folder))
+
+    def test_single_folder_is_removed(self):
+        data = self._create_tar([('bundle/site.yml', 'site'), ('bundle/bundle/vars.yml', 'vars')])
+
+        files = self.tar_service.extract_stream(self._chunks(data), TarService.GZIP, self.folder)
+
+        self.assertEqual(['site.yml', 'bundle/vars.yml'], files)
+        self.assertEqual('vars', self._read('bundle', 'vars.yml'))
+        self.assertItemsEqual(['site.yml', 'bundle'], os.listdir(self.folder))
+
+    def test_path_traversal_is_rejected(self):
+        data = self._create_tar([('site.yml', 'site'), ('../evil.yml', 'evil')])
+
+        with self.assertRaises(Exception) as e:
+            self.tar_service.extract_stream(self._chunks(data), TarService.GZIP, self.folder)
+        self.assertIn('Tar file contains an invalid file path', e.exception.message)
+        self.assertEqual([], os.listdir(self.folder))
+
+    def test_extracts_zstd_stream(self):
+        if not zstandard:
+            self.skipTest('zstandard is not installed')
+        data = zstandard.ZstdCompressor().compress(self._create_tar([('site.yml', 'site')], compression=''))
+
+        files = self.tar_service.extract_stream(self._chunks(data), TarService.ZSTD, self.folder)
+
+        self.assertEqual(['site.yml'], files)
+
+    def test_chunk_stream_reads_across_chunks(self):
+        stream = ChunkStream(['ab', '', 'cde', 'f'])
+        self.assertEqual('abcd', stream.read(4))
+        self.assertEqual('e', stream.read(1))
+        self.assertEqual('f', stream.read())
+        self.assertEqual('', stream.read(3))
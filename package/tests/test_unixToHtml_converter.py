@@ -25,3 +25,46 @@ class TestUnixToHtmlColorConverter(TestCase):
         text = ''
         expectedText = '<html><body><font color=white></font></body></html>'
         self.assertEqual(self.color_converter.convert(text), expectedText)
+
+    def test_convert_carries_color_to_next_text(self):
+        self.color_converter.convert('\033[0;32mi am green')
+        expectedText = '<html><body><font color=#8EB33B>still green</font></body></html>'
+        self.assertEqual(self.color_converter.convert('still green'), expectedText)
+
+    def test_convert_line_breaks(self):
+        expectedText = '<html><body><font color=white>' \
+                       'a<br />b<br /><br />c<br /><br /><br /><br />d</font></body></html>'
+        self.assertEqual(self.color_converter.convert('a\nb\r\n\nc\n\n\n\nd'), expectedText)
+
+    def test_convert_keeps_blank_lines(self):
+        expectedText = '<html><body><font color=white>ok: [h]<br /><br />PLAY RECAP</font></body></html>'
+        self.assertEqual(self.color_converter.convert('ok: [h]\n\nPLAY RECAP'), expectedText)
+
+    def test_feed_keeps_blank_line_between_chunks(self):
+        html = self.color_converter.feed('ok: [h]\r')
+        html += self.color_converter.feed('\n')
+        html += self.color_converter.feed('\nPLAY RECAP')
+        html += self.color_converter.close()
+        self.assertEqual('<html><body><font color=white>ok: [h]<br /><br />PLAY RECAP</font></body></html>', html)
+
+    def test_convert_sgr_variants(self):
+        text = '\033[31ma\033[1mb\033[22mc\033[93md\033[38;5;196me\033[38;2;1;2;3mf\033[39mg\033[1;4;31mh\033[mi\033[Kj'
+        expectedText = '<html><body><font color=white>' \
+                       '</font><font color=#C75646>a</font><font color=#E09690>b</font><font color=#C75646>c' \
+                       '</font><font color=#FFE377>d</font><font color=#FF0000>e</font><font color=#010203>f' \
+                       '</font><font color=white>g</font><font color=#E09690>h</font><font color=white>ij' \
+                       '</font></body></html>'
+        self.assertEqual(self.color_converter.convert(text), expectedText)
+
+    def test_feed_carries_cut_sequence_to_next_chunk(self):
+        html = self.color_converter.feed('a\033[0;3')
+        html += self.color_converter.feed('2mb\r')
+        html += self.color_converter.feed('\nc')
+        html += self.color_converter.close()
+        self.assertEqual('<html><body><font color=white>a</font><font color=#8EB33B>b<br />c</font></body></html>', html)
+
+    def test_close_drops_cut_sequence(self):
+        html = self.color_converter.feed('a\033[0;3') + self.color_converter.close()
+        self.assertEqual('<html><body><font color=white>a</font></body></html>', html)
+        self.assertEqual('<html><body><font color=white>b</font></body></html>',
+                         self.color_converter.feed('b') + self.color_converter.close())
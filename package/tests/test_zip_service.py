@@ -1,43 +1,82 @@
+import os
+import shutil
+import tempfile
 from unittest import TestCase
-from zipfile import ZipFile
+from zipfile import ZipFile, ZIP_DEFLATED
 
-from io import BytesIO
-from mock import patch, Mock
-
-from cloudshell.cm.ansible.domain.zip_service import ZipService
-from tests.helpers import Any
+from cloudshell.cm.ansible.domain.zip_service import ZipService, get_safe_member_name
 
 
 class TestZipService(TestCase):
     def setUp(self):
-        self.zip_file = ZipFile(BytesIO(), 'w')
-        self.zip_file.extractall = Mock()
-        self.zip_file.extract = Mock()
-        self.zip_patcher = patch('cloudshell.cm.ansible.domain.zip_service.ZipFile')
-        self.zip_patcher.start().return_value = self.zip_file
+        self.root = tempfile.mkdtemp()
+        self.folder = os.path.join(self.root, 'work')
+        os.mkdir(self.folder)
+        self.zip_file_name = os.path.join(self.root, 'playbook.zip')
+        self.zip_file = ZipFile(self.zip_file_name, 'w', ZIP_DEFLATED)
         self.zip_service = ZipService()
 
     def tearDown(self):
-        self.zip_patcher.stop()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _extract(self):
+        self.zip_file.close()
+        return self.zip_service.extract_all(self.zip_file_name, self.folder)
+
+    def _read(self, *path):
+        with open(os.path.join(self.folder, *path)) as f:
+            return f.read()
 
     def test_regulsr_zip(self):
         self.zip_file.writestr('playbook.yml', 'some yml code')
-        self.zip_file.writestr('Roles/', 'some yml code')
-        self.zip_file.writestr('Roles/a.yml', 'some yml code')
+        self.zip_file.writestr('Roles/', '')
+        self.zip_file.writestr('Roles/a.yml', 'other yml code')
 
-        self.zip_service.extract_all('')
+        files = self._extract()
 
-        self.zip_file.extractall.assert_called_once()
+        self.assertEqual(['playbook.yml', 'Roles/a.yml'], files)
+        self.assertEqual('some yml code', self._read('playbook.yml'))
+        self.assertEqual('other yml code', self._read('Roles', 'a.yml'))
 
     def test_inner_folder_zip(self):
         self.zip_file.writestr('myzip/', '')
         self.zip_file.writestr('myzip/playbook.yml', 'some yml code')
         self.zip_file.writestr('myzip/Roles/', '')
-        self.zip_file.writestr('myzip/Roles/a.yml', 'some yml code')
+        self.zip_file.writestr('myzip/Roles/a.yml', 'other yml code')
+
+        files = self._extract()
+
+        self.assertEqual(['playbook.yml', 'Roles/a.yml'], files)
+        self.assertEqual('some yml code', self._read('playbook.yml'))
+        self.assertEqual('other yml code', self._read('Roles', 'a.yml'))
+        self.assertFalse(os.path.exists(os.path.join(self.folder, 'myzip')))
+
+    def test_inner_folder_zip_without_folder_entries(self):
+        self.zip_file.writestr('myzip/playbook.yml', 'some yml code')
+        self.zip_file.writestr('myzip/Roles/a.yml', 'other yml code')
+
+        self.assertEqual(['playbook.yml', 'Roles/a.yml'], self._extract())
+
+    def test_path_traversal_is_rejected(self):
+        for name in ['../evil.yml', 'roles/../../evil.yml', '/etc/evil.yml', 'c:/evil.yml', '..\\evil.yml']:
+            self.assertRaises(Exception, get_safe_member_name, name)
+        self.zip_file.writestr('playbook.yml', 'some yml code')
+        self.zip_file.writestr('../evil.yml', 'evil')
+
+        with self.assertRaises(Exception) as e:
+            self._extract()
+        self.assertIn('invalid file path', e.exception.message)
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'evil.yml')))
+        self.assertFalse(os.path.exists(os.path.join(self.folder, 'playbook.yml')))
 
-        self.zip_service.extract_all('')
+    def test_large_zip_is_extracted_in_parallel(self):
+        contents = dict(('roles/r%s/files/data.bin' % i, os.urandom(1024 * 1024)) for i in range(6))
+        for name, content in sorted(contents.items()):
+            self.zip_file.writestr(name, content)
+        self.zip_file.writestr('site.yml', 'site')
 
-        self.assertEqual(self.zip_file.extract.call_count, 2)
-        self.zip_file.extract.assert_any_call(Any(lambda x: x.filename == 'playbook.yml'))
-        self.zip_file.extract.assert_any_call(Any(lambda x: x.filename == 'Roles/a.yml'))
+        files = self._extract()
 
+        self.assertEqual(sorted(contents.keys()) + ['site.yml'], files)
+        for name, content in contents.items():
+            self.assertEqual(content, self._read(*name.split('/')))
@@ -0,0 +1,85 @@
+"""
+Benchmark of AnsibleResult against the previous (regex per result, scanned over the whole output) parser.
+The output is a fake ansible output of 500 hosts (~200MB by default): many tasks with a long result per host,
+a fatal error for some of the hosts and the play recap.
+
+usage: python bench_ansible_result.py [size_mb] [host_count]
+"""
+import os
+import re
+import sys
+import time
+
+from cloudshell.cm.ansible.domain.output.ansible_result import AnsibleResult
+from cloudshell.cm.ansible.domain.output.unixToHtmlConverter import UnixToHtmlColorConverter
+
+OK_LINE = '\033[0;32mok: [%s] => {"changed": false, "stdout": "%s"}\033[0m\n'
+FATAL_LINE = '\033[0;31mfatal: [%s]: FAILED! => {"changed": false, "failed": true, "msg": "error of %s", "rc": 2}\033[0m\n'
+RECAP_LINE = '\033[0;32m%s\033[0m              : \033[0;32mok=12  \033[0m changed=1    unreachable=0    failed=%s\n'
+
+
+class LegacyAnsibleResult(AnsibleResult):
+    """
+    The parser before the single pass (kept here for comparison only).
+    """
+    START = '\033\[\d+\;\d+m'
+    END = '\033\[0m'
+
+    def _parse_output(self):
+        return self._get_final_table(), self._get_failing_hosts_errors()
+
+    def _get_final_table(self):
+        table = {}
+        pattern = '^('+self.START+')?(?P<ip>\d+\.\d+\.\d+\.\d+)('+self.END+')?\s*\\t*\:.+unreachable=(?P<unreachable>\d+).+failed=(?P<failed>\d+)'
+        matches = self._scan_for_groups(pattern)
+        for m in matches:
+            table[m['ip']] = True if int(m['unreachable'])+int(m['failed']) == 0 else False
+        return table
+
+    def _get_failing_hosts_errors(self):
+        pattern = '^('+self.START+')?fatal: \[(?P<ip>\d+\.\d+\.\d+\.\d+)\]\:.*=>\s*(?P<details>\{.*\})\s*('+self.END+')?$'
+        matches = self._scan_for_groups(pattern)
+        ip_to_error = dict([(m['ip'], UnixToHtmlColorConverter().remove_strike(m['details'])) for m in matches])
+        return ip_to_error
+
+    def _scan_for_groups(self, pattern):
+        matches = list(re.finditer(pattern, self.output, re.MULTILINE))
+        matches = [m.groupdict() for m in matches]
+        return matches
+
+
+def create_output(size, ips):
+    chunks = []
+    total = 0
+    task = 0
+    padding = 'x' * 300
+    while total < size:
+        chunk = 'TASK [task %s] ' % task + '*' * 60 + '\n' + ''.join(OK_LINE % (ip, padding) for ip in ips) + '\n'
+        chunks.append(chunk)
+        total += len(chunk)
+        task += 1
+    failing = ips[::10]
+    chunks.append(''.join(FATAL_LINE % (ip, ip) for ip in failing))
+    chunks.append('\nPLAY RECAP ' + '*' * 60 + '\n')
+    chunks.append(''.join(RECAP_LINE % (ip, 1 if ip in failing else 0) for ip in ips))
+    return ''.join(chunks)
+
+
+def main():
+    size = int(sys.argv[1]) * 1024 * 1024 if len(sys.argv) > 1 else 200 * 1024 * 1024
+    host_count = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    ips = ['10.0.%s.%s' % (i / 250, i % 250 + 1) for i in range(host_count)]
+    output = create_output(size, ips)
+    print('output: %.0f MB, %s hosts' % (len(output) / 1024.0 / 1024, host_count))
+    results = []
+    for result_class in [LegacyAnsibleResult, AnsibleResult]:
+        start = time.time()
+        result = result_class(output, '', ips)
+        elapsed = time.time() - start
+        results.append(result.to_json())
+        print('%-20s %8.2f sec  %8.1f MB/sec' % (result_class.__name__, elapsed, len(output) / 1024.0 / 1024 / elapsed))
+    print('same results: %s' % (results[0] == results[1]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Benchmark of downloads with a new connection per request (module level requests.get, as before) against the pooled
+session of HttpRequestService. A local HTTP/1.1 server (HTTPS, when the openssl command line tool is available)
+serves a small playbook, so the time is dominated by the TCP (and TLS) handshakes.
+
+usage: python bench_http_session.py [request_count]
+"""
+import os
+import shutil
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import warnings
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+
+import requests
+from mock import Mock
+
+from cloudshell.cm.ansible.domain.http_request_service import HttpRequestService
+
+BODY = '- hosts: all\n  tasks:\n  - ping:\n' * 100
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # the headers and the body are separate writes, so nagle (with delayed acks) would delay every response
+    disable_nagle_algorithm = True
+    connections = set()
+
+    def do_GET(self):
+        Handler.connections.add(self.client_address)
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+class Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # the connections that requests.get doesn't reuse are dropped by the client
+        pass
+
+
+def start_server(folder):
+    server = Server(('127.0.0.1', 0), Handler)
+    scheme = 'http'
+    try:
+        cert = os.path.join(folder, 'cert.pem')
+        subprocess.check_call(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+                               '-subj', '/CN=127.0.0.1', '-keyout', cert, '-out', cert],
+                              stdin=open(os.devnull), stdout=open(os.devnull, 'w'), stderr=subprocess.STDOUT)
+        server.socket = ssl.wrap_socket(server.socket, certfile=cert, server_side=True)
+        scheme = 'https'
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server, '%s://127.0.0.1:%s/site.yml' % (scheme, server.server_address[1])
+
+
+def download_without_session(url):
+    response = requests.get(url, stream=True, verify=False)
+    return ''.join(response.iter_content(64 * 1024))
+
+
+def download_with_session(service, url):
+    response = service.get_response(url, None, Mock())
+    return ''.join(response.iter_content(64 * 1024))
+
+
+def run(name, download, count):
+    Handler.connections = set()
+    start = time.time()
+    for i in range(count):
+        assert download() == BODY
+    elapsed = time.time() - start
+    print('%-20s %8.2f sec  %8.2f ms/download  %5s connections' %
+          (name, elapsed, elapsed * 1000 / count, len(Handler.connections)))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    warnings.simplefilter('ignore')
+    folder = tempfile.mkdtemp()
+    server, url = start_server(folder)
+    try:
+        print(url)
+        service = HttpRequestService()
+        run('requests.get', lambda: download_without_session(url), count)
+        run('pooled session', lambda: download_with_session(service, url), count)
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Micro-benchmark of StreamAccumulator against the previous (line by line, queue based) implementation.
+A fake process writes 1M ansible-like lines to its stdout, and the accumulator is sampled the same way the
+executor samples it, until the process exits.
+
+usage: python bench_stream_accumulator.py [line_count]
+"""
+import os
+import sys
+import time
+from Queue import Queue, Empty
+from subprocess import Popen, PIPE
+from threading import Thread, RLock
+
+from cloudshell.cm.ansible.domain.stdout_accumulator import StreamAccumulator
+
+FAKE_PROCESS = """
+import sys
+line = 'ok: [192.168.85.%s] => {"changed": false, "ping": "pong"}\\n'
+write = sys.stdout.write
+for i in range(int(sys.argv[1])):
+    write(line % (i % 255))
+"""
+
+
+class LegacyStreamAccumulator(object):
+    """
+    The implementation before the block reader (kept here for comparison only).
+    """
+    def __init__(self, stdout):
+        self.queue = Queue()
+        self.stdout = stdout
+        self.thread = Thread(target=self._push_to_queue)
+        self.thread.daemon = True
+        self.lock = RLock()
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        with self.lock:
+            self.stdout.close()
+        self.thread.join()
+
+    def _push_to_queue(self):
+        is_closed = False
+        while not is_closed:
+            with self.lock:
+                is_closed = self.stdout.closed
+                if not is_closed:
+                    line = self.stdout.readline()
+                    if line:
+                        self.queue.put(line)
+
+    def read_all_txt(self):
+        try:
+            lines = []
+            while True:
+                lines.append(self.queue.get_nowait())
+        except Empty:
+            pass
+        finally:
+            return os.linesep.join(lines)
+
+
+def run(accumulator_class, line_count, sample_seconds=0.05):
+    process = Popen([sys.executable, '-c', FAKE_PROCESS, str(line_count)], stdout=PIPE)
+    start = time.time()
+    chunks = []
+    accumulator = accumulator_class(process.stdout)
+    with accumulator:
+        while process.poll() is None:
+            chunks.append(accumulator.read_all_txt())
+            time.sleep(sample_seconds)
+        if accumulator_class is LegacyStreamAccumulator:
+            # the legacy accumulator stops reading when it is closed, so it is drained before that
+            txt = accumulator.read_all_txt()
+            while txt:
+                chunks.append(txt)
+                time.sleep(sample_seconds)
+                txt = accumulator.read_all_txt()
+    chunks.append(accumulator.read_all_txt())
+    elapsed = time.time() - start
+    lines = sum(c.count('ok: [') for c in chunks)
+    return elapsed, lines
+
+
+def main():
+    line_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    for accumulator_class in [LegacyStreamAccumulator, StreamAccumulator]:
+        elapsed, lines = run(accumulator_class, line_count)
+        print('%-25s %8.2f sec  %9d lines  %10.0f lines/sec' %
+              (accumulator_class.__name__, elapsed, lines, lines / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark of ZipService against the previous extraction (extractall, or extract per member after renaming it, and a
+scan of the working dir for the playbook). The zip file is a fake playbook: a single top folder with many small
+roles files and a few large (half compressible) files.
+
+usage: python bench_zip_service.py [size_mb] [small_file_count]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from zipfile import ZipFile, ZIP_DEFLATED
+
+from cloudshell.cm.ansible.domain.zip_service import ZipService
+
+
+class LegacyZipService(object):
+    """
+    The extraction before the single pass (kept here for comparison only).
+    """
+    def extract_all(self, zip_file_name, folder):
+        zip = ZipFile(zip_file_name, 'r')
+        try:
+            names = zip.namelist()
+            top = next((f for f in names if f[-1] == '/'), None)
+            files = [f for f in zip.infolist() if f.filename[-1] != '/']
+            if top and all(f.startswith(top) for f in names):
+                for file_info in files:
+                    file_info.filename = '/'.join(file_info.filename.split('/')[1:])
+                    zip.extract(file_info, folder)
+            else:
+                zip.extractall(folder)
+            result = [f.filename for f in files]
+        finally:
+            zip.close()
+        # the playbook was found by listing the working dir
+        [f for f in os.listdir(folder) if f.endswith('.yml')]
+        return result
+
+
+def create_zip(path, size, small_file_count):
+    zip = ZipFile(path, 'w', ZIP_DEFLATED)
+    zip.writestr('playbook/', '')
+    zip.writestr('playbook/site.yml', '- hosts: all\n  roles: [r0]\n')
+    for i in range(small_file_count):
+        zip.writestr('playbook/roles/r%s/tasks/main.yml' % i, '- name: task %s\n  debug: msg=hello\n' % i * 20)
+    for i in range(8):
+        # hex text, which is compressed to about half of its size
+        zip.writestr('playbook/files/data%s.txt' % i, os.urandom(size / 16).encode('hex'))
+    zip.close()
+
+
+def main():
+    size = int(sys.argv[1]) * 1024 * 1024 if len(sys.argv) > 1 else 400 * 1024 * 1024
+    small_file_count = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    root = tempfile.mkdtemp()
+    try:
+        zip_file_name = os.path.join(root, 'playbook.zip')
+        create_zip(zip_file_name, size, small_file_count)
+        print('zip: %.0f MB (%.0f MB extracted), %s files' % (
+            os.path.getsize(zip_file_name) / 1024.0 / 1024, size / 1024.0 / 1024, small_file_count + 9))
+        results = []
+        for service in [LegacyZipService(), ZipService()]:
+            folder = tempfile.mkdtemp(dir=root)
+            start = time.time()
+            files = service.extract_all(zip_file_name, folder)
+            elapsed = time.time() - start
+            results.append(sorted(files))
+            print('%-20s %8.2f sec' % (service.__class__.__name__, elapsed))
+        print('same files: %s' % (results[0] == results[1]))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()